@@ -0,0 +1,131 @@
+import json
+import hashlib
+import logging
+from keyRegistry import intern_name
+
+# --- Defaults --- #
+
+ADDRESS_ALIASES = "data_import_address_aliases.json"
+# Bytes of the canonical address key hash (20 hex digits); collisions are
+# negligible even for hundreds of millions of addresses
+ADDRESS_KEY_BYTES = 10
+FIELD_SEPARATOR = "\x1f"
+
+
+# --- Normalization --- #
+
+
+def normalize_text(value):
+    # Collapses runs of whitespace; empty strings become None
+    if value is None:
+        return None
+    value = " ".join(str(value).split())
+    return value or None
+
+
+def _fold(value):
+    value = normalize_text(value)
+    return value.casefold() if value else ""
+
+
+def _fold_postal_code(value):
+    # "110 00" and "11000" are the same postal code
+    return _fold(value).replace(" ", "")
+
+
+def address_key(address_data):
+    # Stable key of a physical address: a hash of its normalized street,
+    # city, postal code and country, independent of the upstream _id
+    fields = [
+        _fold(address_data.get("street")),
+        _fold(address_data.get("city")),
+        _fold_postal_code(address_data.get("postalCode")),
+        _fold(address_data.get("countryId")).upper(),
+    ]
+    digest = hashlib.blake2b(
+        FIELD_SEPARATOR.join(fields).encode("utf-8"), digest_size=ADDRESS_KEY_BYTES
+    )
+    return digest.hexdigest()
+
+
+# --- Dedup Index --- #
+
+
+class AddressIndex:
+    # Canonical addresses seen during an import. Upstream IDs of the same
+    # physical address collapse onto one canonical key; the alias map keeps
+    # the original IDs. Country names are filled in only once the countries
+    # of the whole input are known, so they do not depend on input order or
+    # on the validation engine.
+    def __init__(self):
+        self.country_names = {}
+        self.address_countries = {}
+        self.aliases = {}
+        self.pending = {}
+
+    def learn_country(self, country_id, country_name):
+        # The smallest name given for an ID wins, whatever order it came in
+        country_id = normalize_text(country_id)
+        if country_id and country_name:
+            known = self.country_names.get(country_id)
+            if known is None or country_name < known:
+                self.country_names[country_id] = country_name
+
+    def canonicalize(self, address_data):
+        # The canonical address document; the upstream ID is recorded as an
+        # alias of its key. country_name stays None until it is named.
+        key = intern_name(address_key(address_data))
+        address_id = address_data.get("_id")
+        if address_id is not None:
+            self.aliases[address_id] = key
+        self.address_countries[key] = normalize_text(address_data.get("countryId"))
+        return {
+            "_key": key,
+            "street": normalize_text(address_data.get("street")),
+            "city": intern_name(normalize_text(address_data.get("city"))),
+            "postal_code": normalize_text(address_data.get("postalCode")),
+            "country_name": None,
+        }
+
+    def named(self, address):
+        # The address with the name of its country as learned so far; an
+        # unknown country stays None, its ID is never used as a name
+        country_id = self.address_countries.get(address["_key"])
+        address["country_name"] = self.country_names.get(country_id)
+        return address
+
+    def resolve(self, address_id):
+        # Canonical key of an upstream ID; IDs not seen yet are kept
+        return self.aliases.get(address_id, address_id)
+
+    def add(self, address):
+        # Holds the first document of each canonical key until resolved();
+        # True the first time a key is added
+        if address["_key"] in self.pending:
+            return False
+        self.pending[address["_key"]] = address
+        return True
+
+    def resolved(self):
+        # The held addresses, named once every country of the input has been
+        # learned; written by the importer after its last document
+        pending = self.pending
+        self.pending = {}
+        for address in pending.values():
+            yield self.named(address)
+
+    def save_aliases(self, path=ADDRESS_ALIASES):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.aliases, file, separators=(",", ":"), sort_keys=True)
+        logging.info(
+            f"Collapsed {len(self.aliases)} address IDs onto {len(set(self.aliases.values()))} canonical addresses, aliases saved to {path}."
+        )
+
+
+def load_aliases(path=ADDRESS_ALIASES):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+# Shared by the extractors and the frame engine, like the interned names
+address_index = AddressIndex()
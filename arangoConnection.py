@@ -0,0 +1,365 @@
+import os
+import gzip
+import time
+import random
+import logging
+import threading
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, ConnectTimeout
+from urllib3.util.retry import Retry
+from arango import ArangoClient
+from arango.http import HTTPClient
+from arango.resolver import HostResolver
+from arango.response import Response
+from arango_orm import Database
+from dotenv import load_dotenv
+
+# Load environment variables from .env
+load_dotenv()
+
+# --- Setup & Configuration --- #
+
+DATABASE_NAME = os.getenv("ARANGO_DB_NAME")
+USERNAME = os.getenv("ARANGO_DB_USERNAME")
+PASSWORD = os.getenv("ARANGO_DB_PASSWORD")
+# One coordinator URL or a comma-separated list of them
+HOST = os.getenv("ARANGO_DB_HOST")
+# "roundrobin" or "leastloaded"
+HOST_STRATEGY = os.getenv("ARANGO_DB_HOST_STRATEGY", "leastloaded")
+POOL_SIZE = int(os.getenv("ARANGO_DB_POOL_SIZE", "16"))
+REQUEST_TIMEOUT = float(os.getenv("ARANGO_DB_REQUEST_TIMEOUT", "60"))
+KEEP_ALIVE = os.getenv("ARANGO_DB_KEEP_ALIVE", "true").lower() == "true"
+# Request bodies at least this large are sent gzip-compressed, 0 disables it
+COMPRESSION_THRESHOLD = int(os.getenv("ARANGO_DB_COMPRESSION_THRESHOLD", "0"))
+# Seconds between active health checks, 0 disables them
+HEALTH_CHECK_INTERVAL = float(os.getenv("ARANGO_DB_HEALTH_CHECK_INTERVAL", "0"))
+# Seconds a failed coordinator is kept out of rotation
+UNHEALTHY_COOLDOWN = 30.0
+# Weight of the newest sample in the per-host latency average
+LATENCY_SMOOTHING = 0.2
+
+
+def parse_hosts(hosts):
+    if isinstance(hosts, str):
+        hosts = hosts.split(",")
+    return [host.strip().rstrip("/") for host in hosts if host and host.strip()]
+
+
+# --- Host Selection --- #
+
+
+class CoordinatorResolver(HostResolver):
+    # Picks a coordinator per request. Both strategies skip hosts that failed
+    # recently; "leastloaded" additionally weighs in-flight requests by each
+    # host's smoothed latency, so traffic drains away from a slow coordinator.
+    def __init__(self, host_count, strategy=HOST_STRATEGY):
+        self.host_count = host_count
+        self.strategy = strategy
+        self.lock = threading.Lock()
+        self.index = -1
+        self.in_flight = [0] * host_count
+        self.latency = [0.0] * host_count
+        self.unhealthy_until = [0.0] * host_count
+
+    def healthy_hosts(self):
+        now = time.monotonic()
+        healthy = [i for i in range(self.host_count) if self.unhealthy_until[i] <= now]
+        # With every host marked down, trying one beats failing outright
+        return healthy or list(range(self.host_count))
+
+    def get_host_index(self):
+        with self.lock:
+            healthy = self.healthy_hosts()
+            if self.strategy == "leastloaded":
+                # Random tie-breaking spreads load while latencies are unknown
+                return min(
+                    healthy,
+                    key=lambda i: (
+                        (self.in_flight[i] + 1) * (self.latency[i] or 1e-3),
+                        random.random(),
+                    ),
+                )
+            self.index = (self.index + 1) % self.host_count
+            while self.index not in healthy:
+                self.index = (self.index + 1) % self.host_count
+            return self.index
+
+    def request_started(self, index):
+        with self.lock:
+            self.in_flight[index] += 1
+
+    def request_finished(self, index, latency, failed=False):
+        with self.lock:
+            self.in_flight[index] = max(0, self.in_flight[index] - 1)
+            if failed:
+                self.mark_unhealthy(index)
+            elif self.latency[index]:
+                self.latency[index] += LATENCY_SMOOTHING * (
+                    latency - self.latency[index]
+                )
+            else:
+                self.latency[index] = latency
+
+    def mark_unhealthy(self, index):
+        self.unhealthy_until[index] = time.monotonic() + UNHEALTHY_COOLDOWN
+
+    def mark_healthy(self, index):
+        self.unhealthy_until[index] = 0.0
+
+    def stats(self):
+        return [
+            {
+                "in_flight": self.in_flight[i],
+                "latency": self.latency[i],
+                "healthy": self.unhealthy_until[i] <= time.monotonic(),
+            }
+            for i in range(self.host_count)
+        ]
+
+
+# --- HTTP Client --- #
+
+
+class PooledHTTPClient(HTTPClient):
+    # requests-based client with a tunable connection pool, keep-alive,
+    # timeout and optional gzip request bodies. It reports every request to
+    # the resolver and fails over to another coordinator when a connection
+    # cannot be established.
+    def __init__(
+        self,
+        hosts,
+        resolver,
+        pool_size=POOL_SIZE,
+        request_timeout=REQUEST_TIMEOUT,
+        keep_alive=KEEP_ALIVE,
+        compression_threshold=COMPRESSION_THRESHOLD,
+    ):
+        self.hosts = hosts
+        self.resolver = resolver
+        self.pool_size = pool_size
+        self.request_timeout = request_timeout
+        self.keep_alive = keep_alive
+        self.compression_threshold = compression_threshold
+        self.sessions = {}
+
+    def create_session(self, host):
+        # Connection failures are not retried here: failing over to another
+        # coordinator is quicker than backing off on a dead one
+        retry_strategy = Retry(
+            total=3,
+            connect=0,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["HEAD", "GET", "OPTIONS"],
+        )
+        http_adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry_strategy,
+        )
+        session = Session()
+        session.mount("https://", http_adapter)
+        session.mount("http://", http_adapter)
+        session.headers["Connection"] = "keep-alive" if self.keep_alive else "close"
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.sessions[host.rstrip("/")] = session
+        return session
+
+    def _host_index(self, url):
+        for index, host in enumerate(self.hosts):
+            if url.startswith(host):
+                return index
+        return None
+
+    def _compress(self, headers, data):
+        if (
+            self.compression_threshold
+            and isinstance(data, str)
+            and len(data) >= self.compression_threshold
+        ):
+            headers = dict(headers or {})
+            headers["Content-Encoding"] = "gzip"
+            return headers, gzip.compress(data.encode("utf-8"), compresslevel=1)
+        return headers, data
+
+    def send_request(
+        self,
+        session,
+        method,
+        url,
+        headers=None,
+        params=None,
+        data=None,
+        auth=None,
+    ):
+        headers, data = self._compress(headers, data)
+        index = self._host_index(url)
+        tried = set()
+        while True:
+            if index is not None:
+                self.resolver.request_started(index)
+            start = time.perf_counter()
+            try:
+                response = session.request(
+                    method=method,
+                    url=url,
+                    params=params,
+                    data=data,
+                    headers=headers,
+                    auth=auth,
+                    timeout=self.request_timeout,
+                )
+            except ConnectionError as e:
+                if index is None:
+                    raise
+                self.resolver.request_finished(
+                    index, time.perf_counter() - start, failed=True
+                )
+                tried.add(index)
+                # Only a connection that was never established is safe to
+                # replay elsewhere; a write may already have reached the host.
+                safe = isinstance(e, ConnectTimeout) or method in ("get", "head")
+                candidates = [i for i in range(len(self.hosts)) if i not in tried]
+                if not safe or not candidates:
+                    raise
+                next_index = self.resolver.get_host_index()
+                if next_index in tried:
+                    next_index = candidates[0]
+                logging.warning(
+                    "Coordinator %s unreachable, failing over to %s",
+                    self.hosts[index],
+                    self.hosts[next_index],
+                )
+                url = self.hosts[next_index] + url[len(self.hosts[index]) :]
+                session = self.sessions[self.hosts[next_index]]
+                index = next_index
+                continue
+
+            if index is not None:
+                self.resolver.request_finished(
+                    index,
+                    time.perf_counter() - start,
+                    failed=response.status_code in (502, 503, 504),
+                )
+            return Response(
+                method=method,
+                url=response.url,
+                headers=response.headers,
+                status_code=response.status_code,
+                status_text=response.reason,
+                raw_body=response.text,
+            )
+
+    def check_hosts(self, auth=None):
+        # Active probe of every coordinator; recovered hosts rejoin rotation
+        for index, host in enumerate(self.hosts):
+            try:
+                response = self.sessions[host].get(
+                    f"{host}/_api/version", auth=auth, timeout=self.request_timeout
+                )
+                healthy = response.status_code < 500
+            except ConnectionError:
+                healthy = False
+            if healthy:
+                self.resolver.mark_healthy(index)
+            else:
+                logging.warning("Coordinator %s failed its health check", host)
+                self.resolver.mark_unhealthy(index)
+
+
+# --- Lazy Connection --- #
+
+_lock = threading.Lock()
+_connection = {}
+
+
+def _health_check_loop(http_client, auth, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            http_client.check_hosts(auth)
+        except Exception as e:
+            logging.warning("Error checking coordinators: %s", str(e))
+
+
+def connect(
+    hosts=None,
+    database_name=None,
+    username=None,
+    password=None,
+    strategy=HOST_STRATEGY,
+    pool_size=POOL_SIZE,
+    request_timeout=REQUEST_TIMEOUT,
+    keep_alive=KEEP_ALIVE,
+    compression_threshold=COMPRESSION_THRESHOLD,
+    health_check_interval=HEALTH_CHECK_INTERVAL,
+):
+    hosts = parse_hosts(hosts or HOST or "")
+    if not hosts:
+        raise RuntimeError("No ArangoDB host configured, set ARANGO_DB_HOST")
+    username = username or USERNAME
+    password = password or PASSWORD
+
+    resolver = CoordinatorResolver(len(hosts), strategy)
+    http_client = PooledHTTPClient(
+        hosts,
+        resolver,
+        pool_size=pool_size,
+        request_timeout=request_timeout,
+        keep_alive=keep_alive,
+        compression_threshold=compression_threshold,
+    )
+    client = ArangoClient(hosts=hosts, http_client=http_client)
+    # python-arango only accepts resolver names, ours is installed before any
+    # database connection picks the resolver up
+    client._host_resolver = resolver
+    db = client.db(database_name or DATABASE_NAME, username=username, password=password)
+
+    if health_check_interval and len(hosts) > 1:
+        threading.Thread(
+            target=_health_check_loop,
+            args=(http_client, (username, password), health_check_interval),
+            daemon=True,
+        ).start()
+
+    logging.info(f"Connected to {len(hosts)} coordinator(s) using {strategy}.")
+    return {"client": client, "db": db, "daytrip": Database(db), "resolver": resolver}
+
+
+def _get(name):
+    # The connection is only built on first use, not at import
+    if not _connection:
+        with _lock:
+            if not _connection:
+                _connection.update(connect())
+    return _connection[name]
+
+
+def get_client():
+    return _get("client")
+
+
+def get_db():
+    return _get("db")
+
+
+def get_daytrip():
+    return _get("daytrip")
+
+
+class LazyConnection:
+    # Stands in for a module-level db/daytrip object and connects on the
+    # first attribute access.
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(_get(self._name), attribute)
+
+    def __repr__(self):
+        return f"<LazyConnection {self._name}>"
+
+
+db = LazyConnection("db")
+daytrip = LazyConnection("daytrip")
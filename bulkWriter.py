@@ -0,0 +1,382 @@
+import re
+import json
+import time
+import random
+import logging
+from requests.exceptions import ConnectionError, Timeout
+
+# --- Defaults --- #
+
+INITIAL_BATCH_SIZE = 500
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 20000
+# Flush latency the sizer steers towards, in seconds
+TARGET_FLUSH_LATENCY = 0.5
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+# Upper bound on documents buffered across all collections
+MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+# Assumed serialized size of a document until a collection has been sampled
+DEFAULT_DOCUMENT_BYTES = 512
+DOCUMENT_SAMPLE_SIZE = 8
+
+# Retries per batch, and across the whole run so a failing database is not
+# hammered indefinitely
+MAX_ATTEMPTS = 5
+RETRY_BUDGET = 1000
+BASE_BACKOFF = 0.1
+MAX_BACKOFF = 10.0
+# HTTP statuses and ArangoDB error numbers worth retrying: timeouts, overload,
+# write-write conflicts (1200), lock timeouts (18) and cluster timeouts (1457)
+TRANSIENT_HTTP_CODES = {408, 429, 502, 503, 504}
+TRANSIENT_ERROR_CODES = {18, 1200, 1457}
+# Request rejections a single document can cause: a malformed document
+# (400) or one that pushes the request over the size limit (413). Anything
+# else, such as a missing collection (404) or failed authentication (401,
+# 403), fails every request alike and is not bisected.
+RECORD_HTTP_CODES = {400, 413}
+POSITION_PATTERN = re.compile(r"at position (\d+)")
+UNIQUE_VIOLATION = "unique constraint violated"
+TRANSIENT_DETAIL = "conflict"
+
+
+class WriteAborted(Exception):
+    # The database kept failing transiently after every retry, or rejected
+    # the request for a reason no single document causes; the batch is
+    # neither written nor quarantined, so the import has to stop
+    pass
+
+
+def to_document(entity):
+    if isinstance(entity, dict):
+        return entity
+    return entity._dump()
+
+
+def is_transient(error):
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    return (
+        getattr(error, "http_code", None) in TRANSIENT_HTTP_CODES
+        or getattr(error, "error_code", None) in TRANSIENT_ERROR_CODES
+    )
+
+
+def is_record_error(error):
+    http_code = getattr(error, "http_code", None)
+    if http_code is None:
+        # Raised by the client before sending, e.g. a value JSON cannot hold
+        return isinstance(error, (TypeError, ValueError))
+    return http_code in RECORD_HTTP_CODES
+
+
+class AdaptiveBatchSizer:
+    # Multiplicative increase while flushes come back well under the target
+    # latency, proportional decrease as soon as latency or request size
+    # overshoot.
+    def __init__(
+        self,
+        initial=INITIAL_BATCH_SIZE,
+        minimum=MIN_BATCH_SIZE,
+        maximum=MAX_BATCH_SIZE,
+        target_latency=TARGET_FLUSH_LATENCY,
+        max_request_bytes=MAX_REQUEST_BYTES,
+        growth=1.5,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.max_request_bytes = max_request_bytes
+        self.growth = growth
+        self.batch_size = self._clamp(initial)
+        self.flush_count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.smallest = self.batch_size
+        self.largest = self.batch_size
+
+    def _clamp(self, size):
+        return int(max(self.minimum, min(self.maximum, size)))
+
+    def record(self, batch_length, latency, request_bytes):
+        self.flush_count += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+        if request_bytes > self.max_request_bytes:
+            size = batch_length * self.max_request_bytes / request_bytes
+        elif latency > self.target_latency:
+            size = batch_length * max(0.5, self.target_latency / latency)
+        elif latency < 0.8 * self.target_latency and batch_length >= self.batch_size:
+            # Only grow on full batches; a short final flush says nothing
+            # about how a bigger batch would behave.
+            size = self.batch_size * self.growth
+        else:
+            size = self.batch_size
+
+        self.batch_size = self._clamp(size)
+        self.smallest = min(self.smallest, self.batch_size)
+        self.largest = max(self.largest, self.batch_size)
+        return self.batch_size
+
+    def limit(self, document_bytes):
+        # Largest batch that keeps a single request under the size cap
+        return max(self.minimum, int(self.max_request_bytes // max(document_bytes, 1)))
+
+    def stats(self):
+        return {
+            "batch_size": self.batch_size,
+            "min_batch_size": self.smallest,
+            "max_batch_size": self.largest,
+            "flushes": self.flush_count,
+            "mean_latency": (
+                self.total_latency / self.flush_count if self.flush_count else 0.0
+            ),
+            "max_latency": self.max_latency,
+        }
+
+
+class BulkWriter:
+    def __init__(
+        self,
+        db,
+        initial_batch_size=INITIAL_BATCH_SIZE,
+        min_batch_size=MIN_BATCH_SIZE,
+        max_batch_size=MAX_BATCH_SIZE,
+        target_latency=TARGET_FLUSH_LATENCY,
+        max_request_bytes=MAX_REQUEST_BYTES,
+        memory_budget_bytes=MEMORY_BUDGET_BYTES,
+        on_duplicate="error",
+        max_attempts=MAX_ATTEMPTS,
+        retry_budget=RETRY_BUDGET,
+        base_backoff=BASE_BACKOFF,
+        max_backoff=MAX_BACKOFF,
+        quarantine_path=None,
+        on_flush=None,
+    ):
+        self.db = db
+        self.sizer_options = {
+            "initial": initial_batch_size,
+            "minimum": min_batch_size,
+            "maximum": max_batch_size,
+            "target_latency": target_latency,
+            "max_request_bytes": max_request_bytes,
+        }
+        self.memory_budget_bytes = memory_budget_bytes
+        self.on_duplicate = on_duplicate
+        self.buffers = {}
+        self.sizers = {}
+        self.document_bytes = {}
+        self.created = {}
+        self.errors = {}
+        self.buffered_bytes = 0
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retries = 0
+        self.bisections = 0
+        self.quarantine_path = quarantine_path
+        self.quarantine_file = None
+        self.quarantined = {}
+        # Called with (collection_name, created_count) after every flush
+        self.on_flush = on_flush
+
+    def _sizer(self, collection_name):
+        sizer = self.sizers.get(collection_name)
+        if sizer is None:
+            sizer = AdaptiveBatchSizer(**self.sizer_options)
+            self.sizers[collection_name] = sizer
+        return sizer
+
+    def _sample_document_bytes(self, collection_name, documents):
+        sample = documents[:DOCUMENT_SAMPLE_SIZE]
+        sampled = sum(len(json.dumps(doc, default=str)) for doc in sample) / len(sample)
+        previous = self.document_bytes.get(collection_name)
+        self.document_bytes[collection_name] = (
+            sampled if previous is None else 0.8 * previous + 0.2 * sampled
+        )
+
+    def add(self, collection_name, entity):
+        buffer = self.buffers.setdefault(collection_name, [])
+        buffer.append(to_document(entity))
+        document_bytes = self.document_bytes.get(
+            collection_name, DEFAULT_DOCUMENT_BYTES
+        )
+        self.buffered_bytes += document_bytes
+
+        sizer = self._sizer(collection_name)
+        if len(buffer) >= min(sizer.batch_size, sizer.limit(document_bytes)):
+            self.flush(collection_name)
+        elif self.buffered_bytes > self.memory_budget_bytes:
+            self._flush_largest()
+
+    def _flush_largest(self):
+        collection_name = max(
+            self.buffers,
+            key=lambda name: len(self.buffers[name])
+            * self.document_bytes.get(name, DEFAULT_DOCUMENT_BYTES),
+        )
+        self.flush(collection_name)
+
+    def flush(self, collection_name):
+        documents = self.buffers.get(collection_name)
+        if not documents:
+            return
+        self.buffers[collection_name] = []
+        self.buffered_bytes -= len(documents) * self.document_bytes.get(
+            collection_name, DEFAULT_DOCUMENT_BYTES
+        )
+        self.buffered_bytes = max(self.buffered_bytes, 0)
+        self._sample_document_bytes(collection_name, documents)
+
+        # Time spent in retries counts towards the flush latency: a database
+        # that needs retries is overloaded, and smaller batches help it.
+        start = time.perf_counter()
+        created, duplicates, failures = self._write(collection_name, documents)
+        latency = time.perf_counter() - start
+
+        self.created[collection_name] = self.created.get(collection_name, 0) + created
+        failed_count = duplicates + len(failures)
+        if failed_count:
+            self.errors[collection_name] = (
+                self.errors.get(collection_name, 0) + failed_count
+            )
+        for document, error in failures:
+            logging.error("Error adding %s: %s", collection_name, error)
+            self._quarantine(collection_name, document, error)
+
+        request_bytes = len(documents) * self.document_bytes[collection_name]
+        self._sizer(collection_name).record(len(documents), latency, request_bytes)
+        if self.on_flush is not None:
+            self.on_flush(collection_name, created)
+
+    def _backoff(self, attempt):
+        # Exponential backoff with full jitter; returns False once this batch
+        # or the whole run has used up its retries.
+        if attempt >= self.max_attempts or self.retry_budget <= 0:
+            return False
+        self.retry_budget -= 1
+        self.retries += 1
+        time.sleep(
+            random.uniform(0, min(self.max_backoff, self.base_backoff * 2**attempt))
+        )
+        return True
+
+    def _write(self, collection_name, documents, attempt=0):
+        # Returns (created, duplicates, [(document, error), ...]). Transient
+        # failures are retried and abort the import once the retries are
+        # used up; a request rejected for one of its documents is bisected
+        # until the records that break it are isolated, any other rejection
+        # aborts the import.
+        try:
+            result = self.db.collection(collection_name).import_bulk(
+                documents,
+                halt_on_error=False,
+                details=True,
+                on_duplicate=self.on_duplicate,
+            )
+        except Exception as e:
+            if is_transient(e):
+                if self._backoff(attempt):
+                    return self._write(collection_name, documents, attempt + 1)
+                raise WriteAborted(
+                    f"Writing {len(documents)} documents to {collection_name} "
+                    f"failed after {attempt + 1} attempts: {e}"
+                ) from e
+            if not is_record_error(e):
+                raise WriteAborted(
+                    f"Writing {len(documents)} documents to {collection_name} "
+                    f"was rejected: {e}"
+                ) from e
+            if len(documents) == 1:
+                return 0, 0, [(documents[0], str(e))]
+            middle = len(documents) // 2
+            self.bisections += 1
+            first = self._write(collection_name, documents[:middle], attempt)
+            second = self._write(collection_name, documents[middle:], attempt)
+            return (
+                first[0] + second[0],
+                first[1] + second[1],
+                first[2] + second[2],
+            )
+
+        created = result.get("created", 0)
+        if not result.get("errors"):
+            return created, 0, []
+
+        # Per-document results only name the failing positions, so the
+        # transient ones are resent on their own and the rest reported.
+        duplicates = 0
+        failures = []
+        transient = []
+        for detail in result.get("details", []):
+            match = POSITION_PATTERN.search(detail)
+            if match is None:
+                continue
+            document = documents[int(match.group(1))]
+            if UNIQUE_VIOLATION in detail:
+                duplicates += 1
+            elif TRANSIENT_DETAIL in detail:
+                transient.append((document, detail))
+            else:
+                failures.append((document, detail))
+
+        if transient and self._backoff(attempt):
+            retried = self._write(
+                collection_name, [document for document, _ in transient], attempt + 1
+            )
+            created += retried[0]
+            duplicates += retried[1]
+            failures.extend(retried[2])
+        else:
+            failures.extend(transient)
+        return created, duplicates, failures
+
+    def _quarantine(self, collection_name, document, error):
+        self.quarantined[collection_name] = self.quarantined.get(collection_name, 0) + 1
+        if self.quarantine_path is None:
+            return
+        if self.quarantine_file is None:
+            self.quarantine_file = open(self.quarantine_path, "a", encoding="utf-8")
+        self.quarantine_file.write(
+            json.dumps(
+                {"collection": collection_name, "error": error, "document": document},
+                default=str,
+            )
+            + "\n"
+        )
+
+    def flush_all(self):
+        for collection_name in list(self.buffers):
+            self.flush(collection_name)
+        if self.quarantine_file is not None:
+            self.quarantine_file.flush()
+
+    def close(self):
+        self.flush_all()
+        if self.quarantine_file is not None:
+            self.quarantine_file.close()
+            self.quarantine_file = None
+
+    def summary(self):
+        summary = {}
+        for collection_name, sizer in self.sizers.items():
+            stats = sizer.stats()
+            stats["created"] = self.created.get(collection_name, 0)
+            stats["errors"] = self.errors.get(collection_name, 0)
+            stats["quarantined"] = self.quarantined.get(collection_name, 0)
+            summary[collection_name] = stats
+        return summary
+
+    def log_summary(self):
+        for collection_name, stats in sorted(self.summary().items()):
+            logging.info(
+                f"{collection_name}: created {stats['created']}, errors {stats['errors']}, "
+                f"quarantined {stats['quarantined']}, "
+                f"{stats['flushes']} flushes, batch size {stats['batch_size']} "
+                f"(min {stats['min_batch_size']}, max {stats['max_batch_size']}), "
+                f"latency mean {stats['mean_latency']:.3f}s max {stats['max_latency']:.3f}s."
+            )
+        logging.info(
+            f"Bulk writes used {self.retries} retries and {self.bisections} bisections."
+        )
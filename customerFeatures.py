@@ -0,0 +1,336 @@
+import gzip
+import json
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from jsonExtractPrep import (
+    extract_and_validate_order,
+    VEHICLE_TYPE_NAMES,
+    DETAIL_PATH,
+)
+from keyRegistry import intern_name
+from projectedParser import reads, projected_items, projection_for, OVERSIZED_DETAILS
+
+# --- Order Table --- #
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# Order dates are stored as plain dates in the database
+EXPORT_DATE_FORMAT = "%Y-%m-%d"
+
+ORDER_COLUMNS = [
+    "customer_id",
+    "order_id",
+    "season",
+    "total_price",
+    "order_created_at",
+    "departure_at",
+    "payment_method",
+    "vehicles",
+    "origin_location_id",
+    "destination_location_id",
+]
+# Export of one ORDER_COLUMNS row per imported order for exportArango.py:
+#   python exportArango.py --query "$(python customerFeatures.py --print-query)"
+#       --output orders.ndjson.gz
+# The season is the calendar season of the order, not the season key of the
+# source document, and the lead time has a resolution of days.
+ORDER_QUERY = """
+FOR o IN order
+    LET customer = FIRST(FOR c IN INBOUND o made_order RETURN c._key)
+    LET payment_method = FIRST(
+        FOR p IN OUTBOUND o payment_by RETURN p._key
+    )
+    LET vehicles = (FOR v IN OUTBOUND o uses_vehicle RETURN v._key)
+    LET origin = FIRST(
+        FOR l, e IN OUTBOUND o order_from_location
+            FILTER e.type == "originated" RETURN l._key
+    )
+    LET destination = FIRST(
+        FOR l, e IN OUTBOUND o order_from_location
+            FILTER e.type == "destined" RETURN l._key
+    )
+    RETURN {
+        customer_id: customer,
+        order_id: o._key,
+        season: o.season,
+        total_price: o.total_price,
+        order_created_at: o.order_created_at,
+        departure_at: o.departure_at,
+        payment_method: payment_method,
+        vehicles: vehicles,
+        origin_location_id: origin,
+        destination_location_id: destination
+    }
+"""
+
+
+class OrderTableBuilder:
+    # Accumulates one row per validated order as plain column lists, so that
+    # building the frame at the end is a single columnar copy.
+    def __init__(self):
+        self.columns = {column: [] for column in ORDER_COLUMNS}
+
+    @reads(
+        "_id",
+        f"{DETAIL_PATH}.paymentMethod",
+        f"{DETAIL_PATH}.vehicles",
+        f"{DETAIL_PATH}.originLocationData._id",
+        f"{DETAIL_PATH}.destinationLocationData._id",
+    )
+    def add_document(self, json_document):
+        validated_orders, _ = extract_and_validate_order(json_document)
+        validated_keys = {order._key for order in validated_orders}
+        if not validated_keys:
+            return 0
+
+        customer_id = json_document.get("_id")
+        columns = self.columns
+        added_count = 0
+        for season_key, season_data in json_document.get("seasons", {}).items():
+            for detail in season_data.get("details", []):
+                order_id = detail.get("orderId")
+                if order_id not in validated_keys:
+                    continue
+                columns["customer_id"].append(customer_id)
+                columns["order_id"].append(order_id)
+                columns["season"].append(intern_name(season_key))
+                columns["total_price"].append(detail.get("totalPrice"))
+                columns["order_created_at"].append(detail.get("orderCreatedAt"))
+                columns["departure_at"].append(detail.get("departureAt"))
+                payment_method = detail.get("paymentMethod")
+                columns["payment_method"].append(
+                    str(payment_method) if payment_method is not None else None
+                )
+                columns["vehicles"].append(
+                    [str(vehicle_id) for vehicle_id in detail.get("vehicles", [])]
+                )
+                columns["origin_location_id"].append(
+                    intern_name((detail.get("originLocationData") or {}).get("_id"))
+                )
+                columns["destination_location_id"].append(
+                    intern_name(
+                        (detail.get("destinationLocationData") or {}).get("_id")
+                    )
+                )
+                added_count += 1
+        return added_count
+
+    def to_frame(self):
+        orders = pd.DataFrame(self.columns, columns=ORDER_COLUMNS)
+        return normalize_orders(orders)
+
+
+ORDER_PROJECTION = projection_for(
+    [extract_and_validate_order, OrderTableBuilder.add_document]
+)
+
+
+def normalize_orders(orders):
+    orders["total_price"] = pd.to_numeric(orders["total_price"], errors="coerce")
+    for column in ["order_created_at", "departure_at"]:
+        if not pd.api.types.is_datetime64_any_dtype(orders[column]):
+            orders[column] = pd.to_datetime(
+                orders[column], format=DATE_FORMAT, errors="coerce"
+            )
+    for column in ["customer_id", "season", "payment_method"]:
+        orders[column] = orders[column].astype("category")
+    return orders
+
+
+def orders_from_json(json_file_path):
+    builder = OrderTableBuilder()
+    with open(json_file_path, "rb") as file:
+        for json_document in projected_items(
+            file, ORDER_PROJECTION, max_details=OVERSIZED_DETAILS
+        ):
+            builder.add_document(json_document)
+    return builder.to_frame()
+
+
+def orders_from_export(export_path):
+    # NDJSON (optionally gzipped) or Parquet rows of ORDER_QUERY
+    if export_path.endswith(".parquet"):
+        orders = pd.read_parquet(export_path, columns=ORDER_COLUMNS)
+    else:
+        opener = gzip.open if export_path.endswith(".gz") else open
+        with opener(export_path, "rt", encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file if line.strip()]
+        orders = pd.DataFrame(rows, columns=ORDER_COLUMNS)
+    orders["vehicles"] = orders["vehicles"].map(
+        lambda vehicles: [] if vehicles is None else list(vehicles)
+    )
+    for column in ["order_created_at", "departure_at"]:
+        orders[column] = pd.to_datetime(
+            orders[column], format=EXPORT_DATE_FORMAT, errors="coerce"
+        )
+    return normalize_orders(orders)
+
+
+# --- Feature Builders --- #
+
+
+def _share_matrix(customer_codes, n_customers, values, prefix):
+    # Per-customer share of each distinct value, via one bincount over the
+    # flattened (customer, value) cell index.
+    value_codes, labels = pd.factorize(values, sort=True)
+    mask = value_codes >= 0
+    n_values = len(labels)
+    counts = np.bincount(
+        customer_codes[mask].astype(np.int64) * n_values + value_codes[mask],
+        minlength=n_customers * n_values,
+    ).reshape(n_customers, n_values)
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shares = np.where(totals > 0, counts / np.maximum(totals, 1), 0.0)
+    return pd.DataFrame(
+        shares, columns=[f"{prefix}_{label}".replace(" ", "_") for label in labels]
+    )
+
+
+def _distinct_count(customer_codes, n_customers, values):
+    value_codes, _ = pd.factorize(values)
+    mask = value_codes >= 0
+    pairs = np.unique(
+        customer_codes[mask].astype(np.int64) << 32 | value_codes[mask].astype(np.int64)
+    )
+    return np.bincount(pairs >> 32, minlength=n_customers)
+
+
+def build_customer_features(orders, as_of=None):
+    customer_codes, customers = pd.factorize(orders["customer_id"], sort=True)
+    n_customers = len(customers)
+    valid = customer_codes >= 0
+    if not valid.all():
+        logging.warning(
+            f"Dropping {(~valid).sum()} orders without a customer id from features."
+        )
+        orders = orders[valid]
+        customer_codes = customer_codes[valid]
+    orders = orders.reset_index(drop=True)
+
+    created_at = orders["order_created_at"]
+    if as_of is None:
+        as_of = created_at.max()
+    as_of = pd.Timestamp(as_of)
+
+    grouped = pd.DataFrame(
+        {
+            "customer": customer_codes,
+            "created_at": created_at.to_numpy(),
+            "total_price": orders["total_price"].to_numpy(dtype=float),
+            "lead_time_hours": (
+                (orders["departure_at"] - created_at).dt.total_seconds() / 3600.0
+            ).to_numpy(),
+        }
+    ).groupby("customer", sort=True)
+
+    aggregates = grouped.agg(
+        last_order_at=("created_at", "max"),
+        first_order_at=("created_at", "min"),
+        frequency=("created_at", "size"),
+        monetary_total=("total_price", "sum"),
+        monetary_mean=("total_price", "mean"),
+        monetary_max=("total_price", "max"),
+        lead_time_mean_hours=("lead_time_hours", "mean"),
+        lead_time_median_hours=("lead_time_hours", "median"),
+        lead_time_min_hours=("lead_time_hours", "min"),
+    ).reindex(np.arange(n_customers))
+
+    features = pd.DataFrame(index=pd.Index(customers, name="customer_id"))
+    features["recency_days"] = (
+        (as_of - aggregates["last_order_at"]).dt.total_seconds() / 86400.0
+    ).to_numpy()
+    features["tenure_days"] = (
+        (as_of - aggregates["first_order_at"]).dt.total_seconds() / 86400.0
+    ).to_numpy()
+    for column in [
+        "frequency",
+        "monetary_total",
+        "monetary_mean",
+        "monetary_max",
+        "lead_time_mean_hours",
+        "lead_time_median_hours",
+        "lead_time_min_hours",
+    ]:
+        features[column] = aggregates[column].to_numpy()
+
+    # Route diversity
+    features["distinct_origins"] = _distinct_count(
+        customer_codes, n_customers, orders["origin_location_id"]
+    )
+    features["distinct_destinations"] = _distinct_count(
+        customer_codes, n_customers, orders["destination_location_id"]
+    )
+    routes = (
+        orders["origin_location_id"].astype("string")
+        + ">"
+        + orders["destination_location_id"].astype("string")
+    )
+    features["distinct_routes"] = _distinct_count(customer_codes, n_customers, routes)
+
+    # Mix shares
+    shares = [
+        _share_matrix(customer_codes, n_customers, orders["season"], "season_share"),
+        _share_matrix(
+            customer_codes, n_customers, orders["payment_method"], "payment_share"
+        ),
+    ]
+    # explode repeats the positional row index once per vehicle
+    vehicles = orders["vehicles"].explode()
+    vehicle_names = vehicles.map(VEHICLE_TYPE_NAMES)
+    shares.append(
+        _share_matrix(
+            customer_codes[vehicles.index.to_numpy()],
+            n_customers,
+            vehicle_names.to_numpy(),
+            "vehicle_share",
+        )
+    )
+    for share in shares:
+        share.index = features.index
+        features = features.join(share)
+
+    return features
+
+
+def customer_features_from_json(json_file_path, as_of=None):
+    return build_customer_features(orders_from_json(json_file_path), as_of=as_of)
+
+
+def customer_features_from_export(export_path, as_of=None):
+    return build_customer_features(orders_from_export(export_path), as_of=as_of)
+
+
+# --- Execution --- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build per-customer order features as a Parquet table."
+    )
+    parser.add_argument(
+        "source",
+        nargs="?",
+        default="./../../../data/customersOrdersSeasonsAll.json",
+        help="JSON export of customers, or an NDJSON/Parquet export of ORDER_QUERY",
+    )
+    parser.add_argument("--output", default="customer_features.parquet")
+    parser.add_argument(
+        "--print-query",
+        action="store_true",
+        help="Print the AQL export query for the orders and exit",
+    )
+    args = parser.parse_args()
+    if args.print_query:
+        print(ORDER_QUERY.strip())
+        raise SystemExit(0)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    if args.source.endswith(".json"):
+        features = customer_features_from_json(args.source)
+    else:
+        features = customer_features_from_export(args.source)
+    features.to_parquet(args.output)
+    logging.info(f"Built features for {len(features)} customers.")
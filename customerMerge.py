@@ -0,0 +1,181 @@
+import os
+import json
+import heapq
+import shutil
+import logging
+import tempfile
+from bulkWriter import to_document
+from models import Customer, Order
+
+# --- Defaults --- #
+
+CUSTOMER_MERGE_BUDGET_BYTES = 256 * 1024 * 1024
+# Rough size of one buffered record and of each order or season key in it
+RECORD_OVERHEAD_BYTES = 600
+KEY_OVERHEAD_BYTES = 80
+# Values that do not override an earlier value of the same field; the
+# extractor fills missing ages, phone numbers and countries with these
+EMPTY_VALUES = (None, "", 0)
+
+
+def _new_record():
+    return {"document": None, "seasons": set(), "orders": set(), "emails": set()}
+
+
+def _merge_into(record, other):
+    # Field by field, the first non-empty value in input order wins
+    if other["document"] is not None:
+        if record["document"] is None:
+            record["document"] = dict(other["document"])
+        else:
+            document = record["document"]
+            for field, value in other["document"].items():
+                if document.get(field) in EMPTY_VALUES:
+                    document[field] = value
+    record["seasons"].update(other["seasons"])
+    record["orders"].update(other["orders"])
+    record["emails"].update(other["emails"])
+
+
+def _record_line(key, record):
+    return json.dumps(
+        [
+            key,
+            {
+                "document": record["document"],
+                "seasons": sorted(record["seasons"]),
+                "orders": sorted(record["orders"]),
+                "emails": sorted(record["emails"]),
+            },
+        ],
+        default=str,
+    )
+
+
+def _read_run(path):
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            key, record = json.loads(line)
+            yield key, {
+                "document": record["document"],
+                "seasons": set(record["seasons"]),
+                "orders": set(record["orders"]),
+                "emails": set(record["emails"]),
+            }
+
+
+class CustomerMerger:
+    # Groups customer records by _key across the whole input: a hash map
+    # merges repeats in memory, and when it outgrows the budget it is sorted
+    # and spilled to a run on disk. At the end the runs are k-way merged, so
+    # every customer comes out once with the union of its orders and seasons.
+    def __init__(self, memory_budget_bytes=CUSTOMER_MERGE_BUDGET_BYTES, temp_dir=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.temp_dir = temp_dir
+        self.run_dir = None
+        self.records = {}
+        self.runs = []
+        self.buffered_bytes = 0
+        self.record_count = 0
+        self.merged_count = 0
+        self.conflict_count = 0
+        self.orphan_count = 0
+
+    def add(self, customer_id, document=None, seasons=(), orders=()):
+        record = self.records.get(customer_id)
+        if record is None:
+            record = self.records[customer_id] = _new_record()
+            self.buffered_bytes += RECORD_OVERHEAD_BYTES
+        if document is not None:
+            self.record_count += 1
+            _merge_into(
+                record,
+                {
+                    "document": document,
+                    "seasons": (),
+                    "orders": (),
+                    "emails": [document["email"]] if document.get("email") else [],
+                },
+            )
+        new_keys = len(record["seasons"]) + len(record["orders"])
+        record["seasons"].update(seasons)
+        record["orders"].update(orders)
+        new_keys = len(record["seasons"]) + len(record["orders"]) - new_keys
+        self.buffered_bytes += new_keys * KEY_OVERHEAD_BYTES
+        if self.buffered_bytes > self.memory_budget_bytes:
+            self._spill()
+
+    def add_document(self, json_document, vertex_groups):
+        # The document's customer record, season keys and validated orders;
+        # continuation slices of an oversized document add orders only
+        customer_id = json_document.get("_id")
+        if not customer_id:
+            return
+        customers = vertex_groups.get(Customer) or []
+        seasons = json_document.get("seasons")
+        self.add(
+            customer_id,
+            to_document(customers[0]) if customers else None,
+            list(seasons) if isinstance(seasons, dict) else (),
+            [order._key for order in vertex_groups.get(Order) or []],
+        )
+
+    def _spill(self):
+        if self.run_dir is None:
+            self.run_dir = tempfile.mkdtemp(prefix="customer-runs-", dir=self.temp_dir)
+        path = os.path.join(self.run_dir, f"customers-{len(self.runs):05d}.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(
+                _record_line(key, self.records[key]) + "\n"
+                for key in sorted(self.records)
+            )
+        self.runs.append(path)
+        logging.info(f"Spilled {len(self.records)} customer records to {path}.")
+        self.records = {}
+        self.buffered_bytes = 0
+
+    def _grouped(self):
+        streams = [_read_run(path) for path in self.runs]
+        streams.append((key, self.records[key]) for key in sorted(self.records))
+        current_key = None
+        current = None
+        for key, record in heapq.merge(*streams, key=lambda item: item[0]):
+            if key != current_key:
+                if current is not None:
+                    yield current_key, current
+                current_key = key
+                current = _new_record()
+            _merge_into(current, record)
+        if current is not None:
+            yield current_key, current
+
+    def merged(self):
+        # Yields one consolidated customer document per _key, in key order
+        try:
+            for key, record in self._grouped():
+                if record["document"] is None:
+                    # Orders of a customer whose own record failed validation
+                    self.orphan_count += 1
+                    continue
+                if len(record["emails"]) > 1:
+                    self.conflict_count += 1
+                document = record["document"]
+                document["seasons"] = sorted(record["seasons"])
+                document["order_count"] = len(record["orders"])
+                yield document
+                self.merged_count += 1
+        finally:
+            self.close()
+
+    def log_summary(self):
+        logging.info(
+            f"Merged {self.record_count} customer records into {self.merged_count} customers; {self.conflict_count} had differing emails, {self.orphan_count} had orders but no valid record."
+        )
+
+    def close(self):
+        self.records = {}
+        self.runs = []
+        self.buffered_bytes = 0
+        if self.run_dir is not None:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            self.run_dir = None
@@ -0,0 +1,140 @@
+import os
+import json
+import heapq
+import shutil
+import logging
+import tempfile
+from bulkWriter import to_document
+
+# --- Defaults --- #
+
+SORT_MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+# Rough per-edge overhead of the Python tuple and str held in the sort buffer
+EDGE_OVERHEAD_BYTES = 120
+
+
+def edge_sort_key(edge):
+    return edge["_from"], edge["_to"], edge.get("type") or ""
+
+
+class ExternalEdgeSorter:
+    # Sorts edges per collection by (_from, _to, type) under a memory budget:
+    # full buffers are sorted and spilled to temporary runs, which are k-way
+    # merged at the end. Identical edges meet in the merge and are dropped.
+    def __init__(self, memory_budget_bytes=SORT_MEMORY_BUDGET_BYTES, temp_dir=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.temp_dir = temp_dir
+        self.run_dir = None
+        self.buffers = {}
+        self.runs = {}
+        self.buffered_bytes = 0
+        self.duplicates = {}
+
+    def add(self, collection_name, edge):
+        line = json.dumps(edge, default=str)
+        self.buffers.setdefault(collection_name, []).append((edge_sort_key(edge), line))
+        self.buffered_bytes += len(line) + EDGE_OVERHEAD_BYTES
+        if self.buffered_bytes > self.memory_budget_bytes:
+            self._spill()
+
+    def _spill(self):
+        if self.run_dir is None:
+            self.run_dir = tempfile.mkdtemp(prefix="edge-runs-", dir=self.temp_dir)
+        for collection_name, buffer in self.buffers.items():
+            if not buffer:
+                continue
+            buffer.sort(key=lambda item: item[0])
+            runs = self.runs.setdefault(collection_name, [])
+            path = os.path.join(
+                self.run_dir, f"{collection_name}-{len(runs):05d}.jsonl"
+            )
+            with open(path, "w", encoding="utf-8") as file:
+                file.writelines(line + "\n" for _, line in buffer)
+            runs.append(path)
+        logging.info(
+            f"Spilled {sum(len(buffer) for buffer in self.buffers.values())} edges to sorted runs."
+        )
+        self.buffers = {}
+        self.buffered_bytes = 0
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                edge = json.loads(line)
+                yield edge_sort_key(edge), edge
+
+    def _sorted_collection(self, collection_name):
+        buffer = self.buffers.pop(collection_name, [])
+        buffer.sort(key=lambda item: item[0])
+        streams = [self._read_run(path) for path in self.runs.get(collection_name, [])]
+        streams.append((key, json.loads(line)) for key, line in buffer)
+
+        previous_key = None
+        duplicates = 0
+        for key, edge in heapq.merge(*streams, key=lambda item: item[0]):
+            if key == previous_key:
+                duplicates += 1
+                continue
+            previous_key = key
+            yield edge
+        self.duplicates[collection_name] = duplicates
+
+    def sorted_edges(self):
+        # Yields (collection_name, edge), one collection at a time
+        try:
+            for collection_name in sorted(set(self.buffers) | set(self.runs)):
+                for edge in self._sorted_collection(collection_name):
+                    yield collection_name, edge
+        finally:
+            self.close()
+
+    def close(self):
+        self.buffers = {}
+        self.runs = {}
+        self.buffered_bytes = 0
+        if self.run_dir is not None:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            self.run_dir = None
+
+
+class SortingEdgeWriter:
+    # Wraps a BulkWriter or ShardWriter: vertices pass straight through,
+    # edges are held in an ExternalEdgeSorter and written sorted and
+    # deduplicated when the writer is closed.
+    def __init__(
+        self, writer, memory_budget_bytes=SORT_MEMORY_BUDGET_BYTES, temp_dir=None
+    ):
+        self.writer = writer
+        self.sorter = ExternalEdgeSorter(memory_budget_bytes, temp_dir)
+
+    @property
+    def created(self):
+        return self.writer.created
+
+    def add(self, collection_name, entity):
+        document = to_document(entity)
+        if "_from" in document:
+            self.sorter.add(collection_name, document)
+        else:
+            self.writer.add(collection_name, document)
+
+    def flush_all(self):
+        self.writer.flush_all()
+
+    def close(self):
+        self.writer.flush_all()
+        for collection_name, edge in self.sorter.sorted_edges():
+            self.writer.add(collection_name, edge)
+        for collection_name, duplicates in sorted(self.sorter.duplicates.items()):
+            if duplicates:
+                logging.info(
+                    f"Dropped {duplicates} duplicate {collection_name} edges while merging."
+                )
+        self.writer.close()
+
+    def summary(self):
+        return self.writer.summary()
+
+    def log_summary(self):
+        self.writer.log_summary()
@@ -0,0 +1,274 @@
+import os
+import json
+import gzip
+import shutil
+import tempfile
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from arangoConnection import get_db
+
+# --- Setup & Configuration --- #
+
+DEFAULT_BATCH_SIZE = 1000
+# Server-side lifetime of an idle stream cursor, in seconds
+CURSOR_TTL = 600
+
+
+# --- Cursor Streaming --- #
+
+
+def stream_query(db, query, bind_vars=None, batch_size=DEFAULT_BATCH_SIZE):
+    # A stream cursor makes the server produce results lazily, so neither side
+    # ever holds more than one batch of the result set.
+    cursor = db.aql.execute(
+        query,
+        bind_vars=bind_vars or {},
+        batch_size=batch_size,
+        stream=True,
+        ttl=CURSOR_TTL,
+    )
+    try:
+        while True:
+            batch = list(cursor.batch())
+            if batch:
+                yield batch
+            cursor.batch().clear()
+            if not cursor.has_more():
+                break
+            cursor.fetch()
+    finally:
+        try:
+            cursor.close(ignore_missing=True)
+        except Exception as e:
+            logging.warning("Error closing cursor: %s", str(e))
+
+
+def collection_query(key_range=None):
+    lower, upper = key_range if key_range else (None, None)
+    filters = []
+    if lower is not None:
+        filters.append("FILTER doc._key >= @lower")
+    if upper is not None:
+        filters.append("FILTER doc._key < @upper")
+    query = " ".join(["FOR doc IN @@collection"] + filters + ["RETURN doc"])
+    bind_vars = {}
+    if lower is not None:
+        bind_vars["lower"] = lower
+    if upper is not None:
+        bind_vars["upper"] = upper
+    return query, bind_vars
+
+
+def key_range_partitions(db, collection_name, partitions):
+    # Split the primary index into roughly equal key ranges. Every boundary is
+    # a single sorted index lookup, no documents are read.
+    if partitions <= 1:
+        return [(None, None)]
+    count = db.collection(collection_name).count()
+    boundaries = []
+    for i in range(1, partitions):
+        offset = count * i // partitions
+        result = list(
+            db.aql.execute(
+                "FOR doc IN @@collection SORT doc._key LIMIT @offset, 1 RETURN doc._key",
+                bind_vars={"@collection": collection_name, "offset": offset},
+            )
+        )
+        if result and (not boundaries or result[0] != boundaries[-1]):
+            boundaries.append(result[0])
+    edges = [None] + boundaries + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+# --- Output Writers --- #
+
+
+class NdjsonWriter:
+    def __init__(self, path):
+        self.path = path
+        if path.endswith(".gz"):
+            self.file = gzip.open(path, "wt", encoding="utf-8")
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+
+    def write_batch(self, rows):
+        self.file.write("".join(json.dumps(row, default=str) + "\n" for row in rows))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    # A Parquet file has one schema, but a batch only shows the fields and
+    # types its own rows happen to have. Batches are spooled to Arrow files
+    # with their own inferred schema, and on close the schemas are unified
+    # (null fields take the type seen later, late fields are added) and the
+    # spool is rewritten one batch at a time.
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export requires the pyarrow package")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.spool_dir = None
+        self.spool_paths = []
+        self.schemas = []
+
+    def write_batch(self, rows):
+        table = self.pa.Table.from_pylist(rows)
+        if self.spool_dir is None:
+            directory, name = os.path.split(self.path)
+            self.spool_dir = tempfile.mkdtemp(
+                prefix=f".{name}.spool-", dir=directory or None
+            )
+        spool_path = os.path.join(self.spool_dir, f"{len(self.spool_paths):06d}.arrow")
+        with self.pa.ipc.new_file(spool_path, table.schema) as spool:
+            spool.write_table(table)
+        self.spool_paths.append(spool_path)
+        self.schemas.append(table.schema)
+
+    def unified_schema(self):
+        try:
+            return self.pa.unify_schemas(self.schemas, promote_options="permissive")
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError) as e:
+            raise ValueError(f"Cannot write {self.path}: {e}") from e
+
+    def close(self):
+        if self.spool_dir is None:
+            return
+        try:
+            schema = self.unified_schema()
+            with self.pq.ParquetWriter(self.path, schema) as writer:
+                for spool_path in self.spool_paths:
+                    with self.pa.memory_map(spool_path) as source:
+                        table = self.pa.ipc.open_file(source).read_all()
+                    # Rebuilt from rows so nested structs gain missing fields too
+                    writer.write_table(
+                        self.pa.Table.from_pylist(table.to_pylist(), schema=schema)
+                    )
+        finally:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+            self.spool_dir = None
+
+
+WRITERS = {"ndjson": NdjsonWriter, "parquet": ParquetWriter}
+
+
+def partition_path(output_path, index, partitions):
+    if partitions <= 1:
+        return output_path
+    directory, name = os.path.split(output_path)
+    base, dot, ext = name.partition(".")
+    return os.path.join(directory, f"{base}.part-{index:04d}{dot}{ext}")
+
+
+# --- Export Functions --- #
+
+
+def export_stream(db, query, bind_vars, output_path, fmt, batch_size):
+    writer = WRITERS[fmt](output_path)
+    exported_count = 0
+    try:
+        for batch in stream_query(db, query, bind_vars, batch_size):
+            writer.write_batch(batch)
+            exported_count += len(batch)
+    finally:
+        writer.close()
+    logging.info(f"Exported {exported_count} documents to {output_path}.")
+    return exported_count
+
+
+def export_collection(
+    db,
+    collection_name,
+    output_path,
+    fmt="ndjson",
+    batch_size=DEFAULT_BATCH_SIZE,
+    partitions=1,
+):
+    key_ranges = key_range_partitions(db, collection_name, partitions)
+    jobs = []
+    for index, key_range in enumerate(key_ranges):
+        query, bind_vars = collection_query(key_range)
+        bind_vars["@collection"] = collection_name
+        path = partition_path(output_path, index, len(key_ranges))
+        jobs.append((query, bind_vars, path))
+
+    if len(jobs) == 1:
+        query, bind_vars, path = jobs[0]
+        return export_stream(db, query, bind_vars, path, fmt, batch_size)
+
+    # Every partition gets its own stream cursor and its own output file
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = [
+            executor.submit(export_stream, db, query, bind_vars, path, fmt, batch_size)
+            for query, bind_vars, path in jobs
+        ]
+        exported_count = sum(future.result() for future in futures)
+
+    logging.info(
+        f"Finished exporting {collection_name}. Total documents: {exported_count} in {len(jobs)} partitions."
+    )
+    return exported_count
+
+
+def export_query(
+    db, query, output_path, bind_vars=None, fmt="ndjson", batch_size=DEFAULT_BATCH_SIZE
+):
+    return export_stream(db, query, bind_vars, output_path, fmt, batch_size)
+
+
+# --- Execution --- #
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stream an ArangoDB collection or AQL query to NDJSON or Parquet."
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--collection", help="Collection to export, e.g. order")
+    source.add_argument("--query", help="AQL query to export")
+    parser.add_argument(
+        "--bind-vars", default="{}", help="JSON object of AQL bind variables"
+    )
+    parser.add_argument("--output", required=True, help="Output file path")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="ndjson")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        default=1,
+        help="Number of key-range partitions exported concurrently (collections only)",
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    args = parse_args()
+    db = get_db()
+    if args.collection:
+        export_collection(
+            db,
+            args.collection,
+            args.output,
+            fmt=args.format,
+            batch_size=args.batch_size,
+            partitions=args.partitions,
+        )
+    else:
+        export_query(
+            db,
+            args.query,
+            args.output,
+            bind_vars=json.loads(args.bind_vars),
+            fmt=args.format,
+            batch_size=args.batch_size,
+        )
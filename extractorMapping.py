@@ -0,0 +1,1096 @@
+import time
+import logging
+import argparse
+import datetime
+from importlib import metadata
+from marshmallow import missing
+from jsonExtractPrep import (
+    DETAIL_PATH,
+    VEHICLE_TYPE_NAMES,
+    write_customer_sample,
+    assign_order_seasons,
+    extract_edge_candidates,
+    HEADER_EXTRACTORS,
+)
+from bulkWriter import to_document
+from keyRegistry import intern_name, edge_key
+from addressNormalization import address_index, address_key
+from seasonCalendar import season_calendar, departure_days, DATE_FORMAT
+from frameValidation import DOCUMENT_EXTRACTORS, CHUNK_SIZE
+from projectedParser import (
+    projected_items,
+    projection_for,
+    is_slice,
+    ANY_KEY,
+    ARRAY_ITEM,
+    KEYS_ONLY,
+    OVERSIZED_DETAILS,
+)
+from models import (
+    Address,
+    Country,
+    Location,
+    Customer,
+    Season,
+    Order,
+    PaymentMethod,
+    VehicleType,
+    UsesVehicle,
+    LocatedIn,
+    MadeOrder,
+    Visited,
+    DepartFrom,
+    ArriveAt,
+    PaymentBy,
+    OriginatedFrom,
+    OrderFromLocation,
+    OrderByCustomer,
+    OrderInSeason,
+)
+
+# --- Defaults --- #
+
+BENCHMARK_ROUNDS = 3
+COUNTRY_PATH = "{countryData,originCountryData,destinationCountryData}"
+LOCATION_PATH = f"{DETAIL_PATH}.{{originLocationData,destinationLocationData}}"
+ORIGIN_PATH = f"{DETAIL_PATH}.originLocationData"
+DESTINATION_PATH = f"{DETAIL_PATH}.destinationLocationData"
+# Field values check_entity_state builds its sample entities from, by
+# field type; other fields get a string
+ENTITY_PROBES = {
+    "Integer": 1,
+    "Float": 1.5,
+    "Boolean": True,
+    "Date": datetime.date(2000, 1, 1),
+    "DateTime": datetime.datetime(2000, 1, 1),
+}
+# The arango_orm release whose instance state _emit_entity reproduces;
+# under any other release entities are built by the constructor
+ENTITY_STATE_VERSION = "0.7.2"
+
+
+def _arango_orm_version():
+    try:
+        return metadata.version("arango-orm")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+BARE_ENTITIES = _arango_orm_version() == ENTITY_STATE_VERSION
+
+
+# --- Converters --- #
+
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value, DATE_FORMAT)
+
+
+def _season_name(season_key):
+    # Assuming the format is "Season-YYYY"
+    return intern_name(season_key.split("-")[1])
+
+
+def _season_keys(departures):
+    return season_calendar.season_keys(departure_days(departures))
+
+
+# Conversions a field or an edge endpoint names by its "type"; bulk ones
+# take the values of a whole document in one call
+CONVERTERS = {
+    "str": str,
+    "intern": intern_name,
+    "date": _parse_date,
+    "season_name": _season_name,
+    "address_key": address_key,
+}
+BULK_CONVERTERS = {"season_key": _season_keys}
+
+# --- Mappings --- #
+
+# A vertex mapping builds one entity per record found at "record", a dotted
+# path as in @reads: "*" is every map value, "item" every array element and
+# "{a,b}" each of the listed keys the parent has. Field paths are dotted
+# from the document too and lie under the record; "{}" after a "*" is the
+# key it matched.
+#   fields: field, path, type (a CONVERTERS name), required, default (for
+#       None), empty (for falsy values), lookup (table of the converted
+#       value) and lookup_error
+#   error_key: name and path of the value errors are reported with
+#   missing_error: raised when a required field is empty; {record} is the
+#       key an "{a,b}" matched
+#   present: paths the record must have, it is skipped otherwise
+#   skip_empty: a missing or empty record is skipped
+#   skip_none: a missing or None record is skipped, falsy values are kept
+#   as_dict / build: plain dicts, or a callable making them from the record
+#   on_valid: called with the field values of every valid entity
+#   finish: called with the validated entities of each document
+#   header: read from the document header only, not from its slices
+#   catch: errors are reported instead of raised, the default
+VERTEX_MAPPINGS = [
+    {
+        "model": Customer,
+        "record": "",
+        "header": True,
+        "present": ["_id", "email"],
+        "fields": [
+            {"field": "_key", "path": "_id", "required": True},
+            {"field": "email", "path": "email", "required": True},
+            {"field": "age", "path": "age", "default": 0},
+            {"field": "phone_number", "path": "phoneNumber", "empty": ""},
+            {
+                "field": "country_name",
+                "path": "countryName",
+                "type": "intern",
+                "empty": "",
+            },
+        ],
+        "error_key": ("customer_id", "_id"),
+        "missing_error": "Missing required fields",
+        "finish": write_customer_sample,
+    },
+    {
+        "model": Country,
+        "record": COUNTRY_PATH,
+        "header": True,
+        "fields": [
+            {
+                "field": "_key",
+                "path": f"{COUNTRY_PATH}._id",
+                "type": "intern",
+                "required": True,
+            },
+            {
+                "field": "country_name",
+                "path": f"{COUNTRY_PATH}.englishName",
+                "type": "intern",
+                "required": True,
+            },
+        ],
+        "error_key": ("country_id", f"{COUNTRY_PATH}._id"),
+        "missing_error": "Missing required fields for {record}",
+        # Resolves the country names of addresses
+        "on_valid": address_index.learn_country,
+    },
+    {
+        "model": Location,
+        "record": LOCATION_PATH,
+        "as_dict": True,
+        "fields": [
+            {
+                "field": "_key",
+                "path": f"{LOCATION_PATH}._id",
+                "type": "intern",
+                "required": True,
+            },
+            {
+                "field": "location_name",
+                "path": f"{LOCATION_PATH}.name",
+                "type": "intern",
+                "required": True,
+            },
+        ],
+        "error_key": ("location_id", f"{LOCATION_PATH}._id"),
+        "missing_error": "Missing required fields for {record}",
+    },
+    {
+        "model": Season,
+        "record": "seasons.*",
+        "header": True,
+        "fields": [
+            {"field": "_key", "path": "seasons.*.{}", "type": "intern"},
+            {"field": "name", "path": "seasons.*.{}", "type": "season_name"},
+        ],
+        "error_key": ("season_key", "seasons.*.{}"),
+    },
+    {
+        "model": Address,
+        "record": f"{LOCATION_PATH}.address",
+        # Keyed by the normalized address, so every upstream ID of the same
+        # physical address maps to one vertex
+        "build": address_index.canonicalize,
+        "fields": [
+            {"path": f"{LOCATION_PATH}.address._id", "required": True},
+            {"path": f"{LOCATION_PATH}.address.city", "required": True},
+            {"path": f"{LOCATION_PATH}.address.countryId", "required": True},
+        ],
+        "error_key": ("address_id", f"{LOCATION_PATH}.address._id"),
+        "missing_error": "Missing required fields for address",
+    },
+    {
+        "model": Order,
+        "record": DETAIL_PATH,
+        "fields": [
+            {"field": "_key", "path": f"{DETAIL_PATH}.orderId", "required": True},
+            {"field": "total_price", "path": f"{DETAIL_PATH}.totalPrice"},
+            {
+                "field": "order_created_at",
+                "path": f"{DETAIL_PATH}.orderCreatedAt",
+                "type": "date",
+                "required": True,
+            },
+            {
+                "field": "departure_at",
+                "path": f"{DETAIL_PATH}.departureAt",
+                "type": "date",
+                "required": True,
+            },
+        ],
+        "error_key": ("order_id", f"{DETAIL_PATH}.orderId"),
+        "missing_error": "Missing required fields for order",
+        "finish": assign_order_seasons,
+    },
+    {
+        "model": PaymentMethod,
+        "record": f"{DETAIL_PATH}.paymentMethod",
+        "skip_none": True,
+        "fields": [
+            {"field": "_key", "path": f"{DETAIL_PATH}.paymentMethod", "type": "str"},
+            {
+                "field": "method_name",
+                "path": f"{DETAIL_PATH}.paymentMethod",
+                "type": "str",
+            },
+        ],
+        "error_key": ("payment_method_id", f"{DETAIL_PATH}.paymentMethod"),
+    },
+    {
+        "model": VehicleType,
+        "record": f"{DETAIL_PATH}.vehicles.item",
+        "catch": False,
+        "fields": [
+            {"field": "_key", "path": f"{DETAIL_PATH}.vehicles.item", "type": "str"},
+            {
+                "field": "type_name",
+                "path": f"{DETAIL_PATH}.vehicles.item",
+                "type": "str",
+                "lookup": VEHICLE_TYPE_NAMES,
+                "lookup_error": "Invalid vehicle type ID",
+            },
+        ],
+        "error_key": ("vehicle_id", f"{DETAIL_PATH}.vehicles.item"),
+    },
+]
+
+# An edge mapping yields one edge per record whose endpoints pass their
+# check. Records that are missing or empty are skipped.
+#   from / to: collection, path, type (a CONVERTERS or BULK_CONVERTERS
+#       name) and check of the converted value: "truthy", the default,
+#       "not_none" or None
+#   when: paths that must be truthy as well
+#   data: constant fields of every edge
+#   keyed: the edge's _key is derived from its endpoints (edge_key), for
+#       edges implied again by every record that mentions them
+EDGE_MAPPINGS = [
+    {
+        "model": OriginatedFrom,
+        "record": "",
+        "from": {"collection": "customer", "path": "_id"},
+        "to": {"collection": "country", "path": "countryData._id"},
+        "keyed": True,
+    },
+    {
+        "model": OrderInSeason,
+        "record": DETAIL_PATH,
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        # Calendar seasons of the whole document in one lookup
+        "to": {
+            "collection": "season",
+            "path": f"{DETAIL_PATH}.departureAt",
+            "type": "season_key",
+        },
+    },
+    {
+        "model": MadeOrder,
+        "record": DETAIL_PATH,
+        "from": {"collection": "customer", "path": "_id"},
+        "to": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+    },
+    {
+        "model": OrderByCustomer,
+        "record": DETAIL_PATH,
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        "to": {"collection": "customer", "path": "_id"},
+        "data": {"type": "lead_customer"},
+    },
+    {
+        "model": UsesVehicle,
+        "record": f"{DETAIL_PATH}.vehicles.item",
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        "to": {
+            "collection": "vehicle_type",
+            "path": f"{DETAIL_PATH}.vehicles.item",
+            "check": None,
+        },
+    },
+    {
+        "model": PaymentBy,
+        "record": DETAIL_PATH,
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        "to": {
+            "collection": "payment_method",
+            "path": f"{DETAIL_PATH}.paymentMethod",
+            "check": "not_none",
+        },
+    },
+    {
+        "model": Visited,
+        "record": LOCATION_PATH,
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        "to": {"collection": "location", "path": f"{LOCATION_PATH}._id"},
+    },
+    {
+        "model": OrderFromLocation,
+        "record": ORIGIN_PATH,
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        "to": {"collection": "location", "path": f"{ORIGIN_PATH}._id"},
+        "data": {"type": "originated"},
+    },
+    {
+        "model": OrderFromLocation,
+        "record": DESTINATION_PATH,
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        "to": {"collection": "location", "path": f"{DESTINATION_PATH}._id"},
+        "data": {"type": "destined"},
+    },
+    {
+        "model": LocatedIn,
+        "record": LOCATION_PATH,
+        "when": [f"{DETAIL_PATH}.orderId"],
+        "from": {"collection": "location", "path": f"{LOCATION_PATH}._id"},
+        "to": {"collection": "country", "path": f"{LOCATION_PATH}.countryId"},
+        "keyed": True,
+    },
+    {
+        "model": DepartFrom,
+        "record": ORIGIN_PATH,
+        "when": [f"{ORIGIN_PATH}.address._id"],
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        "to": {
+            "collection": "address",
+            "path": f"{ORIGIN_PATH}.address",
+            "type": "address_key",
+            "check": None,
+        },
+    },
+    {
+        "model": ArriveAt,
+        "record": DESTINATION_PATH,
+        "when": [f"{DESTINATION_PATH}.address._id"],
+        "from": {"collection": "order", "path": f"{DETAIL_PATH}.orderId"},
+        "to": {
+            "collection": "address",
+            "path": f"{DESTINATION_PATH}.address",
+            "type": "address_key",
+            "check": None,
+        },
+    },
+]
+
+
+# --- Paths --- #
+
+
+def _split(path):
+    return path.split(".") if path else []
+
+
+def _alternatives(segment):
+    if segment.startswith("{") and segment != KEYS_ONLY:
+        return segment[1:-1].split(",")
+    return None
+
+
+def _resolve(path, choice):
+    # The path with the "{a,b}" segments of the record replaced by the keys
+    # of one combination
+    segments = _split(path)
+    for index, key in choice.items():
+        if index < len(segments) and _alternatives(segments[index]):
+            segments[index] = key
+    return ".".join(segments)
+
+
+def _expand(mapping, index):
+    # One concrete mapping per combination of keys of the record's "{a,b}"
+    # segments, in the order they are listed
+    segments = _split(mapping["record"])
+    choices = [{}]
+    for position, segment in enumerate(segments):
+        keys = _alternatives(segment)
+        if keys:
+            choices = [{**choice, position: key} for choice in choices for key in keys]
+    expanded = []
+    for choice in choices:
+        concrete = dict(mapping, index=index, alternatives=set(choice))
+        concrete["record"] = _resolve(mapping["record"], choice)
+        concrete["fields"] = [
+            dict(field, path=_resolve(field["path"], choice))
+            for field in mapping.get("fields", [])
+        ]
+        concrete["present"] = [
+            _resolve(path, choice) for path in mapping.get("present", [])
+        ]
+        concrete["when"] = [_resolve(path, choice) for path in mapping.get("when", [])]
+        if "error_key" in mapping:
+            name, path = mapping["error_key"]
+            concrete["error_key"] = (name, _resolve(path, choice))
+        if "missing_error" in mapping:
+            record_key = choice[max(choice)] if choice else ""
+            concrete["missing_error"] = mapping["missing_error"].format(
+                record=record_key
+            )
+        for side in ["from", "to"]:
+            if side in mapping:
+                concrete[side] = dict(
+                    mapping[side], path=_resolve(mapping[side]["path"], choice)
+                )
+        expanded.append(concrete)
+    return expanded
+
+
+def _mapping_paths(mapping):
+    # Document paths a concrete mapping reads, for @reads
+    paths = [field["path"] for field in mapping["fields"]]
+    paths += mapping["present"] + mapping["when"]
+    paths += [mapping[side]["path"] for side in ["from", "to"] if side in mapping]
+    if "error_key" in mapping:
+        paths.append(mapping["error_key"][1])
+    if "build" in mapping:
+        paths.append(mapping["record"])
+    return [path for path in paths if path]
+
+
+def _segment_kind(segments, position, mapping, skip_empty):
+    segment = segments[position]
+    if segment == ANY_KEY:
+        return "map"
+    if segment == ARRAY_ITEM:
+        return "array"
+    if position in mapping["alternatives"] or position == len(segments) - 1:
+        if skip_empty == "none":
+            return "notnone"
+        if skip_empty:
+            return "nonempty"
+        if position in mapping["alternatives"]:
+            return "present"
+    if position + 1 < len(segments) and segments[position + 1] == ARRAY_ITEM:
+        return "list"
+    return "dict"
+
+
+def _scope_tree(mappings, skip_empty=None):
+    # Mappings grouped by record path, so records shared by several
+    # mappings are walked once; scopes keep the order mappings name them
+    root = {"path": [], "mappings": [], "children": {}}
+    for mapping in mappings:
+        node = root
+        segments = _split(mapping["record"])
+        skip = skip_empty
+        if skip is None:
+            skip = "none" if mapping.get("skip_none") else mapping.get("skip_empty")
+        for position, segment in enumerate(segments):
+            kind = _segment_kind(segments, position, mapping, skip)
+            child = node["children"].get((segment, kind))
+            if child is None:
+                child = node["children"][(segment, kind)] = {
+                    "path": segments[: position + 1],
+                    "mappings": [],
+                    "children": {},
+                }
+            node = child
+        node["mappings"].append(mapping)
+    return root
+
+
+# --- Code Generation --- #
+
+
+class _Source:
+    # Lines of a generated function and the objects it binds by name; bound
+    # objects become closure variables, looked up once per call site
+    def __init__(self):
+        self.lines = []
+        self.names = {}
+        self.count = 0
+
+    def add(self, depth, line):
+        self.lines.append("    " * depth + line)
+
+    def bind(self, prefix, value):
+        for name, bound in self.names.items():
+            if bound is value:
+                return name
+        name = f"{prefix}_{len(self.names)}"
+        self.names[name] = value
+        return name
+
+    def variable(self, prefix):
+        self.count += 1
+        return f"{prefix}_{self.count}"
+
+    def build(self, name, json_paths):
+        body = "\n".join("        " + line for line in self.lines)
+        text = (
+            f"def _make({', '.join(self.names)}):\n"
+            f"    def {name}(json_document):\n{body}\n"
+            f"    return {name}\n"
+        )
+        namespace = {}
+        exec(compile(text, f"<{name}>", "exec"), namespace)
+        function = namespace["_make"](**self.names)
+        function.json_paths = tuple(sorted(set(json_paths)))
+        function.source = text
+        return function
+
+
+def _read(path, scopes):
+    # Expression for the value at path, read from the innermost scope that
+    # holds it
+    segments = _split(path)
+    if segments and segments[-1] == KEYS_ONLY:
+        for scope_path, _, key_variable in reversed(scopes):
+            if scope_path == segments[:-1] and key_variable:
+                return key_variable
+        raise ValueError(f"{path} is not the key of a record scope")
+    for scope_path, variable, _ in reversed(scopes):
+        if segments[: len(scope_path)] == scope_path:
+            rest = segments[len(scope_path) :]
+            if ANY_KEY in rest or ARRAY_ITEM in rest:
+                break
+            expression = variable
+            for segment in rest[:-1]:
+                expression += f".get({segment!r}, {{}})"
+            if rest:
+                expression += f".get({rest[-1]!r})"
+            return expression
+    raise ValueError(f"{path} is not under the record scopes")
+
+
+def _emit_scope(source, node, variable, key_variable, scopes, depth, emit_mapping):
+    scopes = scopes + [(node["path"], variable, key_variable)]
+    for mapping in node["mappings"]:
+        emit_mapping(source, mapping, scopes, depth)
+    for (segment, kind), child in node["children"].items():
+        child_variable = source.variable("node")
+        child_key = None
+        child_depth = depth + 1
+        if kind == "map":
+            child_key = source.variable("key")
+            source.add(
+                depth, f"for {child_key}, {child_variable} in {variable}.items():"
+            )
+        elif kind == "array":
+            source.add(depth, f"for {child_variable} in {variable}:")
+        elif kind == "present":
+            source.add(depth, f"if {segment!r} in {variable}:")
+            source.add(child_depth, f"{child_variable} = {variable}[{segment!r}]")
+        elif kind == "nonempty":
+            source.add(depth, f"{child_variable} = {variable}.get({segment!r})")
+            source.add(depth, f"if {child_variable}:")
+        elif kind == "notnone":
+            source.add(depth, f"{child_variable} = {variable}.get({segment!r})")
+            source.add(depth, f"if {child_variable} is not None:")
+        else:
+            default = "[]" if kind == "list" else "{}"
+            source.add(
+                depth, f"{child_variable} = {variable}.get({segment!r}, {default})"
+            )
+            child_depth = depth
+        _emit_scope(
+            source, child, child_variable, child_key, scopes, child_depth, emit_mapping
+        )
+
+
+def _emit_entity(source, depth, entity, model, values):
+    # The one place that knows arango_orm's instance state. Collection's
+    # constructor sets every field through __setattr__, which costs more
+    # than the rest of the compiled extraction; instead the instance is
+    # created bare and given the dict the constructor would leave: every
+    # schema field set and marked dirty, unmapped fields at their default.
+    # Only done under the pinned ENTITY_STATE_VERSION, and check_entity_state
+    # still compares the result with the constructor's on startup.
+    bound = source.bind("model", model)
+    if not BARE_ENTITIES:
+        arguments = ", ".join(f"{name}={value}" for name, value in values.items())
+        source.add(depth, f"{entity} = {bound}({arguments})")
+        return
+    items = ['"_dirty": {' + ", ".join(repr(name) for name in model._fields) + "}"]
+    items.append('"_refs_vals": {}')
+    if "_key" not in model._fields and "_key" not in values:
+        items.append('"_key": None')
+    for name, field in model._fields.items():
+        if name in values:
+            value = values[name]
+        elif field.default is missing:
+            value = "None"
+        elif callable(field.default):
+            value = f"{source.bind('default', field.default)}()"
+        else:
+            value = source.bind("default", field.default)
+        items.append(f"{name!r}: {value}")
+    for name, value in values.items():
+        if name not in model._fields:
+            items.append(f"{name!r}: {value}")
+    source.names.update(new=object.__new__, set_state=object.__setattr__)
+    source.add(depth, f"{entity} = new({bound})")
+    source.add(depth, f"set_state({entity}, '__dict__', {{{', '.join(items)}}})")
+
+
+def check_entity_state(model, field_names):
+    # Builds one entity with _emit_entity and one with the constructor from
+    # the same values; raises if arango_orm's instance state has changed
+    values = {}
+    for name in field_names:
+        field = model._fields.get(name)
+        values[name] = ENTITY_PROBES.get(type(field).__name__, f"probe_{name}")
+    source = _Source()
+    _emit_entity(
+        source,
+        0,
+        "entity",
+        model,
+        {name: source.bind("probe", value) for name, value in values.items()},
+    )
+    source.add(0, "return entity")
+    compiled = source.build(f"new_{model.__name__}", [])({})
+    constructed = model(**values)
+    if vars(compiled) != vars(constructed) or compiled._dump() != constructed._dump():
+        raise ValueError(
+            f"Compiled {model.__name__} entities differ from the constructor's, "
+            "update _emit_entity for this arango_orm version"
+        )
+
+
+def _emit_vertex(source, mapping, scopes, depth):
+    index = mapping["index"]
+    source.add(depth, f"# {mapping['model'].__name__} at {mapping['record'] or '$'}")
+    if mapping.get("header"):
+        source.add(depth, "if header:")
+        depth += 1
+    if mapping["present"]:
+        checks = []
+        for path in mapping["present"]:
+            segments = _split(path)
+            parent = _read(".".join(segments[:-1]), scopes)
+            checks.append(f"{segments[-1]!r} in {parent}")
+        source.add(depth, f"if {' and '.join(checks)}:")
+        depth += 1
+
+    raw = {}
+    for path in [field["path"] for field in mapping["fields"]] + [
+        mapping["error_key"][1]
+    ]:
+        if path not in raw:
+            raw[path] = source.variable("raw")
+            source.add(depth, f"{raw[path]} = {_read(path, scopes)}")
+    error_name, error_path = mapping["error_key"]
+    error_value = raw[error_path]
+
+    catch = mapping.get("catch", True)
+    try_depth = depth
+    if catch:
+        source.add(depth, "try:")
+        depth += 1
+    required = [
+        raw[field["path"]] for field in mapping["fields"] if field.get("required")
+    ]
+    if required:
+        source.add(depth, f"if not ({' and '.join(required)}):")
+        source.add(depth + 1, f"raise ValueError({mapping['missing_error']!r})")
+
+    values = {}
+    for field in mapping["fields"]:
+        if "field" not in field:
+            continue
+        value = raw[field["path"]]
+        if "type" in field or "default" in field or "empty" in field:
+            value = source.variable("value")
+            expression = raw[field["path"]]
+            if "type" in field:
+                converter = source.bind("convert", CONVERTERS[field["type"]])
+                expression = f"{converter}({expression})"
+            source.add(depth, f"{value} = {expression}")
+            if "default" in field:
+                source.add(depth, f"if {value} is None:")
+                source.add(depth + 1, f"{value} = {field['default']!r}")
+            if "empty" in field:
+                source.add(depth, f"if not {value}:")
+                source.add(depth + 1, f"{value} = {field['empty']!r}")
+        values[field["field"]] = value
+
+    for field in mapping["fields"]:
+        if "lookup" not in field:
+            continue
+        value = values[field["field"]]
+        lookup = source.bind("lookup", field["lookup"])
+        source.add(depth, f"{value} = {lookup}.get({value})")
+        source.add(depth, f"if not {value}:")
+        source.add(
+            depth + 1,
+            f"errored_{index}.append({{{error_name!r}: {error_value}, 'error': {field['lookup_error']!r}}})",
+        )
+        source.add(depth, "else:")
+        depth += 1
+
+    entity = source.variable("entity")
+    if "build" in mapping:
+        build = source.bind("build", mapping["build"])
+        record = _read(mapping["record"], scopes)
+        source.add(depth, f"{entity} = {build}({record})")
+    elif mapping.get("as_dict"):
+        items = ", ".join(f"{name!r}: {value}" for name, value in values.items())
+        source.add(depth, f"{entity} = {{{items}}}")
+    else:
+        _emit_entity(source, depth, entity, mapping["model"], values)
+    source.add(depth, f"validated_{index}.append({entity})")
+    if "on_valid" in mapping:
+        on_valid = source.bind("on_valid", mapping["on_valid"])
+        source.add(depth, f"{on_valid}({', '.join(values.values())})")
+
+    if catch:
+        source.add(try_depth, "except Exception as e:")
+        source.add(
+            try_depth + 1,
+            f"errored_{index}.append({{{error_name!r}: {error_value}, 'error': str(e)}})",
+        )
+
+
+def _endpoint_check(endpoint, value):
+    check = endpoint.get("check", "truthy")
+    if check == "truthy":
+        return value
+    if check == "not_none":
+        return f"{value} is not None"
+    return None
+
+
+def _edge_expression(mapping, from_value, to_value):
+    handles = [
+        f"f'{mapping['from']['collection']}/{{{from_value}}}'",
+        f"f'{mapping['to']['collection']}/{{{to_value}}}'",
+    ]
+    items = [f"'_from': {handles[0]}", f"'_to': {handles[1]}"]
+    if mapping.get("keyed"):
+        items.insert(0, f"'_key': edge_key({', '.join(handles)})")
+    items += [f"{name!r}: {value!r}" for name, value in mapping.get("data", {}).items()]
+    return "{" + ", ".join(items) + "}"
+
+
+def _emit_edge(source, mapping, scopes, depth):
+    model = source.bind("model", mapping["model"])
+    source.add(depth, f"# {mapping['model'].__name__} at {mapping['record'] or '$'}")
+    endpoints = {}
+    for side in ["from", "to"]:
+        endpoints[side] = source.variable(side)
+        source.add(depth, f"{endpoints[side]} = {_read(mapping[side]['path'], scopes)}")
+    conditions = [_read(path, scopes) for path in mapping["when"]]
+    bulk = None
+    converted = []
+    for side in ["from", "to"]:
+        endpoint = mapping[side]
+        check = _endpoint_check(endpoint, endpoints[side])
+        if endpoint.get("type") in BULK_CONVERTERS:
+            bulk = side
+        elif "type" in endpoint:
+            converted.append(side)
+        elif check:
+            conditions.append(check)
+    if conditions:
+        source.add(depth, f"if {' and '.join(conditions)}:")
+        depth += 1
+
+    if bulk is not None:
+        # Converted for the whole document once its records are read
+        source.add(
+            depth,
+            f"pending_{mapping['number']}.append(({endpoints['from']}, {endpoints['to']}))",
+        )
+        return
+    checks = []
+    for side in converted:
+        converter = source.bind("convert", CONVERTERS[mapping[side]["type"]])
+        source.add(depth, f"{endpoints[side]} = {converter}({endpoints[side]})")
+        check = _endpoint_check(mapping[side], endpoints[side])
+        if check:
+            checks.append(check)
+    if checks:
+        source.add(depth, f"if {' and '.join(checks)}:")
+        depth += 1
+    source.add(
+        depth,
+        f"edges.append(({model}, {_edge_expression(mapping, endpoints['from'], endpoints['to'])}))",
+    )
+
+
+def compile_vertex_extractor(mappings, name="extract_compiled_vertices"):
+    # One function reading every vertex mapping from a document; returns
+    # {model: (validated, errored_documents)} in mapping order
+    source = _Source()
+    if not BARE_ENTITIES:
+        logging.warning(
+            "arango_orm %s is not %s, compiled extractors use the entity constructors.",
+            _arango_orm_version(),
+            ENTITY_STATE_VERSION,
+        )
+    for mapping in mappings:
+        if BARE_ENTITIES and "build" not in mapping and not mapping.get("as_dict"):
+            check_entity_state(
+                mapping["model"], [field["field"] for field in mapping["fields"]]
+            )
+    expanded = [
+        concrete
+        for index, mapping in enumerate(mappings)
+        for concrete in _expand(mapping, index)
+    ]
+    for index in range(len(mappings)):
+        source.add(0, f"validated_{index} = []")
+        source.add(0, f"errored_{index} = []")
+    if any(mapping.get("header") for mapping in mappings):
+        source.names["is_slice"] = is_slice
+        source.add(0, "header = not is_slice(json_document)")
+    _emit_scope(
+        source, _scope_tree(expanded), "json_document", None, [], 0, _emit_vertex
+    )
+    for index, mapping in enumerate(mappings):
+        if "finish" in mapping:
+            finish = source.bind("finish", mapping["finish"])
+            depth = 0
+            if mapping.get("header"):
+                source.add(0, "if header:")
+                depth = 1
+            source.add(depth, f"{finish}(validated_{index})")
+    results = ", ".join(
+        f"{source.bind('model', mapping['model'])}: (validated_{index}, errored_{index})"
+        for index, mapping in enumerate(mappings)
+    )
+    source.add(0, f"return {{{results}}}")
+    json_paths = [path for mapping in expanded for path in _mapping_paths(mapping)]
+    return source.build(name, json_paths)
+
+
+def compile_edge_extractor(mappings, name="extract_compiled_edges"):
+    # One function returning every (model, edge) a document implies, in the
+    # shape of extract_edge_candidates, without checking the endpoints
+    source = _Source()
+    source.names["edge_key"] = edge_key
+    expanded = []
+    for index, mapping in enumerate(mappings):
+        for concrete in _expand(mapping, index):
+            concrete["number"] = len(expanded)
+            expanded.append(concrete)
+    source.add(0, "edges = []")
+    bulk_mappings = [
+        mapping
+        for mapping in expanded
+        if any(mapping[side].get("type") in BULK_CONVERTERS for side in ["from", "to"])
+    ]
+    for mapping in bulk_mappings:
+        source.add(0, f"pending_{mapping['number']} = []")
+    _emit_scope(
+        source,
+        _scope_tree(expanded, skip_empty=True),
+        "json_document",
+        None,
+        [],
+        0,
+        _emit_edge,
+    )
+    for mapping in bulk_mappings:
+        number = mapping["number"]
+        model = source.bind("model", mapping["model"])
+        side = "from" if mapping["from"].get("type") in BULK_CONVERTERS else "to"
+        converter = source.bind("convert", BULK_CONVERTERS[mapping[side]["type"]])
+        position = 0 if side == "from" else 1
+        source.add(0, f"if pending_{number}:")
+        source.add(
+            1,
+            f"converted = {converter}([pair[{position}] for pair in pending_{number}])",
+        )
+        source.add(1, f"for pair, value in zip(pending_{number}, converted):")
+        endpoints = {"from": "pair[0]", "to": "pair[1]", side: "value"}
+        depth = 2
+        check = _endpoint_check(mapping[side], "value")
+        if check:
+            source.add(2, f"if {check}:")
+            depth = 3
+        source.add(
+            depth,
+            f"edges.append(({model}, {_edge_expression(mapping, endpoints['from'], endpoints['to'])}))",
+        )
+    source.add(0, "return edges")
+    json_paths = [path for mapping in expanded for path in _mapping_paths(mapping)]
+    return source.build(name, json_paths)
+
+
+# Compiled once on import; a new entity only needs its mapping above
+extract_compiled_vertices = compile_vertex_extractor(VERTEX_MAPPINGS)
+extract_compiled_edges = compile_edge_extractor(EDGE_MAPPINGS)
+COMPILED_EXTRACTORS = [extract_compiled_vertices, extract_compiled_edges]
+
+
+# --- Verification --- #
+
+
+def _extractor_results(json_document):
+    # The hand-written extractors' output for one document, as compared
+    results = {}
+    for model, extractor in DOCUMENT_EXTRACTORS:
+        if extractor in HEADER_EXTRACTORS and is_slice(json_document):
+            results[model] = ([], [])
+            continue
+        validated, errored = extractor(json_document)
+        results[model] = ([to_document(entity) for entity in validated], errored)
+    for model, edge in extract_edge_candidates(json_document):
+        results.setdefault(model, ([], []))[0].append(edge)
+    return results
+
+
+def _compiled_results(json_document):
+    results = {
+        model: ([to_document(entity) for entity in validated], errored)
+        for model, (validated, errored) in extract_compiled_vertices(
+            json_document
+        ).items()
+    }
+    for model, edge in extract_compiled_edges(json_document):
+        results.setdefault(model, ([], []))[0].append(edge)
+    return results
+
+
+def compare_with_extractors(json_documents):
+    # Runs both engines on every document and lists each collection whose
+    # documents or errors differ, and documents only one engine fails on.
+    # Both write the customer sample CSV.
+    mismatches = []
+    for position, json_document in enumerate(json_documents):
+        outcomes = []
+        for results in [_extractor_results, _compiled_results]:
+            try:
+                outcomes.append(results(json_document))
+            except Exception as e:
+                outcomes.append(e)
+        expected, actual = outcomes
+        if isinstance(expected, Exception) or isinstance(actual, Exception):
+            if type(expected) is not type(actual):
+                mismatches.append(
+                    f"document {position}: expected {expected!r}, got {actual!r}"
+                )
+            continue
+        for model in sorted(set(expected) | set(actual), key=lambda m: m.__name__):
+            for label, expected_records, actual_records in zip(
+                ["documents", "errors"],
+                expected.get(model, ([], [])),
+                actual.get(model, ([], [])),
+            ):
+                if expected_records != actual_records:
+                    mismatches.append(
+                        f"document {position}: {model.__collection__} {label}: expected {len(expected_records)}, got {len(actual_records)}"
+                    )
+    return mismatches
+
+
+def _run_extractors(json_document):
+    for _, extractor in DOCUMENT_EXTRACTORS:
+        if not (extractor in HEADER_EXTRACTORS and is_slice(json_document)):
+            extractor(json_document)
+    list(extract_edge_candidates(json_document))
+
+
+def _run_compiled(json_document):
+    extract_compiled_vertices(json_document)
+    extract_compiled_edges(json_document)
+
+
+def benchmark(json_documents, rounds=BENCHMARK_ROUNDS):
+    # Best of rounds, in seconds, for each engine over the same documents
+    timings = {}
+    for label, run in [("hand-written", _run_extractors), ("compiled", _run_compiled)]:
+        best = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for json_document in json_documents:
+                try:
+                    run(json_document)
+                except Exception:
+                    # The importer skips documents an extractor fails on
+                    pass
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings[label] = best
+    return timings
+
+
+def iter_chunks(json_file_path, chunk_size=CHUNK_SIZE):
+    # Documents as the importer reads them, projected to the fields either
+    # engine reads
+    projection = projection_for(
+        [extractor for _, extractor in DOCUMENT_EXTRACTORS]
+        + [extract_edge_candidates]
+        + COMPILED_EXTRACTORS
+    )
+    chunk = []
+    with open(json_file_path, "rb") as file:
+        for json_document in projected_items(
+            file, projection, max_details=OVERSIZED_DETAILS
+        ):
+            chunk.append(json_document)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- Execution --- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the compiled mapping extractors against the hand-written ones."
+    )
+    parser.add_argument("json_file_path")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Compare the output of both engines document by document",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Time both engines over the same documents",
+    )
+    parser.add_argument("--rounds", type=int, default=BENCHMARK_ROUNDS)
+    parser.add_argument(
+        "--show-source",
+        action="store_true",
+        help="Print the generated extractors",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    if args.show_source:
+        for extractor in COMPILED_EXTRACTORS:
+            print(extractor.source)
+    document_count = 0
+    mismatch_count = 0
+    timings = {}
+    for chunk in iter_chunks(args.json_file_path, args.chunk_size):
+        if args.verify:
+            for mismatch in compare_with_extractors(chunk):
+                mismatch_count += 1
+                logging.error("Mismatch in documents %d+: %s", document_count, mismatch)
+        if args.benchmark:
+            for label, elapsed in benchmark(chunk, args.rounds).items():
+                timings[label] = timings.get(label, 0.0) + elapsed
+        document_count += len(chunk)
+    if args.verify:
+        logging.info(
+            f"Compared {document_count} documents, {mismatch_count} mismatches."
+        )
+    if args.benchmark:
+        logging.info(
+            f"Extracted {document_count} documents: hand-written {timings['hand-written']:.3f}s, compiled {timings['compiled']:.3f}s ({timings['hand-written'] / max(timings['compiled'], 1e-9):.1f}x)."
+        )
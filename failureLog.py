@@ -0,0 +1,132 @@
+import json
+import decimal
+import logging
+from projectedParser import projected_items, SLICE_KEY
+
+# --- Defaults --- #
+
+FAILURE_LOG = "data_import_failures.jsonl"
+# ijson's default read size; a recorded offset is at most this far before
+# the start of its document
+READ_BUFFER_BYTES = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+
+class FailureLog:
+    # One JSONL record per document that failed to import: its item index in
+    # the input array, the offset of the read buffer it started in, and a
+    # compact copy of the projected document, so it can be replayed without
+    # the input file.
+    def __init__(self, path=FAILURE_LOG):
+        self.path = path
+        self.file = None
+        self.count = 0
+
+    def record(self, item_index, byte_offset, json_document, error, stage="import"):
+        if self.file is None:
+            self.file = open(self.path, "w", encoding="utf-8")
+        self.file.write(
+            json.dumps(
+                {
+                    "item_index": item_index,
+                    "byte_offset": byte_offset,
+                    "slice": json_document.get(SLICE_KEY),
+                    "customer_id": json_document.get("_id"),
+                    "stage": stage,
+                    "error": error,
+                    "document": json_document,
+                },
+                default=_json_default,
+            )
+            + "\n"
+        )
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.count:
+            logging.info(f"Recorded {self.count} failed documents in {self.path}.")
+
+
+def read_failures(path=FAILURE_LOG):
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+# --- Locating Documents in the Input --- #
+
+
+class PrefixedReader:
+    # Presents a file read from the middle as a JSON array to ijson
+    def __init__(self, prefix, file):
+        self.prefix = prefix
+        self.file = file
+
+    def read(self, size=-1):
+        # ijson probes the file type with read(0), which must not eat the prefix
+        if self.prefix and size != 0:
+            data, self.prefix = self.prefix, b""
+            return data
+        return self.file.read(size)
+
+
+def _parts_at(file, offset, projection, max_details):
+    # All parts (header and slices) of the document starting at offset
+    file.seek(offset)
+    parts = projected_items(
+        PrefixedReader(b"[", file),
+        projection,
+        max_details=max_details,
+        positions=True,
+    )
+    for item_index, _, part in parts:
+        if item_index > 0:
+            return
+        yield part
+
+
+def locate_document(file, byte_offset, customer_id, projection, max_details=None):
+    # Finds the exact start of a recorded document: every "{" in the read
+    # buffer the document started in is tried as an item start, and the
+    # first whose item has the recorded customer _id wins.
+    if customer_id is None or byte_offset is None:
+        return None
+    file.seek(byte_offset)
+    window = file.read(READ_BUFFER_BYTES)
+    position = window.find(b"{")
+    while position != -1:
+        try:
+            first_part = next(
+                _parts_at(file, byte_offset + position, projection, max_details),
+                None,
+            )
+        except Exception:
+            # Started inside a string or mid-token
+            first_part = None
+        if isinstance(first_part, dict) and first_part.get("_id") == customer_id:
+            return byte_offset + position
+        position = window.find(b"{", position + 1)
+    return None
+
+
+def documents_from_source(file, failure, projection, max_details=None):
+    # The failed document (or slice) re-read from the input, or None when
+    # it cannot be located there
+    offset = locate_document(
+        file, failure["byte_offset"], failure["customer_id"], projection, max_details
+    )
+    if offset is None:
+        return None
+    return [
+        part
+        for part in _parts_at(file, offset, projection, max_details)
+        if part.get(SLICE_KEY) == failure["slice"]
+    ]
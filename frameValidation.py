@@ -0,0 +1,738 @@
+import logging
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+from jsonExtractPrep import (
+    VEHICLE_TYPE_NAMES,
+    extract_and_validate_addresses,
+    extract_and_validate_country,
+    extract_and_validate_location,
+    extract_and_validate_customers,
+    extract_and_validate_season,
+    extract_and_validate_order,
+    extract_and_validate_payment_method,
+    extract_and_validate_vehicle_type,
+    extract_edge_candidates,
+    HEADER_EXTRACTORS,
+)
+from bulkWriter import to_document
+from keyRegistry import intern_name, edge_key
+from addressNormalization import address_index, address_key
+from seasonCalendar import season_calendar, departure_days
+from projectedParser import (
+    projected_items,
+    projection_for,
+    is_slice,
+    OVERSIZED_DETAILS,
+    SLICE_DETAILS,
+)
+from models import (
+    Address,
+    Country,
+    Location,
+    Customer,
+    Season,
+    Order,
+    PaymentMethod,
+    VehicleType,
+    UsesVehicle,
+    LocatedIn,
+    MadeOrder,
+    Visited,
+    DepartFrom,
+    ArriveAt,
+    PaymentBy,
+    OriginatedFrom,
+    OrderFromLocation,
+    OrderByCustomer,
+    OrderInSeason,
+)
+
+# --- Defaults --- #
+
+CHUNK_SIZE = 5000
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# Shape strptime accepts for DATE_FORMAT; values that fail it or pandas'
+# parse are re-checked one by one with strptime for the exact error
+DATE_PATTERN = r"\d{4}-\d{1,2}-\d{1,2}T\d{1,2}:\d{1,2}:\d{1,2}\.\d{1,6}Z"
+COUNTRY_KEYS = ["countryData", "originCountryData", "destinationCountryData"]
+LOCATION_KEYS = ["originLocationData", "destinationLocationData"]
+
+# Per-document extractors the frame engine reproduces, for verification
+DOCUMENT_EXTRACTORS = [
+    (Customer, extract_and_validate_customers),
+    (Country, extract_and_validate_country),
+    (Location, extract_and_validate_location),
+    (Season, extract_and_validate_season),
+    (Address, extract_and_validate_addresses),
+    (Order, extract_and_validate_order),
+    (PaymentMethod, extract_and_validate_payment_method),
+    (VehicleType, extract_and_validate_vehicle_type),
+]
+PROJECTION = projection_for(
+    [extractor for _, extractor in DOCUMENT_EXTRACTORS] + [extract_edge_candidates]
+)
+
+
+# --- Flattening --- #
+
+
+def _columns(*names):
+    return {name: [] for name in names}
+
+
+def flatten_documents(json_documents):
+    # One pass over the chunk that only copies raw values into column lists;
+    # all checks happen afterwards on whole columns.
+    customers = _columns(
+        "customer_id",
+        "email",
+        "age",
+        "phone_number",
+        "country_name",
+        "country_id",
+        "has_required",
+    )
+    countries = _columns("country_key", "country_id", "country_name")
+    seasons = _columns("season_key")
+    orders = _columns(
+        "customer_id",
+        "order_id",
+        "total_price",
+        "order_created_at",
+        "departure_at",
+        "payment_method",
+    )
+    locations = _columns(
+        "order_row",
+        "location_key",
+        "has_data",
+        "location_id",
+        "location_name",
+        "country_id",
+        "address_id",
+        "address_city",
+        "address_country_id",
+        "address_key",
+        "address_data",
+    )
+    vehicles = _columns("order_row", "vehicle_id")
+
+    tables = [customers, countries, seasons, orders, locations, vehicles]
+    skipped = []
+    for position, json_document in enumerate(json_documents):
+        sizes = [len(next(iter(table.values()))) for table in tables]
+        try:
+            _flatten_document(json_document, *tables)
+        except Exception as e:
+            # A malformed document is dropped whole, as the per-document
+            # extractors would, instead of failing its chunk
+            for table, size in zip(tables, sizes):
+                for column in table.values():
+                    del column[size:]
+            skipped.append({"position": position, "error": str(e)})
+
+    frames = {
+        name: pd.DataFrame(columns, dtype=object)
+        for name, columns in [
+            ("customers", customers),
+            ("countries", countries),
+            ("seasons", seasons),
+            ("orders", orders),
+            ("locations", locations),
+            ("vehicles", vehicles),
+        ]
+    }
+    return frames, skipped
+
+
+def _flatten_document(
+    json_document, customers, countries, seasons, orders, locations, vehicles
+):
+    customer_id = json_document.get("_id")
+    if not is_slice(json_document):
+        _flatten_header(json_document, customers, countries, seasons)
+    for season_key, season_data in json_document.get("seasons", {}).items():
+        for detail in season_data.get("details", []):
+            _flatten_detail(detail, customer_id, orders, locations, vehicles)
+
+
+def _flatten_header(json_document, customers, countries, seasons):
+    # Customer-level rows; continuation slices of an oversized document
+    # carry none, its header already produced them
+    customer_id = json_document.get("_id")
+    customers["customer_id"].append(customer_id)
+    customers["email"].append(json_document.get("email"))
+    customers["age"].append(json_document.get("age"))
+    customers["phone_number"].append(json_document.get("phoneNumber"))
+    customers["country_name"].append(intern_name(json_document.get("countryName")))
+    customers["country_id"].append((json_document.get("countryData") or {}).get("_id"))
+    customers["has_required"].append(
+        "_id" in json_document and "email" in json_document
+    )
+
+    for country_key in COUNTRY_KEYS:
+        if country_key in json_document:
+            country_data = json_document[country_key]
+            countries["country_key"].append(country_key)
+            countries["country_id"].append(intern_name(country_data.get("_id")))
+            countries["country_name"].append(
+                intern_name(country_data.get("englishName"))
+            )
+
+    for season_key in json_document.get("seasons", {}):
+        seasons["season_key"].append(intern_name(season_key))
+
+
+def _flatten_detail(detail, customer_id, orders, locations, vehicles):
+    order_row = len(orders["order_id"])
+    orders["customer_id"].append(customer_id)
+    orders["order_id"].append(detail.get("orderId"))
+    orders["total_price"].append(detail.get("totalPrice"))
+    orders["order_created_at"].append(detail.get("orderCreatedAt"))
+    orders["departure_at"].append(detail.get("departureAt"))
+    orders["payment_method"].append(detail.get("paymentMethod"))
+
+    for vehicle_id in detail.get("vehicles", []):
+        vehicles["order_row"].append(order_row)
+        vehicles["vehicle_id"].append(vehicle_id)
+
+    for location_key in LOCATION_KEYS:
+        if location_key not in detail:
+            continue
+        location_data = detail[location_key] or {}
+        address_data = location_data.get("address") or {}
+        locations["order_row"].append(order_row)
+        locations["location_key"].append(location_key)
+        locations["has_data"].append(bool(location_data))
+        locations["location_id"].append(intern_name(location_data.get("_id")))
+        locations["location_name"].append(intern_name(location_data.get("name")))
+        locations["country_id"].append(location_data.get("countryId"))
+        locations["address_id"].append(address_data.get("_id"))
+        locations["address_city"].append(intern_name(address_data.get("city")))
+        locations["address_country_id"].append(address_data.get("countryId"))
+        locations["address_key"].append(
+            address_key(address_data) if address_data.get("_id") else None
+        )
+        locations["address_data"].append(address_data)
+
+
+# --- Column Helpers --- #
+
+
+def _truthy(column):
+    # Python truthiness per value, as the per-document `all([...])` checks use
+    return column.astype(bool).to_numpy()
+
+
+def _present(column):
+    return column.notna().to_numpy()
+
+
+def _text(column):
+    return column.astype(str)
+
+
+def _or_empty(column):
+    return column.where(column.astype(bool), "")
+
+
+def _handles(collection_name, column):
+    return collection_name + "/" + column.astype(str)
+
+
+def _edge_keys(from_handles, to_handles):
+    return pd.Series(
+        [edge_key(*pair) for pair in zip(from_handles, to_handles)],
+        index=from_handles.index,
+        dtype=object,
+    )
+
+
+def _frame(columns):
+    return pd.DataFrame(
+        {name: column.reset_index(drop=True) for name, column in columns.items()}
+    )
+
+
+def _parse_fast(column):
+    # ISO days of the values pandas parses, and where it did
+    text = column.where(column.map(type) == str)
+    matches = text.str.fullmatch(DATE_PATTERN).fillna(False).to_numpy(dtype=bool)
+    values = pd.to_datetime(text.where(matches), format=DATE_FORMAT, errors="coerce")
+    # strftime does not zero-pad years below 1000, isoformat does
+    fast = (values.notna() & (values.dt.year >= 1000)).to_numpy()
+    return values.dt.strftime("%Y-%m-%d").astype(object), fast
+
+
+def _parse_dates(created, departure):
+    # Vectorized parse of both columns; rows that miss the fast path fall
+    # back to strptime so that values and error messages match exactly.
+    parsed = {}
+    fast = np.ones(len(created), dtype=bool)
+    for name, column in [("order_created_at", created), ("departure_at", departure)]:
+        parsed[name], column_fast = _parse_fast(column)
+        fast &= column_fast
+
+    errors = pd.Series(None, index=created.index, dtype=object)
+    for position in np.flatnonzero(~fast):
+        index = created.index[position]
+        try:
+            values = [
+                datetime.datetime.strptime(value, DATE_FORMAT).date().isoformat()
+                for value in (created[index], departure[index])
+            ]
+        except Exception as e:
+            errors[index] = str(e)
+            continue
+        parsed["order_created_at"].at[index] = values[0]
+        parsed["departure_at"].at[index] = values[1]
+    return parsed, errors
+
+
+def _departure_days(departure):
+    # Departure days as extract_edge_candidates parses them, NaT where
+    # strptime fails
+    parsed, fast = _parse_fast(departure)
+    days = np.empty(len(departure), dtype="datetime64[D]")
+    days[fast] = parsed[fast].to_numpy(dtype="datetime64[D]")
+    days[~fast] = departure_days(departure[~fast])
+    return days
+
+
+# --- Vertex Validation --- #
+
+
+def validate_customers(customers):
+    candidates = customers[customers["has_required"].astype(bool).to_numpy()]
+    valid = _truthy(candidates["email"]) & _truthy(candidates["customer_id"])
+    accepted = candidates[valid]
+    age = pd.to_numeric(accepted["age"], errors="coerce").fillna(0)
+    table = _frame(
+        {
+            "_key": _text(accepted["customer_id"]),
+            "email": _text(accepted["email"]),
+            "age": age.astype(np.int64),
+            "phone_number": _text(_or_empty(accepted["phone_number"])),
+            "country_name": _text(_or_empty(accepted["country_name"])),
+        }
+    )
+    rejected = candidates[~valid]
+    errors = _frame(
+        {
+            "customer_id": rejected["customer_id"],
+            "error": pd.Series("Missing required fields", index=rejected.index),
+        }
+    )
+    return table, errors
+
+
+def validate_countries(countries):
+    valid = _truthy(countries["country_id"]) & _truthy(countries["country_name"])
+    accepted = countries[valid]
+    table = _frame(
+        {
+            "_key": _text(accepted["country_id"]),
+            "country_name": _text(accepted["country_name"]),
+        }
+    )
+    # Resolves the country names of addresses
+    for country_id, country_name in zip(table["_key"], table["country_name"]):
+        address_index.learn_country(country_id, country_name)
+    rejected = countries[~valid]
+    errors = _frame(
+        {
+            "country_id": rejected["country_id"],
+            "error": "Missing required fields for " + rejected["country_key"],
+        }
+    )
+    return table, errors
+
+
+def validate_locations(locations):
+    valid = _truthy(locations["location_id"]) & _truthy(locations["location_name"])
+    accepted = locations[valid]
+    table = _frame(
+        {"_key": accepted["location_id"], "location_name": accepted["location_name"]}
+    )
+    rejected = locations[~valid]
+    errors = _frame(
+        {
+            "location_id": rejected["location_id"],
+            "error": "Missing required fields for " + rejected["location_key"],
+        }
+    )
+    return table, errors
+
+
+def validate_addresses(locations):
+    valid = (
+        _truthy(locations["address_id"])
+        & _truthy(locations["address_city"])
+        & _truthy(locations["address_country_id"])
+    )
+    accepted = locations[valid]
+    # Normalization is per address and also records its alias
+    table = pd.DataFrame(
+        [address_index.canonicalize(data) for data in accepted["address_data"]],
+        columns=["_key", "street", "city", "postal_code", "country_name"],
+        dtype=object,
+    )
+    rejected = locations[~valid]
+    errors = _frame(
+        {
+            "address_id": rejected["address_id"],
+            "error": pd.Series(
+                "Missing required fields for address", index=rejected.index
+            ),
+        }
+    )
+    return table, errors
+
+
+def validate_seasons(seasons):
+    names = seasons["season_key"].astype(str).str.split("-").str[1]
+    valid = _present(names)
+    table = _frame(
+        {
+            "_key": seasons["season_key"][valid],
+            "name": names[valid].map(intern_name),
+        }
+    )
+    errors = _frame(
+        {
+            "season_key": seasons["season_key"][~valid],
+            "error": pd.Series("list index out of range", index=seasons.index)[~valid],
+        }
+    )
+    return table, errors
+
+
+def validate_orders(orders):
+    required = (
+        _truthy(orders["order_id"])
+        & _truthy(orders["order_created_at"])
+        & _truthy(orders["departure_at"])
+    )
+    candidates = orders[required]
+    dates, date_errors = _parse_dates(
+        candidates["order_created_at"], candidates["departure_at"]
+    )
+    parsed = date_errors.isna().to_numpy()
+    accepted = candidates[parsed]
+    total_price = pd.to_numeric(accepted["total_price"], errors="coerce")
+    table = _frame(
+        {
+            "_key": _text(accepted["order_id"]),
+            "total_price": total_price.astype(object).where(total_price.notna(), None),
+            "order_created_at": dates["order_created_at"][parsed],
+            "departure_at": dates["departure_at"][parsed],
+            "season": pd.Series(
+                season_calendar.season_keys(
+                    dates["departure_at"][parsed].to_numpy(dtype="datetime64[D]")
+                ),
+                index=accepted.index,
+                dtype=object,
+            ),
+            "potential_fraud": pd.Series(None, index=accepted.index, dtype=object),
+            "payment_method_id": pd.Series(None, index=accepted.index, dtype=object),
+            "price_type": pd.Series(None, index=accepted.index, dtype=object),
+        }
+    )
+
+    # Missing fields and unparsable dates, in input order
+    error_messages = pd.Series(
+        "Missing required fields for order", index=orders.index, dtype=object
+    )
+    error_messages[candidates.index] = date_errors
+    failed = error_messages.notna().to_numpy()
+    errors = _frame(
+        {"order_id": orders["order_id"][failed], "error": error_messages[failed]}
+    )
+    return table, errors
+
+
+def validate_payment_methods(orders):
+    methods = orders["payment_method"][_present(orders["payment_method"])]
+    keys = _text(methods)
+    table = _frame({"_key": keys, "method_name": keys})
+    return table, _frame({"payment_method_id": methods[:0], "error": methods[:0]})
+
+
+def validate_vehicle_types(vehicles):
+    keys = _text(vehicles["vehicle_id"])
+    type_names = keys.map(VEHICLE_TYPE_NAMES)
+    valid = _present(type_names)
+    table = _frame({"_key": keys[valid], "type_name": type_names[valid]})
+    errors = _frame(
+        {
+            "vehicle_id": vehicles["vehicle_id"][~valid],
+            "error": pd.Series("Invalid vehicle type ID", index=vehicles.index)[~valid],
+        }
+    )
+    return table, errors
+
+
+# --- Edge Selection --- #
+
+
+def select_edges(frames):
+    # The same edges extract_edge_candidates yields, as one table per
+    # relation; endpoints are not checked against validated vertices.
+    customers, orders = frames["customers"], frames["orders"]
+    locations, vehicles = frames["locations"], frames["vehicles"]
+    edges = {}
+
+    originated = customers[
+        _truthy(customers["customer_id"]) & _truthy(customers["country_id"])
+    ]
+    originated_from = _handles("customer", originated["customer_id"])
+    originated_to = _handles("country", originated["country_id"])
+    edges[OriginatedFrom] = _frame(
+        {
+            "_key": _edge_keys(originated_from, originated_to),
+            "_from": originated_from,
+            "_to": originated_to,
+        }
+    )
+
+    has_order = _truthy(orders["order_id"])
+    order_handles = _handles("order", orders["order_id"])
+
+    with_customer = has_order & _truthy(orders["customer_id"])
+    customer_handles = _handles("customer", orders["customer_id"][with_customer])
+    edges[MadeOrder] = _frame(
+        {"_from": customer_handles, "_to": order_handles[with_customer]}
+    )
+    edges[OrderByCustomer] = _frame(
+        {
+            "_from": order_handles[with_customer],
+            "_to": customer_handles,
+            "type": pd.Series("lead_customer", index=customer_handles.index),
+        }
+    )
+
+    departures = _departure_days(orders["departure_at"][has_order])
+    season_keys = pd.Series(
+        season_calendar.season_keys(departures), index=orders.index[has_order]
+    )
+    in_season = season_keys.notna().to_numpy()
+    edges[OrderInSeason] = _frame(
+        {
+            "_from": order_handles[has_order][in_season],
+            "_to": _handles("season", season_keys[in_season]),
+        }
+    )
+
+    vehicle_rows = vehicles["order_row"].to_numpy(dtype=np.int64)
+    used = has_order[vehicle_rows]
+    edges[UsesVehicle] = _frame(
+        {
+            "_from": order_handles.iloc[vehicle_rows[used]],
+            "_to": _handles("vehicle_type", vehicles["vehicle_id"][used]),
+        }
+    )
+
+    paid = has_order & _present(orders["payment_method"])
+    edges[PaymentBy] = _frame(
+        {
+            "_from": order_handles[paid],
+            "_to": _handles("payment_method", orders["payment_method"][paid]),
+        }
+    )
+
+    location_rows = locations["order_row"].to_numpy(dtype=np.int64)
+    in_order = has_order[location_rows] & locations["has_data"].astype(bool).to_numpy()
+    location_from = order_handles.iloc[location_rows]
+    location_from.index = locations.index
+
+    with_location = in_order & _truthy(locations["location_id"])
+    location_handles = _handles("location", locations["location_id"][with_location])
+    edges[Visited] = _frame(
+        {"_from": location_from[with_location], "_to": location_handles}
+    )
+    edges[OrderFromLocation] = _frame(
+        {
+            "_from": location_from[with_location],
+            "_to": location_handles,
+            "type": locations["location_key"][with_location].map(
+                {
+                    "originLocationData": "originated",
+                    "destinationLocationData": "destined",
+                }
+            ),
+        }
+    )
+
+    located = with_location & _truthy(locations["country_id"])
+    located_from = _handles("location", locations["location_id"][located])
+    located_to = _handles("country", locations["country_id"][located])
+    edges[LocatedIn] = _frame(
+        {
+            "_key": _edge_keys(located_from, located_to),
+            "_from": located_from,
+            "_to": located_to,
+        }
+    )
+
+    with_address = in_order & _truthy(locations["address_id"])
+    for model, location_key in [
+        (DepartFrom, "originLocationData"),
+        (ArriveAt, "destinationLocationData"),
+    ]:
+        selected = with_address & (locations["location_key"] == location_key).to_numpy()
+        edges[model] = _frame(
+            {
+                "_from": location_from[selected],
+                "_to": _handles("address", locations["address_key"][selected]),
+            }
+        )
+    return edges
+
+
+# --- Chunk Engine --- #
+
+
+def validate_chunk(json_documents):
+    # Returns ({model: vertex or edge table}, {model: error table}) for a
+    # chunk of documents; table rows are the documents the per-document
+    # extractors would produce, in the same order.
+    frames, skipped = flatten_documents(json_documents)
+    for document in skipped:
+        logging.error(
+            "Error flattening document %d of chunk: %s",
+            document["position"],
+            document["error"],
+        )
+    tables = {}
+    errors = {}
+    for model, validate, frame_name in [
+        (Customer, validate_customers, "customers"),
+        (Country, validate_countries, "countries"),
+        (Location, validate_locations, "locations"),
+        (Season, validate_seasons, "seasons"),
+        (Address, validate_addresses, "locations"),
+        (Order, validate_orders, "orders"),
+        (PaymentMethod, validate_payment_methods, "orders"),
+        (VehicleType, validate_vehicle_types, "vehicles"),
+    ]:
+        tables[model], errors[model] = validate(frames[frame_name])
+    tables.update(select_edges(frames))
+    return tables, errors
+
+
+def frame_records(frame):
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def iter_chunks(json_file_path, chunk_size=CHUNK_SIZE):
+    chunk = []
+    chunk_weight = 0
+    with open(json_file_path, "rb") as file:
+        for json_document in projected_items(
+            file, PROJECTION, max_details=OVERSIZED_DETAILS, use_float=True
+        ):
+            chunk.append(json_document)
+            # A slice holds up to SLICE_DETAILS orders, so it weighs as many
+            # documents towards the chunk size
+            chunk_weight += SLICE_DETAILS if is_slice(json_document) else 1
+            if chunk_weight >= chunk_size:
+                yield chunk
+                chunk = []
+                chunk_weight = 0
+    if chunk:
+        yield chunk
+
+
+def validate_file(json_file_path, chunk_size=CHUNK_SIZE):
+    for chunk in iter_chunks(json_file_path, chunk_size):
+        tables, errors = validate_chunk(chunk)
+        document_count = sum(not is_slice(json_document) for json_document in chunk)
+        yield document_count, tables, errors
+
+
+# --- Verification --- #
+
+
+def compare_with_extractors(json_documents):
+    # Runs the per-document extractors on the same documents and lists every
+    # collection whose documents or errors differ from the frame engine.
+    # extract_and_validate_customers still writes its sample CSV here.
+    expected_tables = {}
+    expected_errors = {}
+    for json_document in json_documents:
+        try:
+            results = [
+                (model, extractor(json_document))
+                for model, extractor in DOCUMENT_EXTRACTORS
+                if not (extractor in HEADER_EXTRACTORS and is_slice(json_document))
+            ]
+            edges = list(extract_edge_candidates(json_document))
+        except Exception:
+            # The importer skips documents an extractor fails on
+            continue
+        for model, (validated, errored) in results:
+            expected_tables.setdefault(model, []).extend(
+                to_document(entity) for entity in validated
+            )
+            expected_errors.setdefault(model, []).extend(errored)
+        for model, edge in edges:
+            expected_tables.setdefault(model, []).append(edge)
+
+    tables, errors = validate_chunk(json_documents)
+    mismatches = []
+    for label, expected, actual in [
+        ("documents", expected_tables, tables),
+        ("errors", expected_errors, errors),
+    ]:
+        for model in sorted(set(expected) | set(actual), key=lambda m: m.__name__):
+            expected_records = expected.get(model, [])
+            actual_records = frame_records(actual[model]) if model in actual else []
+            if expected_records != actual_records:
+                mismatches.append(
+                    f"{model.__collection__} {label}: expected {len(expected_records)}, got {len(actual_records)}"
+                )
+    return mismatches
+
+
+# --- Execution --- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Validate an export with the chunked frame engine."
+    )
+    parser.add_argument("json_file_path")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Compare every chunk against the per-document extractors",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    document_count = 0
+    row_counts = {}
+    error_counts = {}
+    for chunk in iter_chunks(args.json_file_path, args.chunk_size):
+        if args.verify:
+            for mismatch in compare_with_extractors(chunk):
+                logging.error("Mismatch in documents %d+: %s", document_count, mismatch)
+        tables, errors = validate_chunk(chunk)
+        document_count += sum(not is_slice(json_document) for json_document in chunk)
+        for model, table in tables.items():
+            row_counts[model.__collection__] = row_counts.get(
+                model.__collection__, 0
+            ) + len(table)
+        for model, table in errors.items():
+            error_counts[model.__collection__] = error_counts.get(
+                model.__collection__, 0
+            ) + len(table)
+    for collection_name in sorted(row_counts):
+        logging.info(
+            f"{collection_name}: {row_counts[collection_name]} rows, {error_counts.get(collection_name, 0)} errors."
+        )
+    logging.info(f"Validated {document_count} documents.")
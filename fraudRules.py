@@ -0,0 +1,276 @@
+import json
+import logging
+import numpy as np
+from jsonExtractPrep import DETAIL_PATH
+from projectedParser import reads
+
+# --- Defaults --- #
+
+FRAUD_CHUNK_SIZE = 5000
+# Weights of the rules an order trips add up to its score; orders scoring
+# at least the threshold are marked potential_fraud
+DEFAULT_FRAUD_RULES = {
+    "threshold": 0.5,
+    "route_price_outlier": {
+        # Price this many standard deviations above or below the mean of
+        # its origin/destination route, once the route has enough orders
+        "weight": 0.5,
+        "z_score": 3.0,
+        "min_route_orders": 20,
+    },
+    "short_lead_time": {
+        # Departure less than this many hours after the order was created
+        "weight": 0.3,
+        "hours": 2.0,
+    },
+    "vehicle_payment": {
+        # [vehicle type, payment method] pairs; luxury sedans paid in cash
+        "weight": 0.3,
+        "combinations": [["3", "0"]],
+    },
+    "customer_velocity": {
+        # More than max_orders orders of one customer created within
+        # window_hours of each other
+        "weight": 0.5,
+        "window_hours": 24.0,
+        "max_orders": 5,
+    },
+}
+RULE_NAMES = [
+    "route_price_outlier",
+    "short_lead_time",
+    "vehicle_payment",
+    "customer_velocity",
+]
+SECONDS_PER_HOUR = 3600
+
+
+def load_rules(path=None):
+    # Defaults with the rules of a JSON file laid over them, per rule
+    rules = json.loads(json.dumps(DEFAULT_FRAUD_RULES))
+    if path:
+        with open(path, "r", encoding="utf-8") as file:
+            overrides = json.load(file)
+        for name, value in overrides.items():
+            if name not in rules:
+                raise ValueError(f"Unknown fraud rule: {name}")
+            if isinstance(value, dict):
+                rules[name].update(value)
+            else:
+                rules[name] = value
+    return rules
+
+
+# --- Column Buffer --- #
+
+
+def _new_columns():
+    return {
+        "customers": [],
+        "routes": [],
+        "prices": [],
+        "created": [],
+        "departures": [],
+        "payments": [],
+        "vehicle_rows": [],
+        "vehicles": [],
+    }
+
+
+class FraudScorer:
+    # Scores validated orders in chunks as the import reads them. Orders of
+    # a chunk are held back as column lists, scored with whole-array rules
+    # and handed back with potential_fraud set, ready for the same bulk
+    # write as the other vertices. Route price statistics accumulate over
+    # the whole import; customer velocity looks back over the current and
+    # the previous chunk, which holds a customer's repeated documents when
+    # the export is grouped by customer.
+    def __init__(self, rules=None, chunk_size=FRAUD_CHUNK_SIZE):
+        self.rules = rules or load_rules()
+        self.chunk_size = chunk_size
+        self.orders = []
+        self.columns = _new_columns()
+        self.route_codes = {}
+        self.route_counts = np.zeros(1024, dtype=np.int64)
+        self.route_sums = np.zeros(1024, dtype=np.float64)
+        self.route_squares = np.zeros(1024, dtype=np.float64)
+        self.previous_customers = np.empty(0, dtype=object)
+        self.previous_created = np.empty(0, dtype=np.int64)
+        self.scored_count = 0
+        self.flagged_count = 0
+        self.rule_counts = {name: 0 for name in RULE_NAMES}
+
+    def _route_code(self, origin_id, destination_id):
+        if origin_id is None or destination_id is None:
+            return -1
+        route = (origin_id, destination_id)
+        code = self.route_codes.get(route)
+        if code is None:
+            code = self.route_codes[route] = len(self.route_codes)
+        return code
+
+    @reads(
+        "_id",
+        f"{DETAIL_PATH}.orderId",
+        f"{DETAIL_PATH}.vehicles",
+        f"{DETAIL_PATH}.paymentMethod",
+        f"{DETAIL_PATH}.originLocationData._id",
+        f"{DETAIL_PATH}.destinationLocationData._id",
+    )
+    def add_document(self, json_document, validated_orders):
+        # Buffers the document's validated orders; returns the orders of a
+        # completed chunk, scored, and an empty list otherwise
+        details = {}
+        for _, season_data in json_document.get("seasons", {}).items():
+            for detail in season_data.get("details", []):
+                details.setdefault(detail.get("orderId"), detail)
+        customer_id = json_document.get("_id")
+        columns = self.columns
+        for order in validated_orders:
+            detail = details.get(order._key, {})
+            row = len(self.orders)
+            self.orders.append(order)
+            columns["customers"].append(customer_id)
+            columns["routes"].append(
+                self._route_code(
+                    (detail.get("originLocationData") or {}).get("_id"),
+                    (detail.get("destinationLocationData") or {}).get("_id"),
+                )
+            )
+            columns["prices"].append(
+                np.nan if order.total_price is None else order.total_price
+            )
+            columns["created"].append(order.order_created_at)
+            columns["departures"].append(order.departure_at)
+            payment_method = detail.get("paymentMethod")
+            columns["payments"].append(
+                None if payment_method is None else str(payment_method)
+            )
+            for vehicle_id in detail.get("vehicles", []):
+                columns["vehicle_rows"].append(row)
+                columns["vehicles"].append(str(vehicle_id))
+        if len(self.orders) >= self.chunk_size:
+            return self.score()
+        return []
+
+    def finish(self):
+        # Scores whatever is buffered at the end of the input
+        return self.score() if self.orders else []
+
+    # --- Rules --- #
+
+    def _update_routes(self, routes, prices):
+        known = (routes >= 0) & ~np.isnan(prices)
+        if len(self.route_codes) > len(self.route_counts):
+            size = max(len(self.route_codes), 2 * len(self.route_counts))
+            for name in ["route_counts", "route_sums", "route_squares"]:
+                grown = np.zeros(size, dtype=getattr(self, name).dtype)
+                grown[: len(getattr(self, name))] = getattr(self, name)
+                setattr(self, name, grown)
+        np.add.at(self.route_counts, routes[known], 1)
+        np.add.at(self.route_sums, routes[known], prices[known])
+        np.add.at(self.route_squares, routes[known], prices[known] ** 2)
+
+    def _route_price_outliers(self, routes, prices):
+        rule = self.rules["route_price_outlier"]
+        known = (routes >= 0) & ~np.isnan(prices)
+        counts = self.route_counts[np.maximum(routes, 0)].astype(np.float64)
+        means = self.route_sums[np.maximum(routes, 0)] / np.maximum(counts, 1)
+        variances = self.route_squares[np.maximum(routes, 0)] / np.maximum(
+            counts, 1
+        ) - (means**2)
+        deviations = np.sqrt(np.maximum(variances, 0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z_scores = np.abs(prices - means) / deviations
+        return (
+            known
+            & (counts >= rule["min_route_orders"])
+            & (deviations > 0)
+            & (z_scores > rule["z_score"])
+        )
+
+    def _short_lead_times(self, created, departures):
+        hours = (departures - created) / SECONDS_PER_HOUR
+        return hours < self.rules["short_lead_time"]["hours"]
+
+    def _vehicle_payments(self, payments):
+        rule = self.rules["vehicle_payment"]
+        hits = np.zeros(len(payments), dtype=bool)
+        if not rule["combinations"] or not self.columns["vehicles"]:
+            return hits
+        rows = np.array(self.columns["vehicle_rows"], dtype=np.int64)
+        pairs = np.char.add(
+            np.char.add(np.array(self.columns["vehicles"], dtype=str), "|"),
+            payments[rows].astype(str),
+        )
+        combinations = [
+            f"{vehicle}|{payment}" for vehicle, payment in rule["combinations"]
+        ]
+        hits[rows[np.isin(pairs, combinations)]] = True
+        return hits
+
+    def _customer_velocity(self, customers, created):
+        # Orders of the same customer created in the window ending at each
+        # order, counted with one searchsorted over (customer, time) keys
+        rule = self.rules["customer_velocity"]
+        window = int(rule["window_hours"] * SECONDS_PER_HOUR)
+        context = len(self.previous_created)
+        all_customers = np.concatenate([self.previous_customers, customers])
+        all_created = np.concatenate([self.previous_created, created])
+        _, codes = np.unique(all_customers.astype(str), return_inverse=True)
+        order = np.lexsort((all_created, codes))
+        offset = all_created.min() if len(all_created) else 0
+        # Keys of one customer never come within a window of the next one's
+        span = int(all_created.max() - offset) + window + 1 if len(all_created) else 1
+        keys = codes[order].astype(np.int64) * span + (all_created[order] - offset)
+        counts = np.empty(len(keys), dtype=np.int64)
+        counts[order] = (
+            np.arange(len(keys)) - np.searchsorted(keys, keys - window, side="left") + 1
+        )
+        known = np.array([customer is not None for customer in customers], dtype=bool)
+        return known & (counts[context:] > rule["max_orders"])
+
+    def score(self):
+        columns = self.columns
+        routes = np.array(columns["routes"], dtype=np.int64)
+        prices = np.array(columns["prices"], dtype=np.float64)
+        customers = np.array(columns["customers"], dtype=object)
+        payments = np.array(columns["payments"], dtype=object)
+        created = np.array(columns["created"], dtype="datetime64[s]").astype(np.int64)
+        departures = np.array(columns["departures"], dtype="datetime64[s]").astype(
+            np.int64
+        )
+
+        # Route statistics include the chunk, so a route's first orders are
+        # judged once it has min_route_orders of them
+        self._update_routes(routes, prices)
+        hits = {
+            "route_price_outlier": self._route_price_outliers(routes, prices),
+            "short_lead_time": self._short_lead_times(created, departures),
+            "vehicle_payment": self._vehicle_payments(payments),
+            "customer_velocity": self._customer_velocity(customers, created),
+        }
+        scores = np.zeros(len(self.orders), dtype=np.float64)
+        for name, rule_hits in hits.items():
+            scores += rule_hits * self.rules[name]["weight"]
+            self.rule_counts[name] += int(rule_hits.sum())
+        flagged = scores >= self.rules["threshold"]
+
+        orders = self.orders
+        for order, is_flagged in zip(orders, flagged.tolist()):
+            order.potential_fraud = is_flagged
+        self.scored_count += len(orders)
+        self.flagged_count += int(flagged.sum())
+        self.previous_customers = customers
+        self.previous_created = created
+        self.orders = []
+        self.columns = _new_columns()
+        return orders
+
+    def log_summary(self):
+        rule_counts = ", ".join(
+            f"{name} {count}" for name, count in self.rule_counts.items()
+        )
+        logging.info(
+            f"Scored {self.scored_count} orders, {self.flagged_count} marked as potential fraud; rule hits: {rule_counts}."
+        )
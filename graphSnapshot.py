@@ -0,0 +1,425 @@
+import os
+import json
+import gzip
+import logging
+import argparse
+import numpy as np
+from arangoConnection import get_db
+from exportArango import stream_query
+from initArango import MyGraphDefinition, collection_names
+from shardWriter import MANIFEST_NAME
+
+# --- Defaults --- #
+
+SNAPSHOT_DIR = "graph_snapshot"
+SNAPSHOT_MANIFEST = "snapshot.json"
+SNAPSHOT_VERSION = 1
+BATCH_SIZE = 100_000
+DIRECTIONS = ("outbound", "inbound")
+
+
+def graph_edges():
+    # (edge collection, from collections, to collections) of the graph
+    return [
+        (
+            connection.relation.__collection__,
+            collection_names(connection.collections_from),
+            collection_names(connection.collections_to),
+        )
+        for connection in MyGraphDefinition.graph_connections
+    ]
+
+
+# --- Sources --- #
+
+
+class DatabaseSource:
+    # Streams keys and endpoints with stream cursors, one batch in memory
+    def __init__(self, db=None, batch_size=BATCH_SIZE):
+        self.db = db or get_db()
+        self.batch_size = batch_size
+
+    def _batches(self, collection_name, expression):
+        if not self.db.has_collection(collection_name):
+            return
+        yield from stream_query(
+            self.db,
+            f"FOR d IN @@collection RETURN {expression}",
+            {"@collection": collection_name},
+            self.batch_size,
+        )
+
+    def keys(self, collection_name):
+        return self._batches(collection_name, "d._key")
+
+    def endpoints(self, collection_name):
+        return self._batches(collection_name, "[d._from, d._to]")
+
+
+class ShardSource:
+    # Reads the JSONL shards of an offline import (shardWriter.py)
+    def __init__(self, shard_dir, batch_size=BATCH_SIZE):
+        self.shard_dir = shard_dir
+        self.batch_size = batch_size
+        with open(os.path.join(shard_dir, MANIFEST_NAME)) as file:
+            self.collections = json.load(file)["collections"]
+
+    def _batches(self, collection_name, row):
+        batch = []
+        for shard in self.collections.get(collection_name, {}).get("shards", []):
+            path = os.path.join(self.shard_dir, shard["file"])
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    batch.append(row(json.loads(line)))
+                    if len(batch) >= self.batch_size:
+                        yield batch
+                        batch = []
+        if batch:
+            yield batch
+
+    def keys(self, collection_name):
+        return self._batches(collection_name, lambda document: document["_key"])
+
+    def endpoints(self, collection_name):
+        return self._batches(
+            collection_name,
+            lambda document: [document.get("_from"), document.get("_to")],
+        )
+
+
+# --- Building --- #
+
+
+def _sorted_unique(values):
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    return values[np.concatenate([[True], values[1:] != values[:-1]])]
+
+
+def _csr(rows, columns, row_start, row_count, index_dtype):
+    # Rows must be sorted; indices of row r are indices[indptr[r]:indptr[r+1]]
+    counts = np.bincount(rows - row_start, minlength=row_count)
+    indptr = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, columns.astype(index_dtype)
+
+
+class SnapshotBuilder:
+    # Vertex keys of a collection are sorted and numbered from the
+    # collection's offset, so a key's integer ID is one searchsorted away
+    # and needs no hash map. Edges are converted to ID pairs batch by batch
+    # and stored as CSR arrays in both directions.
+    def __init__(self, source, output_dir=SNAPSHOT_DIR):
+        self.source = source
+        self.output_dir = output_dir
+        self.keys = {}
+        self.offsets = {}
+        self.vertex_count = 0
+
+    def build_vertices(self, vertex_collections):
+        os.makedirs(os.path.join(self.output_dir, "keys"), exist_ok=True)
+        for collection_name in vertex_collections:
+            keys = []
+            for batch in self.source.keys(collection_name):
+                keys.extend(batch)
+            sorted_keys = _sorted_unique(np.array(keys, dtype=str))
+            np.save(
+                os.path.join(self.output_dir, "keys", f"{collection_name}.npy"),
+                sorted_keys,
+            )
+            self.keys[collection_name] = sorted_keys
+            self.offsets[collection_name] = self.vertex_count
+            self.vertex_count += len(sorted_keys)
+            logging.info(f"Numbered {len(sorted_keys)} {collection_name} vertices.")
+
+    def _ids(self, handles, collection_names):
+        # Global IDs of "collection/key" handles, -1 for unknown vertices
+        # and vertices outside the given collections
+        parts = np.char.partition(handles, "/")
+        collections, keys = parts[:, 0], parts[:, 2]
+        ids = np.full(len(handles), -1, dtype=np.int64)
+        for collection_name in collection_names:
+            sorted_keys = self.keys.get(collection_name)
+            if sorted_keys is None or len(sorted_keys) == 0:
+                continue
+            selected = collections == collection_name
+            positions = np.searchsorted(sorted_keys, keys[selected])
+            clipped = np.minimum(positions, len(sorted_keys) - 1)
+            found = sorted_keys[clipped] == keys[selected]
+            ids[np.flatnonzero(selected)[found]] = (
+                self.offsets[collection_name] + positions[found]
+            )
+        return ids
+
+    def _row_range(self, collection_names):
+        collection_names = [name for name in collection_names if name in self.offsets]
+        if not collection_names:
+            return 0, 0
+        start = min(self.offsets[name] for name in collection_names)
+        stop = max(
+            self.offsets[name] + len(self.keys[name]) for name in collection_names
+        )
+        return start, stop - start
+
+    def build_edges(self, edge_collection, from_collections, to_collections):
+        sources = []
+        targets = []
+        dangling = 0
+        from_start, from_count = self._row_range(from_collections)
+        to_start, to_count = self._row_range(to_collections)
+        for batch in self.source.endpoints(edge_collection):
+            endpoints = np.array(batch, dtype=str).reshape(-1, 2)
+            from_ids = self._ids(endpoints[:, 0], from_collections)
+            to_ids = self._ids(endpoints[:, 1], to_collections)
+            # Endpoints must be known vertices of the connection's collections
+            known = (from_ids >= 0) & (to_ids >= 0)
+            dangling += int((~known).sum())
+            sources.append(from_ids[known])
+            targets.append(to_ids[known])
+
+        # Repeated edges are stored once; sorting the combined ID sorts by
+        # source, then target
+        pairs = _sorted_unique(
+            np.concatenate(sources or [np.empty(0, dtype=np.int64)]) * self.vertex_count
+            + np.concatenate(targets or [np.empty(0, dtype=np.int64)])
+        )
+        sources = pairs // max(self.vertex_count, 1)
+        targets = pairs % max(self.vertex_count, 1)
+        index_dtype = np.int32 if self.vertex_count < 2**31 else np.int64
+
+        entry = {
+            "from": from_collections,
+            "to": to_collections,
+            "edges": len(pairs),
+            "dangling": dangling,
+        }
+        directory = os.path.join(self.output_dir, "edges")
+        os.makedirs(directory, exist_ok=True)
+        for direction, rows, columns, row_start, row_count in [
+            ("outbound", sources, targets, from_start, from_count),
+            ("inbound", targets, sources, to_start, to_count),
+        ]:
+            if direction == "inbound":
+                order = np.lexsort((columns, rows))
+                rows, columns = rows[order], columns[order]
+            indptr, indices = _csr(rows, columns, row_start, row_count, index_dtype)
+            np.save(
+                os.path.join(directory, f"{edge_collection}.{direction}.indptr.npy"),
+                indptr,
+            )
+            np.save(
+                os.path.join(directory, f"{edge_collection}.{direction}.indices.npy"),
+                indices,
+            )
+            entry[f"{direction}_row_start"] = row_start
+        logging.info(
+            f"Stored {len(pairs)} {edge_collection} edges, dropped {dangling} with unknown endpoints."
+        )
+        return entry
+
+    def build(self, edges=None):
+        edges = edges or graph_edges()
+        vertex_collections = sorted(
+            {
+                name
+                for _, from_names, to_names in edges
+                for name in from_names + to_names
+            }
+        )
+        self.build_vertices(vertex_collections)
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "vertex_count": self.vertex_count,
+            "collections": {
+                name: {"offset": self.offsets[name], "count": len(self.keys[name])}
+                for name in vertex_collections
+            },
+            "edges": {
+                edge_collection: self.build_edges(
+                    edge_collection, from_collections, to_collections
+                )
+                for edge_collection, from_collections, to_collections in edges
+            },
+        }
+        with open(os.path.join(self.output_dir, SNAPSHOT_MANIFEST), "w") as file:
+            json.dump(manifest, file, indent=2)
+        logging.info(
+            f"Saved a snapshot of {self.vertex_count} vertices and {len(manifest['edges'])} edge collections to {self.output_dir}."
+        )
+        return manifest
+
+
+def build_snapshot(source, output_dir=SNAPSHOT_DIR, edges=None):
+    return SnapshotBuilder(source, output_dir).build(edges)
+
+
+# --- Traversal --- #
+
+
+class GraphSnapshot:
+    # Read-only view of a snapshot. Arrays are memory-mapped, so processes
+    # opening the same snapshot share its pages.
+    def __init__(self, path=SNAPSHOT_DIR, mmap_mode="r"):
+        self.path = path
+        with open(os.path.join(path, SNAPSHOT_MANIFEST)) as file:
+            self.manifest = json.load(file)
+        self.vertex_count = self.manifest["vertex_count"]
+        self.collections = self.manifest["collections"]
+        self.edges = self.manifest["edges"]
+        self.keys = {
+            name: np.load(
+                os.path.join(path, "keys", f"{name}.npy"), mmap_mode=mmap_mode
+            )
+            for name in self.collections
+        }
+        self.adjacency = {}
+        for edge_collection in self.edges:
+            for direction in DIRECTIONS:
+                prefix = os.path.join(path, "edges", f"{edge_collection}.{direction}")
+                self.adjacency[edge_collection, direction] = (
+                    np.load(f"{prefix}.indptr.npy", mmap_mode=mmap_mode),
+                    np.load(f"{prefix}.indices.npy", mmap_mode=mmap_mode),
+                )
+        # Collections by offset, to map IDs back to keys
+        self.collection_order = sorted(
+            self.collections, key=lambda name: self.collections[name]["offset"]
+        )
+        self.collection_offsets = np.array(
+            [self.collections[name]["offset"] for name in self.collection_order],
+            dtype=np.int64,
+        )
+
+    def ids(self, collection_name, keys):
+        # Integer IDs of keys of one collection, -1 for unknown keys
+        sorted_keys = self.keys[collection_name]
+        keys = np.atleast_1d(np.array(keys, dtype=str))
+        if len(sorted_keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.searchsorted(sorted_keys, keys)
+        found = sorted_keys[np.minimum(positions, len(sorted_keys) - 1)] == keys
+        return np.where(
+            found, self.collections[collection_name]["offset"] + positions, -1
+        )
+
+    def handles(self, ids):
+        # "collection/key" per ID
+        ids = np.asarray(ids, dtype=np.int64)
+        slots = np.searchsorted(self.collection_offsets, ids, side="right") - 1
+        return [
+            f"{self.collection_order[slot]}/{self.keys[self.collection_order[slot]][vertex_id - self.collection_offsets[slot]]}"
+            for slot, vertex_id in zip(slots, ids)
+        ]
+
+    def neighbours(self, ids, edge_collection, direction="outbound"):
+        # Sorted unique neighbours of a set of vertices over one edge type
+        indptr, indices = self.adjacency[edge_collection, direction]
+        rows = (
+            np.asarray(ids, dtype=np.int64)
+            - self.edges[edge_collection][f"{direction}_row_start"]
+        )
+        rows = rows[(rows >= 0) & (rows < len(indptr) - 1)]
+        starts = indptr[rows]
+        lengths = indptr[rows + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # Positions of every neighbour slot of every row, without a loop
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions += np.arange(total)
+        return _sorted_unique(indices[positions].astype(np.int64))
+
+    def follow(self, ids, steps):
+        # Frontier after a path of steps, each an edge collection or an
+        # (edge collection, direction) pair: customer IDs through
+        # ["made_order", "visited", "located_in"] give their countries
+        frontier = _sorted_unique(np.asarray(ids, dtype=np.int64))
+        for step in steps:
+            edge_collection, direction = (
+                (step, "outbound") if isinstance(step, str) else step
+            )
+            frontier = self.neighbours(frontier, edge_collection, direction)
+        return frontier
+
+    def expand(self, ids, hops, edge_collections=None, directions=DIRECTIONS):
+        # Breadth-first k-hop expansion over the given edge types; returns
+        # the vertices first reached at each hop, hop 0 being the start set
+        edge_collections = edge_collections or list(self.edges)
+        visited = np.zeros(self.vertex_count, dtype=bool)
+        frontier = _sorted_unique(np.asarray(ids, dtype=np.int64))
+        visited[frontier] = True
+        frontiers = [frontier]
+        for _ in range(hops):
+            reached = [
+                self.neighbours(frontier, edge_collection, direction)
+                for edge_collection in edge_collections
+                for direction in directions
+            ]
+            frontier = _sorted_unique(np.concatenate(reached))
+            frontier = frontier[~visited[frontier]]
+            if len(frontier) == 0:
+                break
+            visited[frontier] = True
+            frontiers.append(frontier)
+        return frontiers
+
+    def degrees(self, edge_collection, direction="outbound"):
+        # Degree of every vertex of the edge type's source (outbound) or
+        # target (inbound) collections
+        indptr, _ = self.adjacency[edge_collection, direction]
+        return np.diff(indptr)
+
+    def degree_stats(self, edge_collection, direction="outbound"):
+        degrees = self.degrees(edge_collection, direction)
+        if len(degrees) == 0:
+            return {"vertices": 0, "edges": 0}
+        p50, p90, p99 = np.percentile(degrees, [50, 90, 99])
+        return {
+            "vertices": len(degrees),
+            "edges": int(degrees.sum()),
+            "mean": float(degrees.mean()),
+            "max": int(degrees.max()),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "isolated_share": float((degrees == 0).mean()),
+        }
+
+
+# --- Execution --- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build or inspect a CSR snapshot of the graph."
+    )
+    parser.add_argument("snapshot_dir", nargs="?", default=SNAPSHOT_DIR)
+    parser.add_argument(
+        "--shards",
+        help="Build from the shards of an offline import instead of the database",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--stats-only",
+        action="store_true",
+        help="Only log degree statistics of an existing snapshot",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    if not args.stats_only:
+        if args.shards:
+            snapshot_source = ShardSource(args.shards, args.batch_size)
+        else:
+            snapshot_source = DatabaseSource(batch_size=args.batch_size)
+        build_snapshot(snapshot_source, args.snapshot_dir)
+    snapshot = GraphSnapshot(args.snapshot_dir)
+    for edge_name in snapshot.edges:
+        for edge_direction in DIRECTIONS:
+            logging.info(
+                f"{edge_name} {edge_direction} degrees: {snapshot.degree_stats(edge_name, edge_direction)}"
+            )
@@ -1,11 +1,8 @@
-import os
+import json
 import logging
-import logging.handlers
-import ijson
-from arango import ArangoClient
-from arango_orm import Database
+from arangoConnection import daytrip  # connects lazily on first use
 from jsonExtractPrep import (
-    extract_and_validate_address,
+    extract_and_validate_addresses,
     extract_and_validate_country,
     extract_and_validate_location,
     extract_and_validate_customers,
@@ -13,16 +10,37 @@ from jsonExtractPrep import (
     extract_and_validate_order,
     extract_and_validate_payment_method,
     extract_and_validate_vehicle_type,
-    extract_and_validate_uses_vehicle,
-    extract_and_validate_located_in,
-    extract_and_validate_made_order,
-    extract_and_validate_visited,
-    extract_and_validate_depart_from_and_arrive_at,
-    extract_and_validate_payment_by,
-    extract_and_validate_order_from_location,
-    extract_and_validate_order_by_customer,
-    extract_and_validate_originated_from,
+    extract_edge_candidates,
+    HEADER_EXTRACTORS,
 )
+from bulkWriter import (
+    BulkWriter,
+    WriteAborted,
+    to_document,
+    INITIAL_BATCH_SIZE,
+    TARGET_FLUSH_LATENCY,
+    MEMORY_BUDGET_BYTES,
+)
+from shardWriter import ShardWriter, MAX_SHARD_BYTES
+from edgeSorter import SortingEdgeWriter, SORT_MEMORY_BUDGET_BYTES
+from keyRegistry import GlobalKeySets
+from projectedParser import projected_items, projection_for, is_slice, OVERSIZED_DETAILS
+from frameValidation import validate_file, frame_records, CHUNK_SIZE
+from extractorMapping import (
+    extract_compiled_vertices,
+    extract_compiled_edges,
+    COMPILED_EXTRACTORS,
+)
+from failureLog import FailureLog, FAILURE_LOG
+from streamingStats import ImportStats, IMPORT_STATS
+from customerMerge import CustomerMerger, CUSTOMER_MERGE_BUDGET_BYTES
+from fraudRules import FraudScorer, load_rules, FRAUD_CHUNK_SIZE
+from addressNormalization import address_index, ADDRESS_ALIASES
+from seasonCalendar import load_calendar
+from queryCache import GenerationCounters, GenerationBumper
+from initArango import seed_documents
+from memoryProfile import MemoryProfiler, profile_stage, MEMORY_SNAPSHOT_EVERY
+from importLogging import setup_import_logging, log_suppressed_summary
 from models import (
     Address,
     Country,
@@ -32,304 +50,600 @@ from models import (
     Order,
     PaymentMethod,
     VehicleType,
-    # Include other models if there are any
-    UsesVehicle,
-    LocatedIn,
-    MadeOrder,
-    Visited,
-    DepartFrom,
-    ArriveAt,
-    PaymentBy,
-    OrderFromLocation,
-    OrderByCustomer,
-    OriginatedFrom,
 )
 
-# --- Setup & Configuration --- #
-
-DATABASE_NAME = os.getenv("ARANGO_DB_NAME")
-USERNAME = os.getenv("ARANGO_DB_USERNAME")
-PASSWORD = os.getenv("ARANGO_DB_PASSWORD")
-HOST = os.getenv("ARANGO_DB_HOST")
-
-client = ArangoClient(hosts=HOST)
-db = client.db(DATABASE_NAME, username=USERNAME, password=PASSWORD)
-daytrip = Database(db)
-
 # --- Logging Setup --- #
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+# Records are sampled per message type and written by a background listener
+error_logger = setup_import_logging()
+
+# --- Extraction Helpers --- #
+
+VERTEX_EXTRACTORS = [
+    (Order, extract_and_validate_order, "order"),
+    (Customer, extract_and_validate_customers, "customers"),
+    (Country, extract_and_validate_country, "countries"),
+    (Location, extract_and_validate_location, "locations"),
+    (Season, extract_and_validate_season, "seasons"),
+    (Address, extract_and_validate_addresses, "addresses"),
+    (PaymentMethod, extract_and_validate_payment_method, "payment methods"),
+    (VehicleType, extract_and_validate_vehicle_type, "vehicle types"),
+]
+
+
+# The mapping spec of extractorMapping.py; "document" runs the hand-written
+# extractors it is verified against, "frame" the chunked frame engine
+DEFAULT_VALIDATION_ENGINE = "compiled"
+
+# Only the fields some extractor reads are built from the parser events
+IMPORT_PROJECTION = projection_for(
+    [extractor for _, extractor, _ in VERTEX_EXTRACTORS]
+    + [extract_edge_candidates]
+    + COMPILED_EXTRACTORS
+    + [ImportStats.add_document, FraudScorer.add_document]
 )
-logger = logging.getLogger()
-log_file_handler = logging.handlers.RotatingFileHandler(
-    "data_import.log", maxBytes=5 * 1024 * 1024, backupCount=3
-)
-logger.addHandler(log_file_handler)
-json_log_file_handler = logging.FileHandler("data_import_errors.json")
-logger.addHandler(json_log_file_handler)
-
-# --- Data Import Function --- #
 
 
-def import_data_to_arango(json_file_path, batch_size=500):
-    with open(json_file_path, "r") as file:
-        json_documents = ijson.items(file, "item")
-        processed_count = 0
-        inserted_count = 0
-        error_count = 0
-
-        for json_document in json_documents:
+def extract_vertex_groups(json_document, validation_engine=DEFAULT_VALIDATION_ENGINE):
+    if validation_engine == "compiled":
+        # Every vertex mapping of extractorMapping.py in one generated pass
+        try:
+            compiled_groups = extract_compiled_vertices(json_document)
+        except Exception as e:
+            raise ValueError(f"Error validating vertices: {e}") from e
+        return {model: compiled_groups[model][0] for model, _, _ in VERTEX_EXTRACTORS}
+    vertex_groups = {}
+    for model, extractor, label in VERTEX_EXTRACTORS:
+        if extractor in HEADER_EXTRACTORS and is_slice(json_document):
+            # Emitted once from the header of an oversized document
+            vertex_groups[model] = []
+            continue
+        try:
+            vertex_groups[model], _ = extractor(json_document)
+        except Exception as e:
+            raise ValueError(f"Error validating {label}: {e}") from e
+    return vertex_groups
+
+
+def edge_extractor(validation_engine):
+    # Every edge a document implies, without checking its endpoints
+    if validation_engine == "compiled":
+        return extract_compiled_edges
+    return extract_edge_candidates
+
+
+def seeded_handles():
+    # Vehicle types, payment methods and calendar seasons seeded by the
+    # migration, see register_seeded_keys
+    return {
+        f"{collection_name}/{document['_key']}"
+        for collection_name, documents in seed_documents().items()
+        for document in documents
+    }
+
+
+def extract_entity_groups(
+    json_document, validation_engine=DEFAULT_VALIDATION_ENGINE, known_handles=()
+):
+    # Extract and validate main entities
+    vertex_groups = extract_vertex_groups(json_document, validation_engine)
+    handles = set()
+    for model, entities in vertex_groups.items():
+        for entity in entities:
+            key = entity["_key"] if isinstance(entity, dict) else entity._key
+            handles.add(f"{model.__collection__}/{key}")
+
+    # The edges of the two-phase import, kept when both endpoints are
+    # vertices of this document or seeded reference data
+    edge_groups = {}
+    try:
+        for model, edge in edge_extractor(validation_engine)(json_document):
+            if (edge["_from"] in handles or edge["_from"] in known_handles) and (
+                edge["_to"] in handles or edge["_to"] in known_handles
+            ):
+                edge_groups.setdefault(model, []).append(edge)
+    except Exception as e:
+        raise ValueError(f"Error validating edges: {e}") from e
+
+    # Queue data for the respective collections based on models,
+    # the writer flushes each collection in adaptively sized batches
+    return list(vertex_groups.items()) + list(edge_groups.items())
+
+
+# --- Two-Phase Import --- #
+
+
+def import_vertices(
+    json_file_path,
+    writer,
+    key_sets,
+    log_interval,
+    failures=None,
+    import_stats=None,
+    profiler=None,
+    customer_merger=None,
+    fraud_scorer=None,
+    validation_engine=DEFAULT_VALIDATION_ENGINE,
+):
+    processed_count = 0
+    error_count = 0
+    with open(json_file_path, "rb") as file:
+        for item_index, byte_offset, json_document in projected_items(
+            file, IMPORT_PROJECTION, max_details=OVERSIZED_DETAILS, positions=True
+        ):
             try:
-                # Extract and validate main entities
-                try:
-                    validated_orders, _ = extract_and_validate_order(json_document)
-                except Exception as e:
-                    logging.error("Error validating order: %s", str(e))
-                    continue
-
-                try:
-                    validated_customers, _ = extract_and_validate_customers(
-                        json_document
+                vertex_groups = extract_vertex_groups(json_document, validation_engine)
+                validated_orders = vertex_groups[Order]
+                if customer_merger is not None:
+                    customer_merger.add_document(json_document, vertex_groups)
+                if fraud_scorer is not None:
+                    # Orders are held back until their chunk is scored
+                    vertex_groups[Order] = fraud_scorer.add_document(
+                        json_document, vertex_groups[Order]
                     )
-                except Exception as e:
-                    logging.error("Error validating customers: %s", str(e))
-                    continue
-
-                try:
-                    validated_countries, _ = extract_and_validate_country(json_document)
-                except Exception as e:
-                    logging.error("Error validating countries: %s", str(e))
+                for model, entities in vertex_groups.items():
+                    # Merged customers are written once the input is read
+                    if model is Customer and customer_merger is not None:
+                        continue
+                    for entity in entities:
+                        document = to_document(entity)
+                        # Repeats of reference vertices are dropped here
+                        # instead of failing on the unique key
+                        if not key_sets.add(model.__collection__, document["_key"]):
+                            continue
+                        # Addresses are written once every country is known
+                        if model is Address:
+                            address_index.add(document)
+                        else:
+                            writer.add(model.__collection__, document)
+                if import_stats is not None:
+                    import_stats.add_document(json_document, validated_orders)
+                # Continuation slices of an oversized document are not counted
+                if is_slice(json_document):
                     continue
-
-                try:
-                    validated_locations, _ = extract_and_validate_location(
-                        json_document
-                    )
-                except Exception as e:
-                    logging.error("Error validating locations: %s", str(e))
-                    continue
-
-                try:
-                    validated_seasons, _ = extract_and_validate_season(json_document)
-                except Exception as e:
-                    logging.error("Error validating seasons: %s", str(e))
-                    continue
-
-                try:
-                    validated_addresses, _ = extract_and_validate_address(json_document)
-                except Exception as e:
-                    logging.error("Error validating addresses: %s", str(e))
-                    continue
-
-                try:
-                    validated_methods, _ = extract_and_validate_payment_method(
-                        json_document
-                    )
-                except Exception as e:
-                    logging.error("Error validating payment methods: %s", str(e))
-                    continue
-
-                try:
-                    validated_vehicles, _ = extract_and_validate_vehicle_type(
-                        json_document
+                processed_count += 1
+                if profiler is not None:
+                    profiler.tick(processed_count)
+                if processed_count % log_interval == 0:
+                    logging.info(f"Phase one: processed {processed_count} documents.")
+            except WriteAborted:
+                raise
+            except Exception as e:
+                error_count += 1
+                logging.error("Error processing item %d: %s", item_index, str(e))
+                if failures is not None:
+                    failures.record(
+                        item_index, byte_offset, json_document, str(e), "vertices"
                     )
-                except Exception as e:
-                    logging.error("Error validating vehicle types: %s", str(e))
+    if fraud_scorer is not None:
+        for entity in fraud_scorer.finish():
+            document = to_document(entity)
+            if key_sets.add(Order.__collection__, document["_key"]):
+                writer.add(Order.__collection__, document)
+        fraud_scorer.log_summary()
+    if customer_merger is not None:
+        for document in customer_merger.merged():
+            if key_sets.add(Customer.__collection__, document["_key"]):
+                writer.add(Customer.__collection__, document)
+        customer_merger.log_summary()
+    for document in address_index.resolved():
+        writer.add(Address.__collection__, document)
+    writer.flush_all()
+    return processed_count, error_count
+
+
+def import_edges(
+    json_file_path,
+    writer,
+    key_sets,
+    log_interval,
+    failures=None,
+    profiler=None,
+    validation_engine=DEFAULT_VALIDATION_ENGINE,
+):
+    extract_edges = edge_extractor(validation_engine)
+    processed_count = 0
+    error_count = 0
+    dangling_counts = {}
+    with open(json_file_path, "rb") as file:
+        for item_index, byte_offset, json_document in projected_items(
+            file, IMPORT_PROJECTION, max_details=OVERSIZED_DETAILS, positions=True
+        ):
+            try:
+                for model, edge in extract_edges(json_document):
+                    if key_sets.contains_id(edge["_from"]) and key_sets.contains_id(
+                        edge["_to"]
+                    ):
+                        writer.add(model.__collection__, edge)
+                    else:
+                        dangling_counts[model.__collection__] = (
+                            dangling_counts.get(model.__collection__, 0) + 1
+                        )
+                if is_slice(json_document):
                     continue
-
-                # Extract and validate relationships
-                try:
-                    validated_uses_vehicles, _ = extract_and_validate_uses_vehicle(
-                        json_document, validated_orders, validated_vehicles
+                processed_count += 1
+                if profiler is not None:
+                    profiler.tick(processed_count)
+                if processed_count % log_interval == 0:
+                    logging.info(f"Phase two: processed {processed_count} documents.")
+            except WriteAborted:
+                raise
+            except Exception as e:
+                error_count += 1
+                logging.error("Error processing item %d: %s", item_index, str(e))
+                if failures is not None:
+                    failures.record(
+                        item_index, byte_offset, json_document, str(e), "edges"
                     )
-                except Exception as e:
-                    logging.error("Error validating uses vehicles: %s", str(e))
+    writer.flush_all()
+    return processed_count, error_count, dangling_counts
+
+
+def import_vertex_frames(json_file_path, writer, key_sets, chunk_size, profiler=None):
+    # Phase one with the chunked frame engine: whole vertex tables per chunk
+    processed_count = 0
+    for document_count, tables, _ in validate_file(json_file_path, chunk_size):
+        for model, table in tables.items():
+            if "_from" in table:
+                continue
+            for document in frame_records(table):
+                if not key_sets.add(model.__collection__, document["_key"]):
                     continue
-
-                try:
-                    validated_located_ins, _ = extract_and_validate_located_in(
-                        json_document, validated_locations, validated_countries
+                # Addresses are written once every country is known
+                if model is Address:
+                    address_index.add(document)
+                else:
+                    writer.add(model.__collection__, document)
+        processed_count += document_count
+        if profiler is not None:
+            profiler.tick(processed_count)
+        logging.info(f"Phase one: processed {processed_count} documents.")
+    for document in address_index.resolved():
+        writer.add(Address.__collection__, document)
+    writer.flush_all()
+    return processed_count, 0
+
+
+def import_edge_frames(json_file_path, writer, key_sets, chunk_size, profiler=None):
+    processed_count = 0
+    dangling_counts = {}
+    for document_count, tables, _ in validate_file(json_file_path, chunk_size):
+        for model, table in tables.items():
+            if "_from" not in table:
+                continue
+            for edge in frame_records(table):
+                if key_sets.contains_id(edge["_from"]) and key_sets.contains_id(
+                    edge["_to"]
+                ):
+                    writer.add(model.__collection__, edge)
+                else:
+                    dangling_counts[model.__collection__] = (
+                        dangling_counts.get(model.__collection__, 0) + 1
                     )
-                except Exception as e:
-                    logging.error("Error validating located ins: %s", str(e))
-                    continue
-
-                try:
-                    validated_made_orders, _ = extract_and_validate_made_order(
-                        json_document
-                    )
-                except Exception as e:
-                    logging.error("Error validating made orders: %s", str(e))
-                    continue
+        processed_count += document_count
+        if profiler is not None:
+            profiler.tick(processed_count)
+        logging.info(f"Phase two: processed {processed_count} documents.")
+    writer.flush_all()
+    return processed_count, 0, dangling_counts
+
+
+def register_seeded_keys(key_sets):
+    # Vehicle types, payment methods and calendar seasons are seeded by the
+    # migration, so edges to ones that no document names are not dangling
+    for collection_name, documents in seed_documents().items():
+        for document in documents:
+            key_sets.add(collection_name, document["_key"])
+
+
+def import_two_phase(
+    json_file_path,
+    writer,
+    log_interval,
+    key_set_mode="compact",
+    spill_dir=None,
+    validation_engine=DEFAULT_VALIDATION_ENGINE,
+    chunk_size=CHUNK_SIZE,
+    failures=None,
+    import_stats=None,
+    profiler=None,
+    customer_merger=None,
+    fraud_scorer=None,
+):
+    # Phase one writes every vertex and records its key; phase two streams
+    # the edges and keeps only those whose endpoints exist anywhere in the
+    # input, not just in the same document.
+    key_sets = GlobalKeySets(mode=key_set_mode, spill_dir=spill_dir)
+    with profile_stage(profiler, "vertices"):
+        if validation_engine == "frame":
+            processed_count, error_count = import_vertex_frames(
+                json_file_path, writer, key_sets, chunk_size, profiler
+            )
+        else:
+            processed_count, error_count = import_vertices(
+                json_file_path,
+                writer,
+                key_sets,
+                log_interval,
+                failures,
+                import_stats,
+                profiler,
+                customer_merger,
+                fraud_scorer,
+                validation_engine,
+            )
+    for collection_name, stats in sorted(key_sets.summary().items()):
+        logging.info(
+            f"Phase one: {collection_name} has {stats['keys']} keys in a {stats['kind']} of {stats['bytes']} bytes."
+        )
+        if stats["bloom_repeats"]:
+            logging.info(
+                f"Phase one: dropped {stats['bloom_repeats']} {collection_name} documents the Bloom filter reported as written."
+            )
+    register_seeded_keys(key_sets)
+
+    try:
+        with profile_stage(profiler, "edges"):
+            if validation_engine == "frame":
+                _, edge_error_count, dangling_counts = import_edge_frames(
+                    json_file_path, writer, key_sets, chunk_size, profiler
+                )
+            else:
+                _, edge_error_count, dangling_counts = import_edges(
+                    json_file_path,
+                    writer,
+                    key_sets,
+                    log_interval,
+                    failures,
+                    profiler,
+                    validation_engine,
+                )
+    finally:
+        key_sets.close()
+    for collection_name, dangling_count in sorted(dangling_counts.items()):
+        logging.info(
+            f"Phase two: rejected {dangling_count} {collection_name} edges with unknown endpoints."
+        )
 
-                try:
-                    validated_visiteds, _ = extract_and_validate_visited(
-                        json_document, validated_orders
-                    )
-                except Exception as e:
-                    logging.error("Error validating visiteds: %s", str(e))
-                    continue
+    with profile_stage(profiler, "close"):
+        writer.close()
+    if failures is not None:
+        failures.close()
+    inserted_count = sum(writer.created.values())
+    logging.info(
+        f"Finished processing. Total documents: {processed_count}. Total inserted entities: {inserted_count}. Total errors: {error_count + edge_error_count}."
+    )
+    writer.log_summary()
+    log_suppressed_summary()
 
-                try:
-                    (
-                        validated_depart_froms,
-                        validated_arrive_ats,
-                        _,
-                    ) = extract_and_validate_depart_from_and_arrive_at(
-                        json_document, validated_orders
-                    )
-                except Exception as e:
-                    logging.error("Error validating depart froms: %s", str(e))
-                    continue
 
-                try:
-                    validated_payment_bys, _ = extract_and_validate_payment_by(
-                        json_document, validated_orders, validated_methods
-                    )
-                except Exception as e:
-                    logging.error("Error validating payment bys: %s", str(e))
-                    continue
+# --- Data Import Function --- #
 
-                try:
-                    (
-                        validated_originated_froms,
-                        _,
-                    ) = extract_and_validate_originated_from(
-                        json_document, validated_customers, validated_countries
-                    )
-                except Exception as e:
-                    logging.error("Error validating originated froms: %s", str(e))
-                    continue
 
-                try:
-                    (
-                        validated_order_from_locations,
-                        _,
-                    ) = extract_and_validate_order_from_location(
-                        json_document, validated_orders, validated_locations
-                    )
-                except Exception as e:
-                    logging.error("Error validating order from locations: %s", str(e))
-                    continue
+def import_data_to_arango(
+    json_file_path,
+    log_interval=500,
+    initial_batch_size=INITIAL_BATCH_SIZE,
+    target_flush_latency=TARGET_FLUSH_LATENCY,
+    memory_budget_bytes=MEMORY_BUDGET_BYTES,
+    two_phase=False,
+    key_set_mode="compact",
+    key_spill_dir=None,
+    quarantine_path="data_import_quarantine.jsonl",
+    offline_dir=None,
+    offline_compress=False,
+    max_shard_bytes=MAX_SHARD_BYTES,
+    sort_edges=False,
+    sort_memory_budget_bytes=SORT_MEMORY_BUDGET_BYTES,
+    sort_temp_dir=None,
+    validation_engine=DEFAULT_VALIDATION_ENGINE,
+    chunk_size=CHUNK_SIZE,
+    failure_log_path=FAILURE_LOG,
+    stats_path=IMPORT_STATS,
+    memory_profile_path=None,
+    memory_snapshot_every=MEMORY_SNAPSHOT_EVERY,
+    address_aliases_path=ADDRESS_ALIASES,
+    merge_customers=False,
+    customer_merge_budget_bytes=CUSTOMER_MERGE_BUDGET_BYTES,
+    customer_merge_dir=None,
+    season_calendar_path=None,
+    score_fraud=False,
+    fraud_rules_path=None,
+    fraud_chunk_size=FRAUD_CHUNK_SIZE,
+    bump_cache_generations=True,
+):
+    # Orders are assigned to calendar years of departure unless a season
+    # calendar is given, see seasonCalendar.py
+    if season_calendar_path:
+        load_calendar(season_calendar_path)
+    # Opt-in tracemalloc and RSS profile, see memoryProfile.py
+    profiler = None
+    if memory_profile_path:
+        profiler = MemoryProfiler(memory_profile_path, memory_snapshot_every)
+    # Documents that fail are recorded for replayFailures.py
+    failures = FailureLog(failure_log_path) if failure_log_path else None
+    # Price, lead time and customer sketches per season and country
+    import_stats = ImportStats() if stats_path else None
+    # Customers repeated across documents are written once, consolidated
+    customer_merger = None
+    if merge_customers:
+        customer_merger = CustomerMerger(
+            customer_merge_budget_bytes, customer_merge_dir
+        )
+    # Orders are marked potential_fraud by the rules in fraudRules.py
+    fraud_scorer = None
+    if score_fraud:
+        fraud_scorer = FraudScorer(load_rules(fraud_rules_path), fraud_chunk_size)
+    generation_bumper = None
+    if offline_dir is not None:
+        # Offline mode writes arangoimport-ready shards instead of calling
+        # the database; load them with loadShards.py. Repeated keys are
+        # dropped here, there is no unique index to reject them.
+        writer = ShardWriter(
+            offline_dir,
+            max_shard_bytes=max_shard_bytes,
+            compress=offline_compress,
+            key_sets=GlobalKeySets(mode=key_set_mode, spill_dir=key_spill_dir),
+        )
+    else:
+        # Cached dashboard queries on a collection are invalidated by the
+        # flushes that write to it, see queryCache.py
+        if bump_cache_generations:
+            generation_bumper = GenerationBumper(GenerationCounters(daytrip))
+        writer = BulkWriter(
+            daytrip,
+            initial_batch_size=initial_batch_size,
+            target_latency=target_flush_latency,
+            memory_budget_bytes=memory_budget_bytes,
+            quarantine_path=quarantine_path,
+            on_flush=generation_bumper,
+        )
+    if sort_edges:
+        # Edges are written last, ordered by _from and deduplicated
+        writer = SortingEdgeWriter(
+            writer, memory_budget_bytes=sort_memory_budget_bytes, temp_dir=sort_temp_dir
+        )
+    if validation_engine == "frame" and not two_phase:
+        # Frame tables carry edges without per-document endpoint checks,
+        # those are only made against the global key sets
+        logging.info("The frame validation engine runs as a two-phase import.")
+        two_phase = True
+    if two_phase:
+        if validation_engine == "frame" and import_stats is not None:
+            # The frame engine does not hand out documents to sketch
+            logging.info("Import statistics are not collected by the frame engine.")
+            import_stats = None
+        if validation_engine == "frame" and customer_merger is not None:
+            logging.info("Customers are not merged by the frame engine.")
+            customer_merger = None
+        if validation_engine == "frame" and fraud_scorer is not None:
+            logging.info("Orders are not scored by the frame engine.")
+            fraud_scorer = None
+        import_two_phase(
+            json_file_path,
+            writer,
+            log_interval,
+            key_set_mode,
+            key_spill_dir,
+            validation_engine,
+            chunk_size,
+            failures,
+            import_stats,
+            profiler,
+            customer_merger,
+            fraud_scorer,
+        )
+        if generation_bumper is not None:
+            generation_bumper.close()
+        if import_stats is not None:
+            import_stats.save(stats_path)
+        if address_aliases_path:
+            address_index.save_aliases(address_aliases_path)
+        if profiler is not None:
+            profiler.close()
+        return
+
+    known_handles = seeded_handles()
+    with open(json_file_path, "rb") as file, profile_stage(profiler, "single pass"):
+        json_documents = projected_items(
+            file, IMPORT_PROJECTION, max_details=OVERSIZED_DETAILS, positions=True
+        )
+        processed_count = 0
+        queued_count = 0
+        error_count = 0
 
-                try:
-                    (
-                        validated_order_by_customers,
-                        _,
-                    ) = extract_and_validate_order_by_customer(
-                        json_document, validated_orders, validated_locations
-                    )
-                except Exception as e:
-                    logging.error("Error validating order by customers: %s", str(e))
+        for item_index, byte_offset, json_document in json_documents:
+            try:
+                entity_groups = extract_entity_groups(
+                    json_document, validation_engine, known_handles
+                )
+                validated_orders = dict(entity_groups)[Order]
+                if customer_merger is not None:
+                    customer_merger.add_document(json_document, dict(entity_groups))
+                if fraud_scorer is not None:
+                    # Orders are held back until their chunk is scored
+                    entity_groups = [
+                        (
+                            model,
+                            (
+                                fraud_scorer.add_document(json_document, entities)
+                                if model is Order
+                                else entities
+                            ),
+                        )
+                        for model, entities in entity_groups
+                    ]
+                for model, entities in entity_groups:
+                    # Merged customers are written once the input is read
+                    if model is Customer and customer_merger is not None:
+                        continue
+                    for entity in entities:
+                        # Every upstream ID of an address shares its
+                        # canonical key; the first is held until the
+                        # countries of the whole input are known
+                        if model is Address:
+                            address_index.add(entity)
+                            continue
+                        writer.add(model.__collection__, entity)
+
+                queued_count += sum(len(entities) for _, entities in entity_groups)
+                if import_stats is not None:
+                    import_stats.add_document(json_document, validated_orders)
+                if is_slice(json_document):
                     continue
-
-                # Insert data to respective collections based on models
-                # For main entities
-                for order in validated_orders:
-                    try:
-                        if isinstance(order, Order):
-                            order = order.to_dict()
-                        daytrip.add(Order(**order))
-                    except Exception as e:
-                        logging.error("Error adding order: %s", str(e))
-
-                for customer in validated_customers:
-                    try:
-                        daytrip.add(Customer(**customer))
-                    except Exception as e:
-                        logging.error("Error adding customer: %s", str(e))
-
-                for country in validated_countries:
-                    try:
-                        daytrip.add(Country(**country))
-                    except Exception as e:
-                        logging.error("Error adding country: %s", str(e))
-
-                for location in validated_locations:
-                    try:
-                        daytrip.add(Location(**location))
-                    except Exception as e:
-                        logging.error("Error adding location: %s", str(e))
-
-                for season in validated_seasons:
-                    daytrip.add(Season(**season))
-                for address in validated_addresses:
-                    daytrip.add(Address(**address))
-                for method in validated_methods:
-                    daytrip.add(PaymentMethod(**method))
-                for vehicle in validated_vehicles:
-                    daytrip.add(VehicleType(**vehicle))
-
-                # For relationships
-                for uses_vehicle in validated_uses_vehicles:
-                    daytrip.add(UsesVehicle(**uses_vehicle))
-                for located_in in validated_located_ins:
-                    daytrip.add(LocatedIn(**located_in))
-                for made_order in validated_made_orders:
-                    daytrip.add(MadeOrder(**made_order))
-                for visited in validated_visiteds:
-                    daytrip.add(Visited(**visited))
-                for depart_from in validated_depart_froms:
-                    daytrip.add(DepartFrom(**depart_from))
-                for payment_by in validated_payment_bys:
-                    daytrip.add(PaymentBy(**payment_by))
-                for originated_from in validated_originated_froms:
-                    daytrip.add(OriginatedFrom(**originated_from))
-                for order_from_location in validated_order_from_locations:
-                    daytrip.add(OrderFromLocation(**order_from_location))
-                for order_by_customer in validated_order_by_customers:
-                    daytrip.add(OrderByCustomer(**order_by_customer))
-                for arrive_at in validated_arrive_ats:
-                    daytrip.add(ArriveAt(**arrive_at))
-
                 processed_count += 1
-                # Update the inserted_count based on all the entities and relationships
-                inserted_count += sum(
-                    [
-                        len(validated_orders),
-                        len(validated_customers),
-                        len(validated_countries),
-                        len(validated_locations),
-                        len(validated_seasons),
-                        len(validated_addresses),
-                        len(validated_methods),
-                        len(validated_vehicles),
-                        len(validated_uses_vehicles),
-                        len(validated_located_ins),
-                        len(validated_made_orders),
-                        len(validated_visiteds),
-                        len(validated_depart_froms),
-                        len(validated_payment_bys),
-                        len(validated_originated_froms),
-                        len(validated_order_from_locations),
-                        len(validated_order_by_customers),
-                    ]
-                )
+                if profiler is not None:
+                    profiler.tick(processed_count)
 
-                if processed_count % batch_size == 0:
+                if processed_count % log_interval == 0:
                     logging.info(
-                        f"Processed {processed_count} documents. Inserted {inserted_count} entities."
+                        f"Processed {processed_count} documents. Queued {queued_count} entities."
                     )
 
+            except WriteAborted:
+                raise
             except Exception as e:
                 error_count += 1
-                logging.error(f"Error processing document {processed_count}: {str(e)}")
-                json_log_file_handler.emit(
-                    logging.LogRecord(
-                        name=logger.name,
-                        level=logging.ERROR,
-                        pathname=None,
-                        lineno=None,
-                        msg=f"{{'document_number': {processed_count}, 'error': '{str(e)}'}}",
-                        args=None,
-                        exc_info=None,
+                logging.error("Error processing item %d: %s", item_index, str(e))
+                error_logger.error(
+                    json.dumps(
+                        {
+                            "item_index": item_index,
+                            "byte_offset": byte_offset,
+                            "error": str(e),
+                        }
                     )
                 )
-
+                if failures is not None:
+                    failures.record(item_index, byte_offset, json_document, str(e))
+
+        if fraud_scorer is not None:
+            for entity in fraud_scorer.finish():
+                writer.add(Order.__collection__, entity)
+            fraud_scorer.log_summary()
+        if customer_merger is not None:
+            for document in customer_merger.merged():
+                writer.add(Customer.__collection__, document)
+            customer_merger.log_summary()
+        for document in address_index.resolved():
+            writer.add(Address.__collection__, document)
+        writer.close()
+        if generation_bumper is not None:
+            generation_bumper.close()
+        if failures is not None:
+            failures.close()
+        if import_stats is not None:
+            import_stats.save(stats_path)
+        if address_aliases_path:
+            address_index.save_aliases(address_aliases_path)
+        inserted_count = sum(writer.created.values())
         logging.info(
             f"Finished processing. Total documents: {processed_count}. Total inserted entities: {inserted_count}. Total errors: {error_count}."
         )
+        writer.log_summary()
+        log_suppressed_summary()
+    if profiler is not None:
+        profiler.close()
 
 
 # --- Execution --- #
@@ -0,0 +1,159 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+# --- Defaults --- #
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_FILE = "data_import.log"
+ERROR_LOG_FILE = "data_import_errors.json"
+# Records of one message type that always pass before sampling starts
+SAMPLE_BURST = 10
+# After the burst, one in this many records of a message type passes
+SAMPLE_EVERY = 1000
+# A message type with suppressed records passes at least this often, in seconds
+SUMMARY_INTERVAL = 30.0
+
+
+class SamplingFilter(logging.Filter):
+    # Rate-limits records per message type, keyed on the unformatted message
+    # so "Error adding %s: %s" is one type however many entities fail. The
+    # next record let through carries the number of records suppressed
+    # before it.
+    def __init__(
+        self,
+        burst=SAMPLE_BURST,
+        sample_every=SAMPLE_EVERY,
+        summary_interval=SUMMARY_INTERVAL,
+    ):
+        super().__init__()
+        self.burst = burst
+        self.sample_every = sample_every
+        self.summary_interval = summary_interval
+        self.lock = threading.Lock()
+        # (levelno, msg) -> [seen, suppressed, last passed at]
+        self.states = {}
+
+    def filter(self, record):
+        if getattr(record, "unsampled", False):
+            return True
+        key = (record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = [0, 0, now]
+            state[0] += 1
+            seen, suppressed, last_passed = state
+            if (
+                seen > self.burst
+                and seen % self.sample_every
+                and now - last_passed < self.summary_interval
+            ):
+                state[1] += 1
+                return False
+            state[1] = 0
+            state[2] = now
+
+        if suppressed:
+            record.msg = (
+                record.getMessage().replace("%", "%%")
+                + " [%d similar messages suppressed]"
+            )
+            record.args = (suppressed,)
+        return True
+
+    def drain_suppressed(self):
+        with self.lock:
+            drained = [
+                (msg, state[1]) for (_, msg), state in self.states.items() if state[1]
+            ]
+            for state in self.states.values():
+                state[1] = 0
+        return drained
+
+
+# --- Setup --- #
+
+sampling_filter = None
+listener = None
+
+
+def setup_import_logging(
+    log_file=LOG_FILE,
+    error_log_file=ERROR_LOG_FILE,
+    level=logging.INFO,
+    burst=SAMPLE_BURST,
+    sample_every=SAMPLE_EVERY,
+):
+    # Formatting and file I/O move to a QueueListener thread; the importer
+    # only samples the record and puts it on a queue.
+    global sampling_filter, listener
+    if listener is not None:
+        return logging.getLogger("data_import_errors")
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    log_file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=5 * 1024 * 1024, backupCount=3
+    )
+    log_file_handler.setFormatter(formatter)
+    json_log_file_handler = logging.FileHandler(error_log_file)
+
+    log_queue = queue.SimpleQueue()
+    sampling_filter = SamplingFilter(burst=burst, sample_every=sample_every)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(sampling_filter)
+
+    logger = logging.getLogger()
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+
+    # Per-document failure records go only to the JSON error file and are
+    # never sampled, so every failed document can be traced afterwards.
+    error_logger = logging.getLogger("data_import_errors")
+    error_logger.propagate = False
+    error_logger.setLevel(logging.ERROR)
+    error_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        stream_handler,
+        log_file_handler,
+        json_log_file_handler,
+        respect_handler_level=True,
+    )
+    # The JSON file only takes records from the error logger
+    json_log_file_handler.addFilter(lambda record: record.name == "data_import_errors")
+    stream_handler.addFilter(lambda record: record.name != "data_import_errors")
+    log_file_handler.addFilter(lambda record: record.name != "data_import_errors")
+    listener.start()
+    atexit.register(stop_import_logging)
+    return error_logger
+
+
+def log_suppressed_summary():
+    if sampling_filter is None:
+        return
+    for msg, suppressed in sampling_filter.drain_suppressed():
+        # Summaries bypass the sampling filter, they must always be written
+        logging.warning(
+            "Suppressed %d similar messages: %s",
+            suppressed,
+            msg,
+            extra={"unsampled": True},
+        )
+
+
+def stop_import_logging():
+    global listener
+    if listener is not None:
+        log_suppressed_summary()
+        listener.stop()
+        listener = None
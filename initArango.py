@@ -1,29 +1,24 @@
 import sys
-from arango_orm import Database, Graph, GraphConnection, graph_relationship
-from arango import ArangoClient
+import logging
+import argparse
+from arango_orm import Graph, GraphConnection, graph_relationship
+from arangoConnection import db, daytrip  # connect lazily on first use
+from bulkWriter import to_document
+from seasonCalendar import season_calendar, load_calendar
+from queryCache import GENERATIONS_COLLECTION
 from models import *  # (Import all from models.py)
-from dotenv import load_dotenv
 import re
-import os
 import uuid
-from datetime import date
+from datetime import date, datetime, timezone
 
-# Load environment variables
-load_dotenv()
+# --- Desired Schema --- #
 
-# Parameters
-DATABASE_NAME = os.getenv("ARANGO_DB_NAME")
-USERNAME = os.getenv("ARANGO_DB_USERNAME")
-PASSWORD = os.getenv("ARANGO_DB_PASSWORD")
-HOST = os.getenv("ARANGO_DB_HOST")
+# Bump when the desired state below changes, so existing databases re-run the
+# migration instead of skipping it as up to date
+SCHEMA_VERSION = 4
+MIGRATIONS_COLLECTION = "schema_migrations"
+MIGRATION_KEY = "daytrip"
 
-# Connect to the server
-client = ArangoClient(hosts=HOST)
-
-# Connect to our target database
-db = client.db(DATABASE_NAME, username=USERNAME, password=PASSWORD)
-daytrip = Database(db)
-# Create collections if they don't exist
 collections = [
     Address,
     Country,
@@ -34,53 +29,61 @@ collections = [
     PaymentMethod,
     VehicleType,
 ]
-for collection in collections:
-    if not db.has_collection(collection.__collection__):
-        db.create_collection(collection.__collection__)
 
-# Create edge definitions
 relations = [
-    LocatedIn,
+    OriginatedFrom,
+    FrequentlyVisits,
     MadeOrder,
+    OrderInSeason,
+    LocatedIn,
+    OrderFromLocation,
     Visited,
     UsesVehicle,
+    OrderByCustomer,
     DepartFrom,
     ArriveAt,
     PaymentBy,
 ]
-for relation in relations:
-    if not db.has_collection(relation.__collection__):
-        db.create_collection(relation.__collection__, edge=True)
-
-
-def initialize_vehicle_types_and_payment_methods():
-    # Initialize vehicle types
-    if not list(db.collection(VehicleType.__collection__).all()):
-        vehicle = VehicleType(_key="0", type_name="sedan")
-        daytrip.add(vehicle)
-
-        vehicle = VehicleType(_key="1", type_name="mpv")
-        daytrip.add(vehicle)
-
-        vehicle = VehicleType(_key="2", type_name="van")
-        daytrip.add(vehicle)
 
-        vehicle = VehicleType(_key="3", type_name="luxury sedan")
-        daytrip.add(vehicle)
-
-        vehicle = VehicleType(_key="4", type_name="shuttle")
-        daytrip.add(vehicle)
-
-    # Initialize payment methods
-    if not list(daytrip.collection(PaymentMethod.__collection__).all()):
-        payment_method = PaymentMethod(_key="0", method_name="cash payment")
-        daytrip.add(payment_method)
-
-        payment_method = PaymentMethod(_key="1", method_name="online payment")
-        daytrip.add(payment_method)
-
-        payment_method = PaymentMethod(_key="2", method_name="bizdev/partner payment")
-        daytrip.add(payment_method)
+# Persistent indexes per collection, on top of the primary and edge indexes
+indexes = {
+    Customer: [{"fields": ["email"], "unique": False, "sparse": True}],
+    # Per-season and departure range queries, see SEASON_ORDERS_QUERY
+    Order: [{"fields": ["season", "departure_at"], "unique": False, "sparse": False}],
+}
+
+vehicle_types = {
+    "0": "sedan",
+    "1": "mpv",
+    "2": "van",
+    "3": "luxury sedan",
+    "4": "shuttle",
+}
+
+payment_methods = {
+    "0": "cash payment",
+    "1": "online payment",
+    "2": "bizdev/partner payment",
+}
+
+
+def seed_documents():
+    return {
+        VehicleType.__collection__: [
+            to_document(VehicleType(_key=key, type_name=type_name))
+            for key, type_name in vehicle_types.items()
+        ],
+        PaymentMethod.__collection__: [
+            to_document(PaymentMethod(_key=key, method_name=method_name))
+            for key, method_name in payment_methods.items()
+        ],
+        # Every season orders can be assigned to, so order_in_season edges
+        # never point at a season no document named
+        Season.__collection__: [
+            to_document(Season(_key=season["_key"], name=season["name"]))
+            for season in season_calendar.seasons()
+        ],
+    }
 
 
 class MyGraphDefinition(Graph):
@@ -96,17 +99,168 @@ class MyGraphDefinition(Graph):
         GraphConnection(Order, DepartFrom, Address),
         GraphConnection(Order, ArriveAt, Address),
         GraphConnection(Order, PaymentBy, PaymentMethod),
+        GraphConnection(Order, OrderInSeason, Season),
         GraphConnection(Location, LocatedIn, Country),
     ]
 
 
-def initialize_graph():
-    # Create the graph definition object
-    graph_def = MyGraphDefinition(graph_name="MyGraph", connection=daytrip)
+# --- Migration --- #
+
+
+def collection_names(classes):
+    if not isinstance(classes, (list, tuple)):
+        classes = [classes]
+    return [cls.__collection__ for cls in classes]
+
+
+def desired_edge_definitions():
+    return {
+        connection.relation.__collection__: {
+            "edge_collection": connection.relation.__collection__,
+            "from_vertex_collections": collection_names(connection.collections_from),
+            "to_vertex_collections": collection_names(connection.collections_to),
+        }
+        for connection in MyGraphDefinition.graph_connections
+    }
+
+
+def migrate_collections(existing):
+    created = 0
+    for collection_class, edge in [(c, False) for c in collections] + [
+        (r, True) for r in relations
+    ]:
+        name = collection_class.__collection__
+        if name in existing:
+            if existing[name] != ("edge" if edge else "document"):
+                logging.warning(
+                    f"Collection {name} exists as {existing[name]}, expected {'edge' if edge else 'document'}."
+                )
+            continue
+        db.create_collection(name, edge=edge)
+        created += 1
+    if MIGRATIONS_COLLECTION not in existing:
+        db.create_collection(MIGRATIONS_COLLECTION)
+    if GENERATIONS_COLLECTION not in existing:
+        db.create_collection(GENERATIONS_COLLECTION)
+    return created
+
+
+def migrate_graph(graphs):
+    graph_name = MyGraphDefinition.__graph__
+    desired = desired_edge_definitions()
+    current = next((graph for graph in graphs if graph["name"] == graph_name), None)
+    if current is None:
+        db.create_graph(graph_name, edge_definitions=list(desired.values()))
+        return len(desired)
+
+    graph = db.graph(graph_name)
+    current_definitions = {
+        definition["edge_collection"]: definition
+        for definition in current["edge_definitions"]
+    }
+    changed = 0
+    for edge_collection, definition in desired.items():
+        existing = current_definitions.get(edge_collection)
+        if existing is None:
+            graph.create_edge_definition(**definition)
+            changed += 1
+        elif sorted(existing["from_vertex_collections"]) != sorted(
+            definition["from_vertex_collections"]
+        ) or sorted(existing["to_vertex_collections"]) != sorted(
+            definition["to_vertex_collections"]
+        ):
+            graph.replace_edge_definition(**definition)
+            changed += 1
+    return changed
+
+
+def index_signature(index):
+    return tuple(index["fields"]), bool(index.get("unique")), bool(index.get("sparse"))
+
+
+def migrate_indexes(new_collections):
+    created = 0
+    for collection_class, desired in indexes.items():
+        name = collection_class.__collection__
+        collection = db.collection(name)
+        # A collection created in this run has no secondary indexes yet
+        existing = (
+            set()
+            if name in new_collections
+            else {
+                index_signature(index)
+                for index in collection.indexes()
+                if index["type"] in ("persistent", "hash", "skiplist")
+            }
+        )
+        for index in desired:
+            if index_signature(index) not in existing:
+                collection.add_persistent_index(
+                    index["fields"], unique=index["unique"], sparse=index["sparse"]
+                )
+                created += 1
+    return created
+
+
+def seed_reference_data():
+    # One bulk upsert per collection; existing rows get the current names
+    for collection_name, documents in seed_documents().items():
+        db.collection(collection_name).import_bulk(
+            documents, on_duplicate="update", halt_on_error=True
+        )
 
-    # Use the create_graph method from the Database class to actually define the graph in ArangoDB.
-    # You can use ignore_collections argument if there are any collections you want to exclude.
-    daytrip.create_graph(graph_def)
+
+def schema_version(existing):
+    if MIGRATIONS_COLLECTION not in existing:
+        return 0
+    document = db.collection(MIGRATIONS_COLLECTION).get(MIGRATION_KEY)
+    return document["version"] if document else 0
+
+
+def migrate(force=False):
+    # One listing call per object type, then only the missing pieces are
+    # created; re-running on an up to date database is two requests plus
+    # the reference data upsert.
+    existing = {
+        collection["name"]: collection["type"]
+        for collection in db.collections()
+        if not collection["system"]
+    }
+    current_version = schema_version(existing)
+    if current_version >= SCHEMA_VERSION and not force:
+        # Reference data does not depend on the schema version: a new
+        # season calendar has to be seeded into an up to date database
+        seed_reference_data()
+        logging.info(f"Schema is up to date at version {current_version}.")
+        return False
+
+    created_collections = migrate_collections(existing)
+    new_collections = {cls.__collection__ for cls in collections + relations} - set(
+        existing
+    )
+    changed_edge_definitions = migrate_graph(db.graphs())
+    created_indexes = migrate_indexes(new_collections)
+    seed_reference_data()
+
+    db.collection(MIGRATIONS_COLLECTION).insert(
+        {
+            "_key": MIGRATION_KEY,
+            "version": SCHEMA_VERSION,
+            "applied_at": datetime.now(timezone.utc).isoformat(),
+        },
+        overwrite=True,
+    )
+    logging.info(
+        f"Migrated schema from version {current_version} to {SCHEMA_VERSION}: "
+        f"{created_collections} collections, {changed_edge_definitions} edge definitions "
+        f"and {created_indexes} indexes created or updated."
+    )
+    return True
+
+
+def initialize_graph():
+    # Kept for callers of the old API; the graph is part of the migration
+    return migrate_graph(db.graphs())
 
 
 def insert_test_data():
@@ -271,10 +425,40 @@ def test_customer_email_validation():
     assert re.match(email_pattern, customer.email) is not None
 
 
-initialize_vehicle_types_and_payment_methods()
-insert_test_data()
-test_customer_order_integration()
-test_customer_email_validation()
+# --- Execution --- #
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Migrate the ArangoDB schema and seed reference data."
+    )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["migrate", "test-data", "test"],
+        default="migrate",
+        help="test-data and test write to the database, never run them against production",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Diff and apply the schema even if the stored version is current",
+    )
+    parser.add_argument(
+        "--season-calendar",
+        help="JSON season calendar to seed instead of calendar years",
+    )
+    args = parser.parse_args()
 
-print("Initialization completed!")
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    if args.season_calendar:
+        load_calendar(args.season_calendar)
+    migrate(force=args.force)
+    if args.command == "test-data":
+        insert_test_data()
+    elif args.command == "test":
+        test_customer_order_integration()
+        test_customer_email_validation()
+
+    print("Initialization completed!")
@@ -23,8 +23,24 @@ from models import (
 )
 import ijson
 import csv
+from keyRegistry import intern_name, edge_key
+from projectedParser import reads
+from addressNormalization import address_index, address_key
+from seasonCalendar import season_calendar, departure_days
 
+# Where the order details sit inside a customer document
+DETAIL_PATH = "seasons.*.details.item"
 
+VEHICLE_TYPE_NAMES = {
+    "0": "sedan",
+    "1": "mpv",
+    "2": "van",
+    "3": "luxury sedan",
+    "4": "shuttle",
+}
+
+
+@reads("_id", "email", "age", "phoneNumber", "countryName")
 def extract_and_validate_customers(json_document):
     validated_customers = []
     errored_documents = []
@@ -35,7 +51,7 @@ def extract_and_validate_customers(json_document):
         email = json_document["email"]
         age = json_document.get("age")
         phone_number = json_document.get("phoneNumber")
-        country_name = json_document.get("countryName")
+        country_name = intern_name(json_document.get("countryName"))
 
         # Validate data
         try:
@@ -55,6 +71,12 @@ def extract_and_validate_customers(json_document):
         except Exception as e:
             errored_documents.append({"customer_id": customer_id, "error": str(e)})
 
+    write_customer_sample(validated_customers)
+
+    return validated_customers, errored_documents
+
+
+def write_customer_sample(validated_customers):
     # Write sample data to CSV
     with open("sample_customers.csv", "w", newline="") as csvfile:
         fieldnames = ["_key", "email", "age", "phone_number", "country_name"]
@@ -65,9 +87,8 @@ def extract_and_validate_customers(json_document):
             filtered_data = {k: customer_data[k] for k in fieldnames}
             writer.writerow(filtered_data)
 
-    return validated_customers, errored_documents
-
 
+@reads("countryData", "originCountryData", "destinationCountryData")
 def extract_and_validate_country(json_document):
     validated_countries = []
     errored_documents = []
@@ -75,8 +96,8 @@ def extract_and_validate_country(json_document):
     for country_key in ["countryData", "originCountryData", "destinationCountryData"]:
         if country_key in json_document:
             country_data = json_document[country_key]
-            country_id = country_data.get("_id")
-            country_name = country_data.get("englishName")
+            country_id = intern_name(country_data.get("_id"))
+            country_name = intern_name(country_data.get("englishName"))
 
             try:
                 if not all([country_id, country_name]):
@@ -84,6 +105,8 @@ def extract_and_validate_country(json_document):
 
                 country = Country(_key=country_id, country_name=country_name)
                 validated_countries.append(country)
+                # Resolves the country names of addresses
+                address_index.learn_country(country_id, country_name)
 
             except Exception as e:
                 errored_documents.append({"country_id": country_id, "error": str(e)})
@@ -91,6 +114,12 @@ def extract_and_validate_country(json_document):
     return validated_countries, errored_documents
 
 
+@reads(
+    f"{DETAIL_PATH}.originLocationData._id",
+    f"{DETAIL_PATH}.originLocationData.name",
+    f"{DETAIL_PATH}.destinationLocationData._id",
+    f"{DETAIL_PATH}.destinationLocationData.name",
+)
 def extract_and_validate_location(json_document):
     validated_locations = []
     errored_documents = []
@@ -106,8 +135,8 @@ def extract_and_validate_location(json_document):
                     if location_key in order:
                         location_data = order[location_key]
 
-                        location_id = location_data.get("_id")
-                        location_name = location_data.get("name")
+                        location_id = intern_name(location_data.get("_id"))
+                        location_name = intern_name(location_data.get("name"))
 
                         try:
                             if not all([location_id, location_name]):
@@ -130,6 +159,7 @@ def extract_and_validate_location(json_document):
     return validated_locations, errored_documents
 
 
+@reads("seasons.*.{}")
 def extract_and_validate_season(json_document):
     validated_seasons = []
     errored_documents = []
@@ -137,11 +167,11 @@ def extract_and_validate_season(json_document):
     if "seasons" in json_document:
         for season_key, season_data in json_document["seasons"].items():
             try:
-                season_name = season_key.split("-")[
-                    1
-                ]  # Assuming the format is "Season-YYYY"
+                season_name = intern_name(
+                    season_key.split("-")[1]
+                )  # Assuming the format is "Season-YYYY"
 
-                season = Season(_key=season_key, name=season_name)
+                season = Season(_key=intern_name(season_key), name=season_name)
                 validated_seasons.append(season)
 
             except Exception as e:
@@ -159,21 +189,16 @@ def extract_and_validate_address(location_data):
 
     address_id = address_data.get("_id")
     city = address_data.get("city")
-    country_id = address_data.get(
-        "countryId"
-    )  # Placeholder until mapped to actual country name
+    country_id = address_data.get("countryId")
 
     # Validate data
     try:
         if not all([address_id, city, country_id]):
             raise ValueError("Missing required fields for address")
 
-        # Create Address object
-        address = {
-            "_key": address_id,
-            "city": city,
-            "country_name": country_id,  # Placeholder for actual country name
-        }
+        # Keyed by the normalized address, so every upstream ID of the same
+        # physical address maps to one vertex
+        address = address_index.canonicalize(address_data)
         validated_addresses.append(address)
 
     except Exception as e:
@@ -182,6 +207,12 @@ def extract_and_validate_address(location_data):
     return validated_addresses, errored_documents
 
 
+@reads(
+    f"{DETAIL_PATH}.orderId",
+    f"{DETAIL_PATH}.totalPrice",
+    f"{DETAIL_PATH}.orderCreatedAt",
+    f"{DETAIL_PATH}.departureAt",
+)
 def extract_and_validate_order(json_document):
     validated_orders = []
     errored_documents = []
@@ -218,9 +249,21 @@ def extract_and_validate_order(json_document):
             except Exception as e:
                 errored_documents.append({"order_id": order_id, "error": str(e)})
 
+    assign_order_seasons(validated_orders)
+
     return validated_orders, errored_documents
 
 
+def assign_order_seasons(validated_orders):
+    # One calendar lookup for all orders of the document
+    season_keys = season_calendar.season_keys(
+        [order.departure_at.date() for order in validated_orders]
+    )
+    for order, season_key in zip(validated_orders, season_keys):
+        order.season = season_key
+
+
+@reads(f"{DETAIL_PATH}.paymentMethod")
 def extract_and_validate_payment_method(json_document):
     validated_methods = []
     errored_documents = []
@@ -230,7 +273,8 @@ def extract_and_validate_payment_method(json_document):
             for detail in season_data["details"]:
                 payment_method_id = detail.get("paymentMethod")
 
-                if payment_method_id:
+                # 0 is cash payment
+                if payment_method_id is not None:
                     try:
                         # Assuming the payment method id is numeric and can be mapped to a method name
                         method_name = str(
@@ -249,6 +293,7 @@ def extract_and_validate_payment_method(json_document):
     return validated_methods, errored_documents
 
 
+@reads(f"{DETAIL_PATH}.vehicles")
 def extract_and_validate_vehicle_type(json_document):
     validated_vehicles = []
     errored_documents = []
@@ -258,13 +303,7 @@ def extract_and_validate_vehicle_type(json_document):
             for detail in season_data["details"]:
                 vehicles = detail.get("vehicles", [])
                 for vehicle_id in vehicles:
-                    type_name = {
-                        "0": "sedan",
-                        "1": "mpv",
-                        "2": "van",
-                        "3": "luxury sedan",
-                        "4": "shuttle",
-                    }.get(str(vehicle_id))
+                    type_name = VEHICLE_TYPE_NAMES.get(str(vehicle_id))
 
                     if not type_name:
                         errored_documents.append(
@@ -281,6 +320,7 @@ def extract_and_validate_vehicle_type(json_document):
     return validated_vehicles, errored_documents
 
 
+@reads("_id", "vehicles")
 def extract_and_validate_uses_vehicle(
     json_document, validated_orders, validated_vehicles
 ):
@@ -310,6 +350,7 @@ def extract_and_validate_uses_vehicle(
     return validated_relations, errored_documents
 
 
+@reads("originLocationData", "destinationLocationData")
 def extract_and_validate_located_in(
     json_document, validated_locations, validated_countries
 ):
@@ -325,8 +366,12 @@ def extract_and_validate_located_in(
             if any(l._key == location_id for l in validated_locations) and any(
                 c._key == country_id for c in validated_countries
             ):
+                location_handle = f"location/{location_id}"
+                country_handle = f"country/{country_id}"
                 relation = LocatedIn(
-                    _from=f"location/{location_id}", _to=f"country/{country_id}"
+                    _key=edge_key(location_handle, country_handle),
+                    _from=location_handle,
+                    _to=country_handle,
                 )
                 validated_relations.append(relation)
             else:
@@ -341,6 +386,12 @@ def extract_and_validate_located_in(
     return validated_relations, errored_documents
 
 
+@reads(
+    f"{DETAIL_PATH}.orderId",
+    f"{DETAIL_PATH}.totalPrice",
+    f"{DETAIL_PATH}.orderCreatedAt",
+    f"{DETAIL_PATH}.departureAt",
+)
 def extract_and_validate_made_order(json_document):
     validated_orders = []
     errored_documents = []
@@ -380,6 +431,35 @@ def extract_and_validate_made_order(json_document):
     return validated_orders, errored_documents
 
 
+@reads("_id")
+def extract_and_validate_customer_made_order(
+    json_document, validated_customers, validated_orders
+):
+    validated_relations = []
+    errored_documents = []
+
+    customer_id = json_document.get("_id")
+    if not any(c._key == customer_id for c in validated_customers):
+        for order in validated_orders:
+            errored_documents.append(
+                {
+                    "customer_id": customer_id,
+                    "order_id": order._key,
+                    "error": "Entities not validated",
+                }
+            )
+        return validated_relations, errored_documents
+
+    for order in validated_orders:
+        relation = MadeOrder(_from=f"customer/{customer_id}", _to=f"order/{order._key}")
+        validated_relations.append(relation)
+
+    return validated_relations, errored_documents
+
+
+@reads(
+    f"{DETAIL_PATH}.orderId", "originLocationData._id", "destinationLocationData._id"
+)
 def extract_and_validate_visited(json_document, validated_orders):
     validated_relations = []
     errored_documents = []
@@ -415,6 +495,9 @@ def extract_and_validate_visited(json_document, validated_orders):
     return validated_relations, errored_documents
 
 
+@reads(
+    f"{DETAIL_PATH}.orderId", "originLocationData._id", "destinationLocationData._id"
+)
 def extract_and_validate_depart_from_and_arrive_at(json_document, validated_orders):
     validated_depart_relations = []
     validated_arrive_relations = []
@@ -435,7 +518,8 @@ def extract_and_validate_depart_from_and_arrive_at(json_document, validated_orde
                     o._key == order_id for o in validated_orders
                 ):
                     relation = DepartFrom(
-                        _from=f"order/{order_id}", _to=f"address/{origin_address_id}"
+                        _from=f"order/{order_id}",
+                        _to=f"address/{address_index.resolve(origin_address_id)}",
                     )
                     validated_depart_relations.append(relation)
                 else:
@@ -452,7 +536,7 @@ def extract_and_validate_depart_from_and_arrive_at(json_document, validated_orde
                 ):
                     relation = ArriveAt(
                         _from=f"order/{order_id}",
-                        _to=f"address/{destination_address_id}",
+                        _to=f"address/{address_index.resolve(destination_address_id)}",
                     )
                     validated_arrive_relations.append(relation)
                 else:
@@ -467,6 +551,7 @@ def extract_and_validate_depart_from_and_arrive_at(json_document, validated_orde
     return validated_depart_relations, validated_arrive_relations, errored_documents
 
 
+@reads("paymentMethod", f"{DETAIL_PATH}.orderId")
 def extract_and_validate_payment_by(json_document, validated_orders, validated_methods):
     validated_relations = []
     errored_documents = []
@@ -497,6 +582,31 @@ def extract_and_validate_payment_by(json_document, validated_orders, validated_m
     return validated_relations, errored_documents
 
 
+@reads()
+def extract_and_validate_order_in_season(json_document, validated_orders):
+    # Season membership comes from the calendar season the order extractor
+    # assigned to each departure, not from the seasons dict key
+    validated_relations = []
+    errored_documents = []
+
+    for order in validated_orders:
+        if order.season:
+            relation = OrderInSeason(
+                _from=f"order/{order._key}", _to=f"season/{order.season}"
+            )
+            validated_relations.append(relation)
+        else:
+            errored_documents.append(
+                {
+                    "order_id": order._key,
+                    "error": "Departure outside the season calendar",
+                }
+            )
+
+    return validated_relations, errored_documents
+
+
+@reads("_id", "countryName")
 def extract_and_validate_originated_from(
     json_document, validated_customers, validated_countries
 ):
@@ -509,8 +619,12 @@ def extract_and_validate_originated_from(
     if any(c._key == customer_id for c in validated_customers) and any(
         c.country_name == country_name for c in validated_countries
     ):
+        customer_handle = f"customer/{customer_id}"
+        country_handle = f"country/{country_name}"
         relation = OriginatedFrom(
-            _from=f"customer/{customer_id}", _to=f"country/{country_name}"
+            _key=edge_key(customer_handle, country_handle),
+            _from=customer_handle,
+            _to=country_handle,
         )
         validated_relations.append(relation)
     else:
@@ -525,6 +639,7 @@ def extract_and_validate_originated_from(
     return validated_relations, errored_documents
 
 
+@reads("_id", "originLocationData._id", "destinationLocationData._id")
 def extract_and_validate_order_from_location(
     json_document, validated_orders, validated_locations
 ):
@@ -556,6 +671,7 @@ def extract_and_validate_order_from_location(
     return validated_relations, errored_documents
 
 
+@reads("_id", "customerId")
 def extract_and_validate_order_by_customer(
     json_document, validated_orders, validated_customers
 ):
@@ -588,69 +704,180 @@ def extract_and_validate_order_by_customer(
     return validated_relations, errored_documents
 
 
-def extract_and_validate_originated_from(
-    json_document, validated_customers, validated_countries
-):
-    validated_relations = []
+@reads(
+    f"{DETAIL_PATH}.originLocationData.address",
+    f"{DETAIL_PATH}.destinationLocationData.address",
+)
+def extract_and_validate_addresses(json_document):
+    validated_addresses = []
     errored_documents = []
 
+    # Addresses are nested in the origin/destination location data of each order
+    for _, season_data in json_document.get("seasons", {}).items():
+        for detail in season_data.get("details", []):
+            for location_key in ["originLocationData", "destinationLocationData"]:
+                if location_key in detail:
+                    addresses, errors = extract_and_validate_address(
+                        detail[location_key]
+                    )
+                    validated_addresses.extend(addresses)
+                    errored_documents.extend(errors)
+
+    return validated_addresses, errored_documents
+
+
+# Extractors that only read customer-level fields; continuation slices of
+# an oversized document skip them, its header already produced their output
+HEADER_EXTRACTORS = {
+    extract_and_validate_customers,
+    extract_and_validate_country,
+    extract_and_validate_season,
+}
+
+
+@reads(
+    "_id",
+    "countryData._id",
+    f"{DETAIL_PATH}.orderId",
+    f"{DETAIL_PATH}.departureAt",
+    f"{DETAIL_PATH}.vehicles",
+    f"{DETAIL_PATH}.paymentMethod",
+    f"{DETAIL_PATH}.originLocationData._id",
+    f"{DETAIL_PATH}.originLocationData.countryId",
+    f"{DETAIL_PATH}.originLocationData.address",
+    f"{DETAIL_PATH}.destinationLocationData._id",
+    f"{DETAIL_PATH}.destinationLocationData.countryId",
+    f"{DETAIL_PATH}.destinationLocationData.address",
+)
+def extract_edge_candidates(json_document):
+    # Every edge implied by the document, without checking its endpoints
+    # against vertices of the same document. Used by the two-phase import,
+    # which checks endpoints against the keys of the whole input instead.
     customer_id = json_document.get("_id")
-    country_name = json_document.get("countryName")
+    country_id = json_document.get("countryData", {}).get("_id")
+
+    if customer_id and country_id:
+        customer_handle = f"customer/{customer_id}"
+        country_handle = f"country/{country_id}"
+        yield OriginatedFrom, {
+            "_key": edge_key(customer_handle, country_handle),
+            "_from": customer_handle,
+            "_to": country_handle,
+        }
 
-    if any(c._key == customer_id for c in validated_customers) and any(
-        c.country_name == country_name for c in validated_countries
-    ):
-        relation = OriginatedFrom(
-            _from=f"customer/{customer_id}", _to=f"country/{country_name}"
-        )
-        validated_relations.append(relation)
-    else:
-        errored_documents.append(
-            {
-                "customer_id": customer_id,
-                "country_name": country_name,
-                "error": "Entities not validated",
+    details = [
+        detail
+        for _, season_data in json_document.get("seasons", {}).items()
+        for detail in season_data.get("details", [])
+    ]
+    # Calendar seasons of the whole document in one lookup
+    season_keys = season_calendar.season_keys(
+        departure_days(detail.get("departureAt") for detail in details)
+    )
+    for detail, season_key in zip(details, season_keys):
+        order_id = detail.get("orderId")
+        if not order_id:
+            continue
+        order_handle = f"order/{order_id}"
+
+        if season_key:
+            yield OrderInSeason, {"_from": order_handle, "_to": f"season/{season_key}"}
+
+        if customer_id:
+            yield MadeOrder, {
+                "_from": f"customer/{customer_id}",
+                "_to": order_handle,
+            }
+            yield OrderByCustomer, {
+                "_from": order_handle,
+                "_to": f"customer/{customer_id}",
+                "type": "lead_customer",
             }
-        )
 
-    return validated_relations, errored_documents
+        for vehicle_id in detail.get("vehicles", []):
+            yield UsesVehicle, {
+                "_from": order_handle,
+                "_to": f"vehicle_type/{vehicle_id}",
+            }
 
+        payment_method_id = detail.get("paymentMethod")
+        if payment_method_id is not None:
+            yield PaymentBy, {
+                "_from": order_handle,
+                "_to": f"payment_method/{payment_method_id}",
+            }
 
-# Use ijson.items to extract individual items (i.e., JSON objects) from the file
-json_documents = ijson.items(
-    open("./../../../data/customersOrdersSeasonsAll.json", "r"), "item"
-)
-# Extend the main loop
-for json_document in json_documents:
-    validated_customers, _ = extract_and_validate_customers(json_document)
-    validated_countries, _ = extract_and_validate_country(json_document)
-    validated_locations, _ = extract_and_validate_location(json_document)
-    validated_seasons, _ = extract_and_validate_season(json_document)
-    extract_and_validate_address(
-        json_document["destinationLocationData"]
-        if "destinationLocationData" in json_document
-        else json_document["originLocationData"]
-        if "originLocationData" in json_document
-        else {}
-    )
-    validated_orders, _ = extract_and_validate_order(json_document)
-    validated_payment_methods, _ = extract_and_validate_payment_method(json_document)
-    validated_vehicles, _ = extract_and_validate_vehicle_type(json_document)
-    extract_and_validate_uses_vehicle(
-        json_document, validated_orders, validated_vehicles
-    )
-    extract_and_validate_made_order(json_document)
-    extract_and_validate_visited(json_document, validated_orders)
-    extract_and_validate_depart_from_and_arrive_at(json_document, validated_orders)
-    extract_and_validate_payment_by(
-        json_document, validated_orders, validated_payment_methods
-    )
-    extract_and_validate_order_from_location(
-        json_document, validated_orders, validated_locations
-    )
-    extract_and_validate_order_by_customer(
-        json_document, validated_orders, validated_customers
-    )
-    extract_and_validate_originated_from(
-        json_document, validated_customers, validated_countries
+        for location_key, type_, address_model in [
+            ("originLocationData", "originated", DepartFrom),
+            ("destinationLocationData", "destined", ArriveAt),
+        ]:
+            location_data = detail.get(location_key)
+            if not location_data:
+                continue
+            location_id = location_data.get("_id")
+            if location_id:
+                location_handle = f"location/{location_id}"
+                yield Visited, {"_from": order_handle, "_to": location_handle}
+                yield OrderFromLocation, {
+                    "_from": order_handle,
+                    "_to": location_handle,
+                    "type": type_,
+                }
+                if location_data.get("countryId"):
+                    country_handle = f"country/{location_data['countryId']}"
+                    yield LocatedIn, {
+                        "_key": edge_key(location_handle, country_handle),
+                        "_from": location_handle,
+                        "_to": country_handle,
+                    }
+            address_data = location_data.get("address", {})
+            if address_data.get("_id"):
+                yield address_model, {
+                    "_from": order_handle,
+                    "_to": f"address/{address_key(address_data)}",
+                }
+
+
+if __name__ == "__main__":
+    # Use ijson.items to extract individual items (i.e., JSON objects) from the file
+    json_documents = ijson.items(
+        open("./../../../data/customersOrdersSeasonsAll.json", "r"), "item"
     )
+    # Extend the main loop
+    for json_document in json_documents:
+        validated_customers, _ = extract_and_validate_customers(json_document)
+        validated_countries, _ = extract_and_validate_country(json_document)
+        validated_locations, _ = extract_and_validate_location(json_document)
+        validated_seasons, _ = extract_and_validate_season(json_document)
+        extract_and_validate_address(
+            json_document["destinationLocationData"]
+            if "destinationLocationData" in json_document
+            else (
+                json_document["originLocationData"]
+                if "originLocationData" in json_document
+                else {}
+            )
+        )
+        validated_orders, _ = extract_and_validate_order(json_document)
+        validated_payment_methods, _ = extract_and_validate_payment_method(
+            json_document
+        )
+        validated_vehicles, _ = extract_and_validate_vehicle_type(json_document)
+        extract_and_validate_uses_vehicle(
+            json_document, validated_orders, validated_vehicles
+        )
+        extract_and_validate_made_order(json_document)
+        extract_and_validate_visited(json_document, validated_orders)
+        extract_and_validate_depart_from_and_arrive_at(json_document, validated_orders)
+        extract_and_validate_payment_by(
+            json_document, validated_orders, validated_payment_methods
+        )
+        extract_and_validate_order_from_location(
+            json_document, validated_orders, validated_locations
+        )
+        extract_and_validate_order_by_customer(
+            json_document, validated_orders, validated_customers
+        )
+        extract_and_validate_originated_from(
+            json_document, validated_customers, validated_countries
+        )
@@ -0,0 +1,285 @@
+import os
+import sys
+import math
+import hashlib
+import logging
+import tempfile
+import numpy as np
+
+# --- Defaults --- #
+
+# Collections whose keyspace is large enough to warrant a compact key set
+HIGH_CARDINALITY_COLLECTIONS = ("order", "customer")
+# How high-cardinality keys are held: "compact" (sorted 64-bit hashes),
+# "bloom" (Bloom filter) or "exact" (plain set of strings)
+KEY_SET_MODES = ("compact", "bloom", "exact")
+BLOOM_EXPECTED_KEYS = 10_000_000
+BLOOM_FALSE_POSITIVE_RATE = 0.001
+# Exact sets beyond this size are reported, as they dominate importer memory
+MAX_EXACT_KEYS = 5_000_000
+# New hashes are collected in a small set and merged into the sorted array
+# once it reaches this size
+PENDING_LIMIT = 65_536
+# Sorted hashes kept in memory before a run is spilled to disk (8 bytes each)
+MEMORY_LIMIT_KEYS = 50_000_000
+
+
+def intern_name(value):
+    # Country, location and season names repeat across millions of orders;
+    # interning keeps a single copy of each.
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def _key_hashes(key):
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+def key_hash(key):
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def edge_key(from_handle, to_handle):
+    # Edges implied over and over (a location's country, a customer's
+    # country) get the same key every time, so repeats collapse into one
+    # document and are counted as duplicates by the writer.
+    return hashlib.blake2b(
+        f"{from_handle}|{to_handle}".encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+class BloomFilter:
+    def __init__(
+        self,
+        expected_keys=BLOOM_EXPECTED_KEYS,
+        false_positive_rate=BLOOM_FALSE_POSITIVE_RATE,
+    ):
+        expected_keys = max(expected_keys, 1)
+        self.size = max(
+            8,
+            int(-expected_keys * math.log(false_positive_rate) / (math.log(2) ** 2)),
+        )
+        self.hash_count = max(1, round(self.size / expected_keys * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher double hashing: k positions from two hashes
+        first, second = _key_hashes(key)
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        return len(self.bits)
+
+
+class CompactKeySet:
+    # Keys stored as 64-bit hashes in sorted NumPy arrays: 8 bytes per key
+    # instead of a Python str, with O(log n) membership via searchsorted.
+    # Two distinct keys share a hash with probability ~n^2 / 2^65, which is
+    # negligible for tens of millions of keys.
+    def __init__(
+        self,
+        pending_limit=PENDING_LIMIT,
+        memory_limit_keys=MEMORY_LIMIT_KEYS,
+        spill_dir=None,
+    ):
+        self.pending_limit = pending_limit
+        self.memory_limit_keys = memory_limit_keys
+        self.spill_dir = spill_dir
+        self.pending = set()
+        self.sorted_hashes = np.empty(0, dtype=np.uint64)
+        # Sorted runs spilled to disk, opened as read-only memory maps
+        self.runs = []
+        self.run_paths = []
+        self.count = 0
+
+    def _contains_hash(self, hashed):
+        if hashed in self.pending:
+            return True
+        value = np.uint64(hashed)
+        for array in [self.sorted_hashes] + self.runs:
+            index = np.searchsorted(array, value)
+            if index < len(array) and array[index] == value:
+                return True
+        return False
+
+    def _merge_pending(self):
+        if not self.pending:
+            return
+        pending = np.fromiter(self.pending, dtype=np.uint64, count=len(self.pending))
+        pending.sort()
+        # A linear merge of two sorted arrays, not a re-sort of everything
+        self.sorted_hashes = np.insert(
+            self.sorted_hashes,
+            np.searchsorted(self.sorted_hashes, pending),
+            pending,
+        )
+        self.pending = set()
+        if self.spill_dir is not None and len(self.sorted_hashes) >= (
+            self.memory_limit_keys
+        ):
+            self._spill()
+
+    def _spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        handle, path = tempfile.mkstemp(
+            prefix="keys-", suffix=".npy", dir=self.spill_dir
+        )
+        os.close(handle)
+        np.save(path, self.sorted_hashes)
+        self.runs.append(np.load(path, mmap_mode="r"))
+        self.run_paths.append(path)
+        self.sorted_hashes = np.empty(0, dtype=np.uint64)
+        logging.info(f"Spilled {len(self.runs[-1])} keys to {path}.")
+
+    def add(self, key):
+        hashed = key_hash(key)
+        if self._contains_hash(hashed):
+            return False
+        self.pending.add(hashed)
+        self.count += 1
+        # Letting the pending set grow with the array keeps merging amortized
+        if len(self.pending) >= max(self.pending_limit, len(self.sorted_hashes) >> 4):
+            self._merge_pending()
+        return True
+
+    def __contains__(self, key):
+        return self._contains_hash(key_hash(key))
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        return self.sorted_hashes.nbytes + len(self.pending) * 8
+
+    def close(self):
+        self.runs = []
+        for path in self.run_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.run_paths = []
+
+
+class GlobalKeySets:
+    # Keys of every vertex written during phase one of a two-phase import,
+    # per collection, so edges can be checked against the whole input.
+    def __init__(
+        self,
+        high_cardinality_collections=HIGH_CARDINALITY_COLLECTIONS,
+        mode="compact",
+        expected_keys=BLOOM_EXPECTED_KEYS,
+        false_positive_rate=BLOOM_FALSE_POSITIVE_RATE,
+        max_exact_keys=MAX_EXACT_KEYS,
+        spill_dir=None,
+    ):
+        if mode not in KEY_SET_MODES:
+            raise ValueError(f"Unknown key set mode: {mode}")
+        self.high_cardinality_collections = set(high_cardinality_collections or ())
+        self.mode = mode
+        self.expected_keys = expected_keys
+        self.false_positive_rate = false_positive_rate
+        self.max_exact_keys = max_exact_keys
+        self.spill_dir = spill_dir
+        self.key_sets = {}
+        self.warned = set()
+        # Keys a Bloom filter reported as already registered, per collection
+        self.bloom_repeats = {}
+
+    def _key_set(self, collection_name):
+        key_set = self.key_sets.get(collection_name)
+        if key_set is None:
+            mode = (
+                self.mode
+                if collection_name in self.high_cardinality_collections
+                else "exact"
+            )
+            if mode == "bloom":
+                key_set = BloomFilter(self.expected_keys, self.false_positive_rate)
+            elif mode == "compact":
+                key_set = CompactKeySet(spill_dir=self.spill_dir)
+            else:
+                key_set = set()
+            self.key_sets[collection_name] = key_set
+        return key_set
+
+    def add(self, collection_name, key):
+        # Returns False when the key was already registered. Bloom filters
+        # cannot tell a repeat from a false positive, so a key they report is
+        # dropped either way: about false_positive_rate of new keys are lost.
+        key_set = self._key_set(collection_name)
+        key = str(key)
+        if isinstance(key_set, BloomFilter):
+            if key in key_set:
+                self.bloom_repeats[collection_name] = (
+                    self.bloom_repeats.get(collection_name, 0) + 1
+                )
+                if collection_name not in self.warned:
+                    self.warned.add(collection_name)
+                    logging.warning(
+                        f"Bloom key set for {collection_name} drops keys it reports as registered, about {self.false_positive_rate:.2%} of new keys are dropped as false positives."
+                    )
+                return False
+            key_set.add(key)
+            return True
+        if isinstance(key_set, CompactKeySet):
+            return key_set.add(key)
+        if key in key_set:
+            return False
+        key_set.add(intern_name(key))
+        if len(key_set) > self.max_exact_keys and collection_name not in self.warned:
+            self.warned.add(collection_name)
+            logging.warning(
+                f"Exact key set for {collection_name} exceeds {self.max_exact_keys} keys, consider a compact key set for it."
+            )
+        return True
+
+    def contains(self, collection_name, key):
+        key_set = self.key_sets.get(collection_name)
+        return key_set is not None and str(key) in key_set
+
+    def contains_id(self, document_id):
+        # Document handles look like "order/123"
+        collection_name, _, key = document_id.partition("/")
+        return self.contains(collection_name, key)
+
+    def close(self):
+        for key_set in self.key_sets.values():
+            if isinstance(key_set, CompactKeySet):
+                key_set.close()
+
+    def summary(self):
+        return {
+            collection_name: {
+                "keys": len(key_set),
+                "kind": type(key_set).__name__,
+                "bloom_repeats": self.bloom_repeats.get(collection_name, 0),
+                "bytes": (
+                    key_set.nbytes()
+                    if hasattr(key_set, "nbytes")
+                    else sys.getsizeof(key_set)
+                ),
+            }
+            for collection_name, key_set in self.key_sets.items()
+        }
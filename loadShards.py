@@ -0,0 +1,180 @@
+import os
+import json
+import logging
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from shardWriter import MANIFEST_NAME
+from arangoConnection import DATABASE_NAME, USERNAME, PASSWORD, HOST, parse_hosts
+from queryCache import GenerationCounters
+
+# --- Setup & Configuration --- #
+
+ARANGOIMPORT = os.getenv("ARANGOIMPORT", "arangoimport")
+PARALLEL_SHARDS = 4
+# arangoimport's own request threads per shard
+IMPORT_THREADS = 2
+
+
+def server_endpoint(host):
+    # arangoimport wants tcp/ssl endpoints, the drivers take http(s) URLs
+    if host.startswith("https://"):
+        return "ssl://" + host[len("https://") :]
+    if host.startswith("http://"):
+        return "tcp://" + host[len("http://") :]
+    return host
+
+
+def write_credentials():
+    # The password goes to arangoimport in a configuration file only the
+    # current user can read (mkstemp creates it 0600), not on the command
+    # line where any local user sees it in the process list
+    handle, path = tempfile.mkstemp(prefix="arangoimport-", suffix=".conf")
+    with os.fdopen(handle, "w", encoding="utf-8") as file:
+        file.write(f"[server]\npassword = {PASSWORD or ''}\n")
+    return path
+
+
+def import_command(
+    shard_path,
+    collection_name,
+    collection_type,
+    on_duplicate,
+    credentials_path,
+    host_index=0,
+):
+    # arangoimport talks to one endpoint, shards are spread over coordinators
+    hosts = parse_hosts(HOST or "")
+    return [
+        ARANGOIMPORT,
+        "--configuration",
+        credentials_path,
+        "--server.endpoint",
+        server_endpoint(hosts[host_index % len(hosts)]),
+        "--server.database",
+        DATABASE_NAME,
+        "--server.username",
+        USERNAME,
+        "--file",
+        shard_path,
+        "--type",
+        "jsonl",
+        "--collection",
+        collection_name,
+        "--create-collection",
+        "true",
+        "--create-collection-type",
+        collection_type,
+        "--on-duplicate",
+        on_duplicate,
+        "--threads",
+        str(IMPORT_THREADS),
+    ]
+
+
+def load_shard(
+    shard_path,
+    collection_name,
+    collection_type,
+    on_duplicate,
+    credentials_path,
+    host_index=0,
+):
+    command = import_command(
+        shard_path,
+        collection_name,
+        collection_type,
+        on_duplicate,
+        credentials_path,
+        host_index,
+    )
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        logging.error(
+            "Error loading %s into %s: %s",
+            shard_path,
+            collection_name,
+            completed.stderr.strip() or completed.stdout.strip(),
+        )
+        return False
+    logging.info(f"Loaded {shard_path} into {collection_name}.")
+    return True
+
+
+def load_shards(shard_dir, parallel=PARALLEL_SHARDS, on_duplicate="error"):
+    with open(os.path.join(shard_dir, MANIFEST_NAME)) as file:
+        manifest = json.load(file)
+    collections = manifest["collections"]
+
+    # All vertex shards load in parallel, then all edge shards, so no edge is
+    # loaded before the vertices it points at.
+    stages = [
+        [
+            name
+            for name in manifest["load_order"]
+            if collections[name]["type"] != "edge"
+        ],
+        [
+            name
+            for name in manifest["load_order"]
+            if collections[name]["type"] == "edge"
+        ],
+    ]
+    failed_count = 0
+    credentials_path = write_credentials()
+    try:
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            for stage in stages:
+                futures = [
+                    executor.submit(
+                        load_shard,
+                        os.path.join(shard_dir, shard["file"]),
+                        collection_name,
+                        collections[collection_name]["type"],
+                        on_duplicate,
+                        credentials_path,
+                        host_index,
+                    )
+                    for host_index, (collection_name, shard) in enumerate(
+                        (collection_name, shard)
+                        for collection_name in stage
+                        for shard in collections[collection_name]["shards"]
+                    )
+                ]
+                failed_count += sum(not future.result() for future in futures)
+    finally:
+        os.remove(credentials_path)
+
+    # Cached dashboard queries on the loaded collections are stale now
+    try:
+        GenerationCounters().bump(list(collections))
+    except Exception as e:
+        logging.warning("Error bumping cache generations: %s", str(e))
+
+    total_rows = sum(collection["rows"] for collection in collections.values())
+    logging.info(
+        f"Finished loading {total_rows} rows from {shard_dir}. Failed shards: {failed_count}."
+    )
+    return failed_count
+
+
+# --- Execution --- #
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="Load importer JSONL shards into ArangoDB with arangoimport."
+    )
+    parser.add_argument("shard_dir", help="Directory containing manifest.json")
+    parser.add_argument("--parallel", type=int, default=PARALLEL_SHARDS)
+    parser.add_argument(
+        "--on-duplicate",
+        choices=["error", "ignore", "replace", "update"],
+        default="error",
+    )
+    args = parser.parse_args()
+    failed_count = load_shards(args.shard_dir, args.parallel, args.on_duplicate)
+    raise SystemExit(1 if failed_count else 0)
@@ -0,0 +1,379 @@
+import gzip
+import json
+import logging
+import argparse
+from array import array
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from jsonExtractPrep import DETAIL_PATH
+from projectedParser import reads, projected_items, projection_for, OVERSIZED_DETAILS
+
+# --- Defaults --- #
+
+TOP_K = 20
+# Upper bound on stored entries of one block of the product, 12 bytes each
+MAX_BLOCK_NONZEROS = 50_000_000
+CO_VISITATION_PATH = "location_covisitation.npz"
+ROUTE_SEPARATOR = ">"
+SIMILARITIES = ("count", "cosine")
+# Export of (customer, origin, destination) per order for exportArango.py:
+#   python exportArango.py --query "$(python locationCoVisitation.py --print-query)"
+#       --output order_pairs.ndjson.gz
+PAIR_QUERY = """
+FOR o IN order
+    LET customer = FIRST(FOR c IN OUTBOUND o order_by_customer RETURN c._key)
+    LET origin = FIRST(
+        FOR l, e IN OUTBOUND o order_from_location
+            FILTER e.type == "originated" RETURN l._key
+    )
+    LET destination = FIRST(
+        FOR l, e IN OUTBOUND o order_from_location
+            FILTER e.type == "destined" RETURN l._key
+    )
+    RETURN {
+        customer_id: customer,
+        origin_location_id: origin,
+        destination_location_id: destination
+    }
+"""
+
+
+# --- Visit Pairs --- #
+
+
+class VisitPairBuilder:
+    # Streams (customer, origin, destination) per order into int32 code
+    # arrays, 12 bytes per order; IDs are held once each in the code maps.
+    def __init__(self):
+        self.customer_codes = {}
+        self.location_codes = {}
+        self.customers = array("i")
+        self.origins = array("i")
+        self.destinations = array("i")
+
+    @staticmethod
+    def _code(codes, value):
+        if value is None:
+            return -1
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def add_order(self, customer_id, origin_id, destination_id):
+        if customer_id is None or (origin_id is None and destination_id is None):
+            return
+        self.customers.append(self._code(self.customer_codes, customer_id))
+        self.origins.append(self._code(self.location_codes, origin_id))
+        self.destinations.append(self._code(self.location_codes, destination_id))
+
+    @reads(
+        "_id",
+        f"{DETAIL_PATH}.originLocationData._id",
+        f"{DETAIL_PATH}.destinationLocationData._id",
+    )
+    def add_document(self, json_document):
+        # The origin/destination pairs the order_from_location edges are
+        # built from
+        customer_id = json_document.get("_id")
+        for _, season_data in json_document.get("seasons", {}).items():
+            for detail in season_data.get("details", []):
+                self.add_order(
+                    customer_id,
+                    (detail.get("originLocationData") or {}).get("_id"),
+                    (detail.get("destinationLocationData") or {}).get("_id"),
+                )
+
+    def __len__(self):
+        return len(self.customers)
+
+    def location_labels(self):
+        return np.array(list(self.location_codes), dtype=object)
+
+    def arrays(self):
+        # Views on the code arrays; no orders can be added while they live
+        return (
+            np.frombuffer(self.customers, dtype=np.int32),
+            np.frombuffer(self.origins, dtype=np.int32),
+            np.frombuffer(self.destinations, dtype=np.int32),
+        )
+
+
+PAIR_PROJECTION = projection_for([VisitPairBuilder.add_document])
+
+
+def pairs_from_json(json_file_path):
+    builder = VisitPairBuilder()
+    with open(json_file_path, "rb") as file:
+        for json_document in projected_items(
+            file, PAIR_PROJECTION, max_details=OVERSIZED_DETAILS
+        ):
+            builder.add_document(json_document)
+    return builder
+
+
+def pairs_from_export(export_path):
+    # NDJSON (optionally gzipped) or Parquet rows of PAIR_QUERY
+    builder = VisitPairBuilder()
+    if export_path.endswith(".parquet"):
+        pairs = pd.read_parquet(
+            export_path,
+            columns=["customer_id", "origin_location_id", "destination_location_id"],
+        )
+        for row in pairs.itertuples(index=False):
+            builder.add_order(*(None if pd.isna(value) else value for value in row))
+        return builder
+    opener = gzip.open if export_path.endswith(".gz") else open
+    with opener(export_path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            builder.add_order(
+                row.get("customer_id"),
+                row.get("origin_location_id"),
+                row.get("destination_location_id"),
+            )
+    return builder
+
+
+# --- Sparse Matrices --- #
+
+
+def _binary_matrix(rows, columns, shape):
+    # Repeat visits count once: the product then counts shared customers
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=shape
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def location_matrix(builder):
+    # customer x location, 1 where the customer departed from or arrived at
+    # the location
+    customers, origins, destinations = builder.arrays()
+    rows = np.concatenate([customers, customers])
+    columns = np.concatenate([origins, destinations])
+    known = columns >= 0
+    matrix = _binary_matrix(
+        rows[known],
+        columns[known],
+        (len(builder.customer_codes), len(builder.location_codes)),
+    )
+    return matrix, builder.location_labels()
+
+
+def route_matrix(builder):
+    # customer x route, a route being an ordered (origin, destination) pair
+    customers, origins, destinations = builder.arrays()
+    known = (origins >= 0) & (destinations >= 0)
+    route_ids = origins[known].astype(np.int64) * len(builder.location_codes) + (
+        destinations[known]
+    )
+    routes, route_codes = np.unique(route_ids, return_inverse=True)
+    matrix = _binary_matrix(
+        customers[known],
+        route_codes,
+        (len(builder.customer_codes), len(routes)),
+    )
+    location_labels = builder.location_labels()
+    origin_labels = location_labels[routes // len(builder.location_codes)]
+    destination_labels = location_labels[routes % len(builder.location_codes)]
+    labels = np.array(
+        [
+            f"{origin}{ROUTE_SEPARATOR}{destination}"
+            for origin, destination in zip(origin_labels, destination_labels)
+        ],
+        dtype=object,
+    )
+    return matrix, labels
+
+
+# --- Co-Visitation --- #
+
+
+def _row_blocks(item_by_customer, customer_degrees, max_block_nonzeros):
+    # Rows of the product are computed in blocks whose summed upper bound on
+    # stored entries (customers x their items, per row) stays in budget
+    bounds = item_by_customer @ customer_degrees
+    start = 0
+    total = 0
+    for row, bound in enumerate(bounds):
+        if total + bound > max_block_nonzeros and row > start:
+            yield start, row
+            start = row
+            total = 0
+        total += bound
+    if start < len(bounds):
+        yield start, len(bounds)
+
+
+def co_visitation_top_k(
+    customer_by_item,
+    top_k=TOP_K,
+    similarity="count",
+    max_block_nonzeros=MAX_BLOCK_NONZEROS,
+):
+    # Item-item co-visitation C^T C, computed one row block at a time and
+    # cut to the top_k neighbours per item. Scores are the number of
+    # customers who visited both items, or that count over the geometric
+    # mean of the two items' customer counts for "cosine".
+    if similarity not in SIMILARITIES:
+        raise ValueError(f"Unknown similarity: {similarity}")
+    customer_by_item = customer_by_item.tocsr()
+    item_by_customer = customer_by_item.T.tocsr()
+    support = np.diff(item_by_customer.indptr).astype(np.int32)
+    customer_degrees = np.diff(customer_by_item.indptr).astype(np.int64)
+    norms = np.sqrt(np.maximum(support, 1).astype(np.float64))
+
+    indptr = [0]
+    neighbours = []
+    scores = []
+    for start, stop in _row_blocks(
+        item_by_customer, customer_degrees, max_block_nonzeros
+    ):
+        block = (item_by_customer[start:stop] @ customer_by_item).tocsr()
+        for offset in range(stop - start):
+            item = start + offset
+            row_start, row_stop = block.indptr[offset], block.indptr[offset + 1]
+            columns = block.indices[row_start:row_stop]
+            values = block.data[row_start:row_stop].astype(np.float64)
+            others = columns != item
+            columns = columns[others]
+            values = values[others]
+            if similarity == "cosine":
+                values = values / (norms[item] * norms[columns])
+            if len(values) > top_k:
+                kept = np.argpartition(-values, top_k)[:top_k]
+                columns = columns[kept]
+                values = values[kept]
+            order = np.lexsort((columns, -values))
+            neighbours.append(columns[order].astype(np.int32))
+            scores.append(values[order].astype(np.float32))
+            indptr.append(indptr[-1] + len(order))
+        logging.info(
+            f"Co-visitation rows {start}-{stop} of {item_by_customer.shape[0]} done."
+        )
+
+    return {
+        "indptr": np.array(indptr, dtype=np.int64),
+        "neighbours": (
+            np.concatenate(neighbours) if neighbours else np.empty(0, np.int32)
+        ),
+        "scores": np.concatenate(scores) if scores else np.empty(0, np.float32),
+        "support": support,
+    }
+
+
+def build_co_visitation(
+    builder,
+    kind="location",
+    top_k=TOP_K,
+    similarity="count",
+    max_block_nonzeros=MAX_BLOCK_NONZEROS,
+):
+    if kind == "route":
+        matrix, labels = route_matrix(builder)
+    else:
+        matrix, labels = location_matrix(builder)
+    logging.info(
+        f"Built a {matrix.shape[0]} x {matrix.shape[1]} customer-{kind} matrix with {matrix.nnz} visits from {len(builder)} orders."
+    )
+    result = co_visitation_top_k(matrix, top_k, similarity, max_block_nonzeros)
+    result["labels"] = labels
+    result["kind"] = kind
+    result["similarity"] = similarity
+    return result
+
+
+# --- Storage --- #
+
+
+def save_co_visitation(result, path=CO_VISITATION_PATH):
+    # CSR layout: neighbours of item i are neighbours[indptr[i]:indptr[i+1]]
+    np.savez_compressed(
+        path,
+        labels=result["labels"].astype(str),
+        indptr=result["indptr"],
+        neighbours=result["neighbours"],
+        scores=result["scores"],
+        support=result["support"],
+        kind=np.array(result["kind"]),
+        similarity=np.array(result["similarity"]),
+    )
+    logging.info(
+        f"Saved top neighbours of {len(result['labels'])} {result['kind']}s to {path}."
+    )
+
+
+class CoVisitationIndex:
+    def __init__(self, path=CO_VISITATION_PATH):
+        with np.load(path) as data:
+            self.labels = data["labels"]
+            self.indptr = data["indptr"]
+            self.neighbour_codes = data["neighbours"]
+            self.scores = data["scores"]
+            self.support = data["support"]
+            self.kind = str(data["kind"])
+            self.similarity = str(data["similarity"])
+        self.codes = {label: code for code, label in enumerate(self.labels)}
+
+    def neighbours(self, label):
+        # [(neighbour label, score)], best first
+        code = self.codes.get(label)
+        if code is None:
+            return []
+        start, stop = self.indptr[code], self.indptr[code + 1]
+        return [
+            (self.labels[neighbour], float(score))
+            for neighbour, score in zip(
+                self.neighbour_codes[start:stop], self.scores[start:stop]
+            )
+        ]
+
+
+# --- Execution --- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build top-K location or route co-visitation neighbours."
+    )
+    parser.add_argument(
+        "source",
+        nargs="?",
+        default="./../../../data/customersOrdersSeasonsAll.json",
+        help="JSON export of customers, or an NDJSON/Parquet export of PAIR_QUERY",
+    )
+    parser.add_argument("--kind", choices=["location", "route"], default="location")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--similarity", choices=SIMILARITIES, default="count")
+    parser.add_argument("--max-block-nonzeros", type=int, default=MAX_BLOCK_NONZEROS)
+    parser.add_argument("--output", default=CO_VISITATION_PATH)
+    parser.add_argument(
+        "--print-query",
+        action="store_true",
+        help="Print the AQL export query for the pairs and exit",
+    )
+    args = parser.parse_args()
+    if args.print_query:
+        print(PAIR_QUERY.strip())
+        raise SystemExit(0)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    if args.source.endswith(".json"):
+        pair_builder = pairs_from_json(args.source)
+    else:
+        pair_builder = pairs_from_export(args.source)
+    co_visitation = build_co_visitation(
+        pair_builder,
+        args.kind,
+        args.top_k,
+        args.similarity,
+        args.max_block_nonzeros,
+    )
+    save_co_visitation(co_visitation, args.output)
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import logging
+import resource
+import tracemalloc
+import contextlib
+
+# --- Defaults --- #
+
+MEMORY_REPORT = "data_import_memory.json"
+MEMORY_SNAPSHOT_EVERY = 1000
+# Allocation sites and files listed per snapshot
+TOP_SITES = 15
+# Stack depth kept per allocation; 1 is cheapest, more shows the callers
+TRACE_FRAMES = 1
+# Allocations by the profiler and import machinery are not reported
+IGNORED_FILES = [tracemalloc.__file__, __file__, "<frozen importlib._bootstrap>"]
+MEGABYTE = 1024 * 1024
+
+
+def current_rss():
+    # Resident set size in bytes, None where /proc is not available
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _site(traceback):
+    frame = traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+class MemoryProfiler:
+    # Opt-in memory profile of an import. Every snapshot_every documents a
+    # tracemalloc snapshot records RSS, traced memory, the top allocation
+    # sites and files, and the growth per site since the previous snapshot.
+    # Stages record RSS and traced peaks around each import phase. The report
+    # is rewritten after every snapshot, so it survives an OOM kill.
+    def __init__(
+        self,
+        path=MEMORY_REPORT,
+        snapshot_every=MEMORY_SNAPSHOT_EVERY,
+        top_sites=TOP_SITES,
+        trace_frames=TRACE_FRAMES,
+    ):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.top_sites = top_sites
+        self.filters = [
+            tracemalloc.Filter(False, filename) for filename in IGNORED_FILES
+        ]
+        self.stages = []
+        self.current_stage = None
+        self.snapshots = []
+        self.previous_snapshot = None
+        self.next_snapshot_at = snapshot_every
+        self.started_at = time.monotonic()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(trace_frames)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # Document counts restart with every stage
+        self.current_stage = name
+        self.next_snapshot_at = self.snapshot_every
+        tracemalloc.reset_peak()
+        rss_before = current_rss()
+        traced_before, _ = tracemalloc.get_traced_memory()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            traced_after, traced_peak = tracemalloc.get_traced_memory()
+            stage = {
+                "stage": name,
+                "seconds": round(time.monotonic() - start, 3),
+                "rss_before_bytes": rss_before,
+                "rss_after_bytes": current_rss(),
+                "peak_rss_bytes": peak_rss(),
+                "traced_before_bytes": traced_before,
+                "traced_after_bytes": traced_after,
+                "traced_peak_bytes": traced_peak,
+            }
+            self.stages.append(stage)
+            logging.info(
+                f"Memory in stage {name}: traced peak {traced_peak / MEGABYTE:.1f} MB, process peak {stage['peak_rss_bytes'] / MEGABYTE:.1f} MB."
+            )
+            self.write_report()
+
+    def tick(self, document_count):
+        if document_count >= self.next_snapshot_at:
+            self.next_snapshot_at = document_count + self.snapshot_every
+            self.take_snapshot(document_count)
+
+    def take_snapshot(self, document_count):
+        snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        record = {
+            "stage": self.current_stage,
+            "documents": document_count,
+            "seconds": round(time.monotonic() - self.started_at, 3),
+            "rss_bytes": current_rss(),
+            "peak_rss_bytes": peak_rss(),
+            "traced_bytes": traced,
+            "traced_peak_bytes": traced_peak,
+            "top_sites": [
+                {
+                    "site": _site(stat.traceback),
+                    "size_bytes": stat.size,
+                    "count": stat.count,
+                }
+                for stat in snapshot.statistics("lineno")[: self.top_sites]
+            ],
+            "top_files": [
+                {
+                    "file": stat.traceback[0].filename,
+                    "size_bytes": stat.size,
+                    "count": stat.count,
+                }
+                for stat in snapshot.statistics("filename")[: self.top_sites]
+            ],
+        }
+        if self.previous_snapshot is not None:
+            record["top_growth"] = [
+                {
+                    "site": _site(stat.traceback),
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size_bytes": stat.size,
+                }
+                for stat in snapshot.compare_to(self.previous_snapshot, "lineno")[
+                    : self.top_sites
+                ]
+            ]
+        # Only the latest snapshot is kept, older ones live in the report
+        self.previous_snapshot = snapshot
+        self.snapshots.append(record)
+        logging.info(
+            f"Memory at {document_count} documents: RSS {(record['rss_bytes'] or 0) / MEGABYTE:.1f} MB, traced {traced / MEGABYTE:.1f} MB."
+        )
+        self.write_report()
+
+    def write_report(self):
+        report = {
+            "snapshot_every": self.snapshot_every,
+            "peak_rss_bytes": peak_rss(),
+            "traced_peak_bytes": max(
+                [stage["traced_peak_bytes"] for stage in self.stages]
+                + [snapshot["traced_peak_bytes"] for snapshot in self.snapshots]
+                + [0]
+            ),
+            "stages": self.stages,
+            "snapshots": self.snapshots,
+        }
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        os.replace(temporary_path, self.path)
+
+    def close(self):
+        self.write_report()
+        self.previous_snapshot = None
+        tracemalloc.stop()
+        logging.info(f"Saved memory profile to {self.path}.")
+
+
+def profile_stage(profiler, name):
+    # Stage context that does nothing when profiling is off
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
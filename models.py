@@ -53,6 +53,8 @@ class Order(Collection):
     total_price = Float(allow_none=True)
     order_created_at = Date(allow_none=True)
     departure_at = Date(allow_none=True)
+    # Key of the calendar season of departure_at
+    season = String(allow_none=True)
 
 
 class PaymentMethod(Collection):
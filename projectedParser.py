@@ -0,0 +1,367 @@
+import os
+import pickle
+import logging
+import tempfile
+import ijson
+
+# --- Projection Paths --- #
+
+# Marks a subtree that is kept whole
+KEEP = True
+# Matches any map key, e.g. the season names under "seasons"
+ANY_KEY = "*"
+# Matches every element of an array, as in ijson prefixes
+ARRAY_ITEM = "item"
+# Documents with more order details than this are streamed in slices
+OVERSIZED_DETAILS = 5000
+# Order details per continuation slice of an oversized document
+SLICE_DETAILS = 1000
+# Marks a continuation slice; holds the slice number
+SLICE_KEY = "_slice"
+# Document-level fields the per-order extractors read, repeated in every
+# continuation slice
+SLICE_CONTEXT_KEYS = (
+    "_id",
+    "customerId",
+    "paymentMethod",
+    "vehicles",
+    "originLocationData",
+    "destinationLocationData",
+)
+# Path suffix that keeps a map's keys but none of their values beyond what
+# other paths select, e.g. "seasons.*.{}" for the season names
+KEYS_ONLY = "{}"
+
+
+def reads(*paths):
+    # Declares the document paths an extractor reads, in dotted form relative
+    # to the document ("seasons.*.details.item.orderId"). A path keeps its
+    # whole subtree.
+    def decorate(extractor):
+        extractor.json_paths = paths
+        return extractor
+
+    return decorate
+
+
+def projection_paths(extractors):
+    paths = set()
+    for extractor in extractors:
+        if not hasattr(extractor, "json_paths"):
+            raise ValueError(f"{extractor.__name__} does not declare its JSON paths")
+        paths.update(extractor.json_paths)
+    return paths
+
+
+def build_projection(paths):
+    # Nested dict of the kept keys; a shorter path wins over a longer one
+    tree = {}
+    for path in sorted(paths, key=lambda path: path.count(".")):
+        node = tree
+        parts = path.split(".")
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is KEEP:
+                break
+            node = child
+        else:
+            if parts[-1] != KEYS_ONLY:
+                node[parts[-1]] = KEEP
+    return tree
+
+
+def projection_for(extractors):
+    return build_projection(projection_paths(extractors))
+
+
+# --- Event Builder --- #
+
+
+DEPTH_CHANGE = {"start_map": 1, "start_array": 1, "end_map": -1, "end_array": -1}
+
+
+def _skip(events, event):
+    # Consumes one value without building it; one dict lookup per event is
+    # the cheapest way through a large discarded subtree
+    if event != "start_map" and event != "start_array":
+        return
+    depth = 1
+    depth_change = DEPTH_CHANGE.get
+    for event, _ in events:
+        depth += depth_change(event, 0)
+        if depth == 0:
+            return
+
+
+def _child(node, key):
+    if node is KEEP:
+        return KEEP
+    return node.get(key) or node.get(ANY_KEY)
+
+
+def _build(events, event, value, node):
+    if event == "start_map":
+        result = {}
+        for event, key in events:
+            if event == "end_map":
+                return result
+            child = _child(node, key)
+            event, value = next(events)
+            if child is None:
+                _skip(events, event)
+            else:
+                result[key] = _build(events, event, value, child)
+    if event == "start_array":
+        result = []
+        child = KEEP if node is KEEP else node.get(ARRAY_ITEM)
+        for event, value in events:
+            if event == "end_array":
+                return result
+            if child is None:
+                _skip(events, event)
+            else:
+                result.append(_build(events, event, value, child))
+    return value
+
+
+# --- Oversized Documents --- #
+
+
+def is_slice(json_document):
+    return SLICE_KEY in json_document
+
+
+class DetailSpill:
+    # Order details of one oversized document, pickled to a temporary file in
+    # input order so that types (Decimal, None) survive the round trip.
+    def __init__(self, spill_dir=None):
+        handle, self.path = tempfile.mkstemp(
+            prefix="details-", suffix=".pickle", dir=spill_dir
+        )
+        self.file = os.fdopen(handle, "wb")
+        self.count = 0
+
+    def write(self, season_key, detail):
+        pickle.dump((season_key, detail), self.file, pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def absorb(self, seasons):
+        # Moves the details buffered before the document turned out oversized
+        for season_key, season_data in seasons.items():
+            details = (
+                season_data.get("details") if isinstance(season_data, dict) else None
+            )
+            if details:
+                for detail in details:
+                    self.write(season_key, detail)
+                details.clear()
+
+    def slices(self, context, slice_details):
+        self.file.close()
+        try:
+            with open(self.path, "rb") as file:
+                chunk_season = None
+                chunk = []
+                slice_number = 0
+                for _ in range(self.count):
+                    season_key, detail = pickle.load(file)
+                    if chunk and (
+                        season_key != chunk_season or len(chunk) >= slice_details
+                    ):
+                        slice_number += 1
+                        yield dict(
+                            context,
+                            **{SLICE_KEY: slice_number},
+                            seasons={chunk_season: {"details": chunk}},
+                        )
+                        chunk = []
+                    chunk_season = season_key
+                    chunk.append(detail)
+                if chunk:
+                    slice_number += 1
+                    yield dict(
+                        context,
+                        **{SLICE_KEY: slice_number},
+                        seasons={chunk_season: {"details": chunk}},
+                    )
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DocumentStreamer:
+    # Builds one projected document at a time. Once a document has more
+    # than max_details order details, the rest of its seasons.*.details
+    # items go to a DetailSpill instead of memory, and the document is
+    # yielded as a header (every field, empty details) followed by
+    # continuation slices of at most slice_details details each.
+    def __init__(
+        self,
+        projection,
+        max_details=OVERSIZED_DETAILS,
+        slice_details=SLICE_DETAILS,
+        spill_dir=None,
+    ):
+        self.projection = projection
+        self.max_details = max_details
+        self.slice_details = slice_details
+        self.spill_dir = spill_dir
+        self.detail_count = 0
+        self.spill = None
+
+    def _details(self, events, node, season_key, seasons, details):
+        item_node = KEEP if node is KEEP else node.get(ARRAY_ITEM)
+        for event, value in events:
+            if event == "end_array":
+                return
+            if item_node is None:
+                _skip(events, event)
+                continue
+            detail = _build(events, event, value, item_node)
+            if self.spill is not None:
+                self.spill.write(season_key, detail)
+                continue
+            details.append(detail)
+            self.detail_count += 1
+            if self.detail_count > self.max_details:
+                self.spill = DetailSpill(self.spill_dir)
+                self.spill.absorb(seasons)
+
+    def _seasons(self, events, node):
+        seasons = {}
+        for event, season_key in events:
+            if event == "end_map":
+                return seasons
+            season_node = _child(node, season_key)
+            event, value = next(events)
+            if season_node is None:
+                _skip(events, event)
+                continue
+            if event != "start_map":
+                seasons[season_key] = _build(events, event, value, season_node)
+                continue
+            seasons[season_key] = season_data = {}
+            for event, field in events:
+                if event == "end_map":
+                    break
+                field_node = _child(season_node, field)
+                event, value = next(events)
+                if field_node is None:
+                    _skip(events, event)
+                elif field == "details" and event == "start_array":
+                    season_data[field] = []
+                    self._details(
+                        events, field_node, season_key, seasons, season_data[field]
+                    )
+                else:
+                    season_data[field] = _build(events, event, value, field_node)
+        return seasons
+
+    def document_parts(self, events, event, value):
+        if event != "start_map":
+            yield _build(events, event, value, self.projection)
+            return
+        self.detail_count = 0
+        self.spill = None
+        document = {}
+        try:
+            for event, key in events:
+                if event == "end_map":
+                    break
+                child = _child(self.projection, key)
+                event, value = next(events)
+                if child is None:
+                    _skip(events, event)
+                elif key == "seasons" and event == "start_map":
+                    document[key] = self._seasons(events, child)
+                else:
+                    document[key] = _build(events, event, value, child)
+        except BaseException:
+            if self.spill is not None:
+                self.spill.close()
+            raise
+
+        if self.spill is None:
+            yield document
+            return
+        logging.info(
+            f"Streaming oversized document {document.get('_id')} with {self.spill.count} order details in slices."
+        )
+        spill, self.spill = self.spill, None
+        try:
+            yield document
+            context = {
+                key: document[key] for key in SLICE_CONTEXT_KEYS if key in document
+            }
+            yield from spill.slices(context, self.slice_details)
+        finally:
+            spill.close()
+
+
+class PositionReader:
+    # Binary file wrapper that remembers where the parser's last read began.
+    # ijson's C backend parses a whole read buffer before yielding its
+    # events, so a document's first event always comes from the buffer that
+    # starts at or before the document's first byte.
+    def __init__(self, file):
+        self.file = file
+        try:
+            self.offset = file.tell()
+        except (AttributeError, OSError):
+            # Not a seekable file, offsets count from where reading starts
+            self.offset = 0
+        self.buffer_start = self.offset
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.buffer_start = self.offset
+        self.offset += len(data)
+        return data
+
+
+def projected_items(
+    file,
+    projection,
+    max_details=None,
+    slice_details=SLICE_DETAILS,
+    spill_dir=None,
+    positions=False,
+    **parse_kwargs,
+):
+    # Drop-in for ijson.items(file, "item") over a top-level array of
+    # documents, but only keys in the projection are built; everything else
+    # is consumed from the event stream and discarded. With max_details set,
+    # oversized documents come out as a header and continuation slices. With
+    # positions, (item index, read-buffer offset, document) tuples are
+    # yielded instead, slices sharing their document's index and offset.
+    if positions:
+        file = PositionReader(file)
+    events = iter(ijson.basic_parse(file, **parse_kwargs))
+    for event, _ in events:
+        if event != "start_array":
+            raise ValueError("Expected a JSON array of documents")
+        break
+    streamer = None
+    if max_details is not None:
+        streamer = DocumentStreamer(projection, max_details, slice_details, spill_dir)
+    item_index = -1
+    for event, value in events:
+        if event == "end_array":
+            return
+        item_index += 1
+        # Read before the document is built, later reads move it on
+        byte_offset = file.buffer_start if positions else None
+        if streamer is None:
+            parts = [_build(events, event, value, projection)]
+        else:
+            parts = streamer.document_parts(events, event, value)
+        if not positions:
+            yield from parts
+            continue
+        for part in parts:
+            yield item_index, byte_offset, part
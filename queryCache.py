@@ -0,0 +1,345 @@
+import os
+import re
+import json
+import time
+import hashlib
+import functools
+import logging
+import threading
+from collections import OrderedDict
+from arangoConnection import get_db
+from seasonCalendar import SEASON_ORDERS_QUERY
+
+# --- Defaults --- #
+
+CACHE_MAX_ENTRIES = 1024
+# Seconds an entry is served without asking the database, as long as the
+# collections it reads have not been written since
+CACHE_TTL = 300.0
+GENERATIONS_COLLECTION = "cache_generations"
+# Seconds between reads of the stored generations; bounds how long a write
+# by another process goes unnoticed
+GENERATION_REFRESH_INTERVAL = 1.0
+# Seconds between generation bumps of one collection while an import
+# flushes to it; the last flush is always bumped when the import closes
+GENERATION_BUMP_INTERVAL = 1.0
+# Quoted strings are kept as they are, whitespace between tokens collapses
+AQL_TOKEN_PATTERN = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|\s+")
+# Collections an AQL query reads: FOR ... IN name, and the edge collections
+# of traversals (OUTBOUND start edge_collection)
+AQL_COLLECTION_PATTERNS = [
+    re.compile(r"\bIN\s+([A-Za-z_][\w-]*)", re.IGNORECASE),
+    re.compile(
+        r"\b(?:OUTBOUND|INBOUND|ANY)\s+[^\s]+\s+([A-Za-z_][\w-]*(?:\s*,\s*[A-Za-z_][\w-]*)*)",
+        re.IGNORECASE,
+    ),
+]
+AQL_KEYWORDS = {"OUTBOUND", "INBOUND", "ANY", "GRAPH"}
+
+# --- Dashboard Queries --- #
+
+CUSTOMER_BY_EMAIL_QUERY = """
+FOR c IN customer
+    FILTER c.email == @email
+    RETURN c
+"""
+TOP_LOCATIONS_QUERY = """
+FOR v IN visited
+    COLLECT location = v._to WITH COUNT INTO visits
+    SORT visits DESC
+    LIMIT @limit
+    RETURN {location: location, visits: visits}
+"""
+
+
+# --- Keys --- #
+
+
+@functools.lru_cache(maxsize=CACHE_MAX_ENTRIES)
+def normalize_aql(query):
+    return AQL_TOKEN_PATTERN.sub(
+        lambda match: match.group(1) or " ", query.strip()
+    ).strip()
+
+
+@functools.lru_cache(maxsize=CACHE_MAX_ENTRIES)
+def _named_collections(query):
+    names = set()
+    for pattern in AQL_COLLECTION_PATTERNS:
+        for match in pattern.findall(query):
+            names.update(
+                name.strip()
+                for name in match.split(",")
+                if name.strip().upper() not in AQL_KEYWORDS
+            )
+    return tuple(sorted(names))
+
+
+def query_collections(query, bind_vars=None):
+    # Best-effort list of the collections a query reads; @@name bind
+    # variables name collections too
+    names = _named_collections(query)
+    collection_vars = [
+        value for name, value in (bind_vars or {}).items() if name.startswith("@")
+    ]
+    if collection_vars:
+        names = tuple(sorted(set(names) | set(collection_vars)))
+    return names
+
+
+def cache_key(query, bind_vars=None):
+    text = json.dumps(
+        [normalize_aql(query), bind_vars or {}], sort_keys=True, default=str
+    )
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# --- Generations --- #
+
+
+class GenerationCounters:
+    # A counter per collection, stored in GENERATIONS_COLLECTION so every
+    # process sees the bumps of an import. Readers re-read the counters at
+    # most every refresh_interval seconds; bumps made in this process are
+    # seen at once.
+    def __init__(self, db=None, refresh_interval=GENERATION_REFRESH_INTERVAL):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.generations = {}
+        self.refreshed_at = None
+        self.lock = threading.Lock()
+
+    def _db(self):
+        if self.db is None:
+            self.db = get_db()
+        return self.db
+
+    def refresh(self):
+        try:
+            rows = self._db().aql.execute(
+                "FOR g IN @@collection RETURN [g._key, g.generation]",
+                bind_vars={"@collection": GENERATIONS_COLLECTION},
+            )
+            generations = {name: generation for name, generation in rows}
+        except Exception as e:
+            # Without counters entries still expire by their TTL
+            logging.warning("Error reading cache generations: %s", str(e))
+            generations = self.generations
+        with self.lock:
+            for name, generation in generations.items():
+                self.generations[name] = max(generation, self.generations.get(name, 0))
+            self.refreshed_at = time.monotonic()
+
+    def current(self, collection_names):
+        if (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at >= self.refresh_interval
+        ):
+            self.refresh()
+        return tuple(self.generations.get(name, 0) for name in collection_names)
+
+    def bump(self, collection_names):
+        collection_names = sorted(set(collection_names))
+        if not collection_names:
+            return
+        with self.lock:
+            for name in collection_names:
+                self.generations[name] = self.generations.get(name, 0) + 1
+        self._db().aql.execute(
+            """
+            FOR name IN @names
+                UPSERT {_key: name}
+                INSERT {_key: name, generation: 1}
+                UPDATE {generation: OLD.generation + 1}
+                IN @@collection
+            """,
+            bind_vars={
+                "names": collection_names,
+                "@collection": GENERATIONS_COLLECTION,
+            },
+        )
+
+
+class GenerationBumper:
+    # Flush listener for BulkWriter: bumps the generation of a collection
+    # after a flush wrote to it, at most every bump_interval seconds per
+    # collection, and whatever is still pending on close.
+    def __init__(self, counters, bump_interval=GENERATION_BUMP_INTERVAL):
+        self.counters = counters
+        self.bump_interval = bump_interval
+        self.bumped_at = {}
+        self.pending = set()
+        self.bump_count = 0
+
+    def __call__(self, collection_name, created_count):
+        if not created_count:
+            return
+        self.pending.add(collection_name)
+        now = time.monotonic()
+        if now - self.bumped_at.get(collection_name, float("-inf")) >= (
+            self.bump_interval
+        ):
+            self._bump([collection_name], now)
+
+    def _bump(self, collection_names, now):
+        try:
+            self.counters.bump(collection_names)
+        except Exception as e:
+            # A stale dashboard is better than a failed import
+            logging.warning("Error bumping cache generations: %s", str(e))
+            return
+        for name in collection_names:
+            self.bumped_at[name] = now
+            self.pending.discard(name)
+        self.bump_count += 1
+
+    def close(self):
+        if self.pending:
+            self._bump(sorted(self.pending), time.monotonic())
+
+
+# --- Cache --- #
+
+
+class QueryCache:
+    # Read-through cache of AQL results, keyed by the normalized query and
+    # its bind variables. An in-process LRU answers repeated queries without
+    # a request; an optional directory keeps entries across processes and
+    # restarts. An entry is served while it is younger than its TTL and the
+    # generations of the collections it reads are the ones it was stored
+    # with. Results are shared between callers and must not be modified.
+    def __init__(
+        self,
+        db=None,
+        max_entries=CACHE_MAX_ENTRIES,
+        ttl=CACHE_TTL,
+        disk_dir=None,
+        generations=None,
+    ):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.generations = generations or GenerationCounters(db)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _db(self):
+        if self.db is None:
+            self.db = get_db()
+        return self.db
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        # Monotonic clocks do not carry over between processes
+        return (
+            time.monotonic() + entry["expires_at"] - time.time(),
+            tuple(entry["generations"]),
+            entry["result"],
+        )
+
+    def _write_disk(self, key, entry):
+        expires_at, generations, result = entry
+        temporary_path = f"{self._disk_path(key)}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump(
+                    {
+                        "expires_at": time.time() + expires_at - time.monotonic(),
+                        "generations": list(generations),
+                        "result": result,
+                    },
+                    file,
+                    default=str,
+                )
+            os.replace(temporary_path, self._disk_path(key))
+        except OSError as e:
+            logging.warning("Error writing cache entry %s: %s", key, str(e))
+
+    def _store(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def query(self, query, bind_vars=None, collections=None, ttl=None):
+        key = cache_key(query, bind_vars)
+        if collections is None:
+            collections = query_collections(query, bind_vars)
+        generations = self.generations.current(collections)
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now and entry[1] == generations:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+
+        if self.disk_dir is not None:
+            entry = self._read_disk(key)
+            if entry is not None and entry[0] > now and entry[1] == generations:
+                self._store(key, entry)
+                self.disk_hits += 1
+                return entry[2]
+
+        self.misses += 1
+        result = list(self._db().aql.execute(query, bind_vars=bind_vars or {}))
+        entry = (now + (self.ttl if ttl is None else ttl), generations, result)
+        self._store(key, entry)
+        if self.disk_dir is not None:
+            self._write_disk(key, entry)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def log_summary(self):
+        stats = self.stats()
+        logging.info(
+            f"Query cache: {stats['hits']} hits, {stats['disk_hits']} disk hits, {stats['misses']} misses, {stats['entries']} entries."
+        )
+
+
+# --- Dashboard Helpers --- #
+
+
+def customer_by_email(cache, email):
+    return cache.query(CUSTOMER_BY_EMAIL_QUERY, {"email": email})
+
+
+def orders_in_season(cache, season, departure_from, departure_to):
+    return cache.query(
+        SEASON_ORDERS_QUERY,
+        {
+            "season": season,
+            "departure_from": departure_from,
+            "departure_to": departure_to,
+        },
+    )
+
+
+def top_locations(cache, limit=10):
+    return cache.query(TOP_LOCATIONS_QUERY, {"limit": limit})
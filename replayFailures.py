@@ -0,0 +1,204 @@
+import logging
+import argparse
+from arangoConnection import daytrip  # connects lazily on first use
+from bulkWriter import BulkWriter, WriteAborted, to_document
+from failureLog import FailureLog, FAILURE_LOG, read_failures, documents_from_source
+from importJson import (
+    extract_entity_groups,
+    extract_vertex_groups,
+    edge_extractor,
+    seeded_handles,
+    IMPORT_PROJECTION,
+    DEFAULT_VALIDATION_ENGINE,
+)
+from keyRegistry import GlobalKeySets
+from projectedParser import OVERSIZED_DETAILS
+from addressNormalization import address_index
+from seasonCalendar import load_calendar
+from models import Address
+
+# --- Defaults --- #
+
+REMAINING_LOG = "data_import_failures_remaining.jsonl"
+REPLAY_QUARANTINE = "data_import_replay_quarantine.jsonl"
+
+
+def _rejected_count(writer):
+    return sum(writer.errors.values()) + sum(writer.quarantined.values())
+
+
+def _endpoint_exists(key_sets, document_id):
+    # Vertices replayed in this run are in the key sets; the rest were
+    # written by the import that recorded the failure, if at all
+    if key_sets.contains_id(document_id):
+        return True
+    collection_name, _, key = document_id.partition("/")
+    if daytrip.collection(collection_name).has(key):
+        key_sets.add(collection_name, key)
+        return True
+    return False
+
+
+def replay_groups(
+    json_document, stage, key_sets, dangling_counts, validation_engine, known_handles
+):
+    # The entities the importer would have written for the document at the
+    # stage it failed in: vertices or edges of a two-phase import, or
+    # everything for a single-pass one
+    if stage == "vertices":
+        return list(extract_vertex_groups(json_document, validation_engine).items())
+    if stage == "edges":
+        edge_groups = []
+        for model, edge in edge_extractor(validation_engine)(json_document):
+            if _endpoint_exists(key_sets, edge["_from"]) and _endpoint_exists(
+                key_sets, edge["_to"]
+            ):
+                edge_groups.append((model, [edge]))
+            else:
+                dangling_counts[model.__collection__] = (
+                    dangling_counts.get(model.__collection__, 0) + 1
+                )
+        return edge_groups
+    return extract_entity_groups(json_document, validation_engine, known_handles)
+
+
+def replay_failures(
+    failure_log_path=FAILURE_LOG,
+    source_path=None,
+    remaining_path=REMAINING_LOG,
+    on_duplicate="update",
+    quarantine_path=REPLAY_QUARANTINE,
+    season_calendar_path=None,
+    validation_engine=DEFAULT_VALIDATION_ENGINE,
+):
+    # Pushes only the recorded documents through extraction and writing.
+    # With a source file each document is re-read from the input at its
+    # recorded offset, so fixes to the data take effect; otherwise, or when
+    # it cannot be located, the compact copy from the failure log is used.
+    # The calendar and engine should be those of the failed import.
+    if season_calendar_path:
+        load_calendar(season_calendar_path)
+    failures = read_failures(failure_log_path)
+    writer = BulkWriter(
+        daytrip, on_duplicate=on_duplicate, quarantine_path=quarantine_path
+    )
+    remaining = FailureLog(remaining_path)
+    source = open(source_path, "rb") if source_path else None
+    key_sets = GlobalKeySets(mode="exact")
+    known_handles = seeded_handles()
+    dangling_counts = {}
+    succeeded_count = 0
+    try:
+        for failure in failures:
+            documents = None
+            if source is not None:
+                documents = documents_from_source(
+                    source, failure, IMPORT_PROJECTION, OVERSIZED_DETAILS
+                )
+                if documents is None:
+                    logging.warning(
+                        "Item %d not found near offset %s, replaying its saved copy",
+                        failure["item_index"],
+                        failure["byte_offset"],
+                    )
+            if documents is None:
+                documents = [failure["document"]]
+
+            rejected_before = _rejected_count(writer)
+            written_keys = []
+            try:
+                for json_document in documents:
+                    for model, entities in replay_groups(
+                        json_document,
+                        failure["stage"],
+                        key_sets,
+                        dangling_counts,
+                        validation_engine,
+                        known_handles,
+                    ):
+                        for entity in entities:
+                            # Named from the countries the replay has seen
+                            if model is Address:
+                                entity = address_index.named(entity)
+                            writer.add(model.__collection__, entity)
+                            if failure["stage"] == "vertices":
+                                written_keys.append(
+                                    (model.__collection__, to_document(entity)["_key"])
+                                )
+                # Flushed per document so rejected writes are attributed to it
+                writer.flush_all()
+                if _rejected_count(writer) > rejected_before:
+                    raise ValueError("Some entities were rejected by the database")
+                # Edges replayed later may point at these vertices
+                for collection_name, key in written_keys:
+                    key_sets.add(collection_name, key)
+            except WriteAborted:
+                raise
+            except Exception as e:
+                logging.error("Item %d still fails: %s", failure["item_index"], str(e))
+                for json_document in documents:
+                    remaining.record(
+                        failure["item_index"],
+                        failure["byte_offset"],
+                        json_document,
+                        str(e),
+                        failure["stage"],
+                    )
+                continue
+            succeeded_count += 1
+            logging.info(f"Item {failure['item_index']} now imports.")
+    finally:
+        if source is not None:
+            source.close()
+        writer.close()
+        remaining.close()
+        key_sets.close()
+
+    logging.info(
+        f"Replayed {len(failures)} failed documents: {succeeded_count} succeeded, {len(failures) - succeeded_count} still fail."
+    )
+    for collection_name, dangling_count in sorted(dangling_counts.items()):
+        logging.info(
+            f"Replay: rejected {dangling_count} {collection_name} edges with unknown endpoints."
+        )
+    writer.log_summary()
+    return succeeded_count, len(failures) - succeeded_count
+
+
+# --- Execution --- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Re-import only the documents recorded in a failure log."
+    )
+    parser.add_argument("failure_log", nargs="?", default=FAILURE_LOG)
+    parser.add_argument(
+        "--source",
+        help="Original export; failed documents are re-read from it by offset",
+    )
+    parser.add_argument("--remaining", default=REMAINING_LOG)
+    parser.add_argument(
+        "--on-duplicate",
+        choices=["error", "ignore", "replace", "update"],
+        default="update",
+    )
+    parser.add_argument(
+        "--season-calendar",
+        help="Season calendar of the failed import, see seasonCalendar.py",
+    )
+    parser.add_argument(
+        "--validation-engine",
+        choices=["document", "frame", "compiled"],
+        default=DEFAULT_VALIDATION_ENGINE,
+        help="Engine of the failed import; frame failures replay per document",
+    )
+    args = parser.parse_args()
+    _, failed_count = replay_failures(
+        args.failure_log,
+        args.source,
+        args.remaining,
+        args.on_duplicate,
+        season_calendar_path=args.season_calendar,
+        validation_engine=args.validation_engine,
+    )
+    raise SystemExit(1 if failed_count else 0)
@@ -0,0 +1,109 @@
+import json
+import logging
+import datetime
+import numpy as np
+from keyRegistry import intern_name
+
+# --- Defaults --- #
+
+# Seasons are calendar years of departure unless a calendar file is loaded;
+# keys follow the "Season-YYYY" keys of the export
+SEASON_KEY_FORMAT = "Season-{year}"
+FIRST_SEASON_YEAR = 2010
+LAST_SEASON_YEAR = 2040
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# Orders of one season in a departure range, served by the persistent
+# (season, departure_at) index on order
+SEASON_ORDERS_QUERY = """
+FOR o IN order
+    FILTER o.season == @season
+        AND o.departure_at >= @departure_from
+        AND o.departure_at < @departure_to
+    SORT o.season, o.departure_at
+    RETURN o
+"""
+
+
+# --- Calendar --- #
+
+
+def yearly_seasons(first_year=FIRST_SEASON_YEAR, last_year=LAST_SEASON_YEAR):
+    return [
+        {
+            "key": SEASON_KEY_FORMAT.format(year=year),
+            "name": str(year),
+            "start": f"{year:04d}-01-01",
+            "end": f"{year + 1:04d}-01-01",
+        }
+        for year in range(first_year, last_year + 1)
+    ]
+
+
+class SeasonCalendar:
+    # Seasons as sorted, non-overlapping [start, end) day ranges. Departure
+    # days are assigned in bulk: one searchsorted over the start days finds
+    # the last season starting on or before each day, and the end days drop
+    # the days that fall into a gap between seasons.
+    def __init__(self, seasons=None):
+        self.set_seasons(yearly_seasons() if seasons is None else seasons)
+
+    def set_seasons(self, seasons):
+        seasons = sorted(seasons, key=lambda season: season["start"])
+        self.keys = np.array(
+            [intern_name(season["key"]) for season in seasons] + [None], dtype=object
+        )
+        self.names = [
+            season.get("name") or season["key"].split("-")[-1] for season in seasons
+        ]
+        self.starts = np.array(
+            [season["start"] for season in seasons], dtype="datetime64[D]"
+        )
+        self.ends = np.array(
+            [season["end"] for season in seasons], dtype="datetime64[D]"
+        )
+        if np.any(self.ends <= self.starts) or np.any(self.starts[1:] < self.ends[:-1]):
+            raise ValueError("Season ranges must be non-empty and must not overlap")
+
+    def assign(self, departure_days):
+        # Season index per departure day, -1 outside every season or for NaT
+        days = np.asarray(departure_days, dtype="datetime64[D]")
+        codes = np.searchsorted(self.starts, days, side="right") - 1
+        inside = (codes >= 0) & (days < self.ends[np.maximum(codes, 0)])
+        return np.where(inside, codes, -1)
+
+    def season_keys(self, departure_days):
+        # Season key per departure day, None where no season covers it; the
+        # trailing None of self.keys is what index -1 picks
+        if len(self.starts) == 0:
+            return np.full(len(departure_days), None, dtype=object)
+        return self.keys[self.assign(departure_days)]
+
+    def seasons(self):
+        return [
+            {"_key": key, "name": name} for key, name in zip(self.keys[:-1], self.names)
+        ]
+
+
+def departure_days(values):
+    # Day of each departureAt string as the order extractor parses it, NaT
+    # where it does not parse
+    days = []
+    for value in values:
+        try:
+            days.append(datetime.datetime.strptime(value, DATE_FORMAT).date())
+        except Exception:
+            days.append(None)
+    return np.array(days, dtype="datetime64[D]")
+
+
+def load_calendar(path):
+    # A JSON list of {"key", "start", "end"[, "name"]} with ISO dates
+    with open(path, "r", encoding="utf-8") as file:
+        seasons = json.load(file)
+    season_calendar.set_seasons(seasons)
+    logging.info(f"Loaded {len(seasons)} seasons from {path}.")
+    return season_calendar
+
+
+# Shared by the extractors, the frame engine and the migration seed
+season_calendar = SeasonCalendar()
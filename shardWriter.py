@@ -0,0 +1,133 @@
+import os
+import json
+import gzip
+import logging
+from bulkWriter import to_document
+
+# --- Defaults --- #
+
+MAX_SHARD_BYTES = 256 * 1024 * 1024
+MANIFEST_NAME = "manifest.json"
+
+
+class ShardWriter:
+    # Offline stand-in for BulkWriter: instead of sending batches to the
+    # database it appends each document to size-capped, per-collection JSONL
+    # shards that arangoimport can load directly. With key sets, a document
+    # whose _key was already written is dropped, as the database's unique
+    # index would have rejected it.
+    def __init__(
+        self,
+        output_dir,
+        max_shard_bytes=MAX_SHARD_BYTES,
+        compress=False,
+        key_sets=None,
+    ):
+        self.output_dir = output_dir
+        self.max_shard_bytes = max_shard_bytes
+        self.compress = compress
+        self.key_sets = key_sets
+        self.files = {}
+        self.shards = {}
+        self.edge_collections = set()
+        self.created = {}
+        self.errors = {}
+        self.duplicates = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _open_shard(self, collection_name):
+        shards = self.shards.setdefault(collection_name, [])
+        extension = ".jsonl.gz" if self.compress else ".jsonl"
+        file_name = f"{collection_name}-{len(shards):05d}{extension}"
+        directory = os.path.join(self.output_dir, collection_name)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, file_name)
+        if self.compress:
+            file = gzip.open(path, "wt", encoding="utf-8", compresslevel=3)
+        else:
+            file = open(path, "w", encoding="utf-8")
+        shard = {
+            "file": os.path.join(collection_name, file_name),
+            "rows": 0,
+            "bytes": 0,
+        }
+        shards.append(shard)
+        self.files[collection_name] = file
+        return file, shard
+
+    def add(self, collection_name, entity):
+        document = to_document(entity)
+        if "_from" in document:
+            self.edge_collections.add(collection_name)
+        key = document.get("_key")
+        if (
+            self.key_sets is not None
+            and key is not None
+            and not self.key_sets.add(collection_name, key)
+        ):
+            self.duplicates[collection_name] = (
+                self.duplicates.get(collection_name, 0) + 1
+            )
+            return
+        line = json.dumps(document, default=str) + "\n"
+
+        file = self.files.get(collection_name)
+        shard = self.shards[collection_name][-1] if file is not None else None
+        # Shards are capped on uncompressed bytes, which keeps the cap
+        # meaningful for arangoimport's memory use whether or not they are
+        # compressed
+        if file is None or shard["bytes"] + len(line) > self.max_shard_bytes:
+            if file is not None:
+                file.close()
+            file, shard = self._open_shard(collection_name)
+        file.write(line)
+        shard["rows"] += 1
+        shard["bytes"] += len(line)
+        self.created[collection_name] = self.created.get(collection_name, 0) + 1
+
+    def flush_all(self):
+        for file in self.files.values():
+            file.flush()
+
+    def manifest(self):
+        vertex_collections = sorted(set(self.shards) - self.edge_collections)
+        edge_collections = sorted(self.edge_collections & set(self.shards))
+        return {
+            "compressed": self.compress,
+            # Vertices before edges, so every _from/_to exists when edges load
+            "load_order": vertex_collections + edge_collections,
+            "collections": {
+                collection_name: {
+                    "type": (
+                        "edge"
+                        if collection_name in self.edge_collections
+                        else "document"
+                    ),
+                    "rows": sum(shard["rows"] for shard in shards),
+                    "shards": shards,
+                }
+                for collection_name, shards in self.shards.items()
+            },
+        }
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), "w") as file:
+            json.dump(self.manifest(), file, indent=2)
+        if self.key_sets is not None:
+            self.key_sets.close()
+
+    def summary(self):
+        return self.manifest()["collections"]
+
+    def log_summary(self):
+        for collection_name, stats in sorted(self.summary().items()):
+            logging.info(
+                f"{collection_name}: wrote {stats['rows']} {stats['type']} rows in {len(stats['shards'])} shards."
+            )
+        for collection_name, duplicate_count in sorted(self.duplicates.items()):
+            logging.info(
+                f"{collection_name}: dropped {duplicate_count} rows with a key already written."
+            )
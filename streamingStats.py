@@ -0,0 +1,421 @@
+import json
+import math
+import base64
+import random
+import hashlib
+import logging
+import argparse
+from jsonExtractPrep import DETAIL_PATH
+from projectedParser import reads, is_slice
+
+# --- Defaults --- #
+
+IMPORT_STATS = "data_import_stats.json"
+STATS_VERSION = 1
+# 2^12 registers, about 1.6% standard error on distinct counts
+HLL_PRECISION = 12
+# Size of the top KLL compactor, about 1.7% rank error on quantiles
+QUANTILE_K = 200
+# Each lower compactor holds this fraction of the one above it
+COMPACTOR_DECAY = 2 / 3
+SUMMARY_QUANTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+SECONDS_PER_DAY = 86400
+
+
+# --- Sketches --- #
+
+
+class HyperLogLog:
+    # Distinct counts in 2^precision one-byte registers. Two sketches with the
+    # same precision merge by taking the register-wise maximum.
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = registers or bytearray(1 << precision)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        register_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        estimate = (
+            alpha
+            * register_count**2
+            / sum(2.0**-register for register in self.registers)
+        )
+        zero_count = self.registers.count(0)
+        if estimate <= 2.5 * register_count and zero_count:
+            # Linear counting is more accurate for small cardinalities
+            estimate = register_count * math.log(register_count / zero_count)
+        return int(round(estimate))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def to_dict(self):
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(bytes(self.registers)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["precision"], bytearray(base64.b64decode(data["registers"])))
+
+
+class QuantileSketch:
+    # KLL sketch: a stack of compactors where an item at height h stands for
+    # 2^h inputs. A full compactor is sorted and every other item, starting
+    # at a random one, is promoted to the next height.
+    def __init__(self, k=QUANTILE_K):
+        self.k = k
+        self.compactors = [[]]
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.size = 0
+        self.max_size = self._capacity(0)
+
+    def _capacity(self, height):
+        depth = len(self.compactors) - height - 1
+        return max(2, int(math.ceil(self.k * COMPACTOR_DECAY**depth)))
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(
+            self._capacity(height) for height in range(len(self.compactors))
+        )
+
+    def _compress(self):
+        while self.size >= self.max_size:
+            for height, compactor in enumerate(self.compactors):
+                if len(compactor) < self._capacity(height):
+                    continue
+                if height + 1 == len(self.compactors):
+                    self._grow()
+                # An odd item out stays at this height
+                leftover = compactor.pop() if len(compactor) % 2 else None
+                compactor.sort()
+                promoted = compactor[random.getrandbits(1) :: 2]
+                self.compactors[height + 1].extend(promoted)
+                self.size -= len(compactor) - len(promoted)
+                compactor.clear()
+                if leftover is not None:
+                    compactor.append(leftover)
+                break
+
+    def add(self, value):
+        self.compactors[0].append(value)
+        self.count += 1
+        self.size += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for height, compactor in enumerate(other.compactors):
+            self.compactors[height].extend(compactor)
+            self.size += len(compactor)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def quantiles(self, fractions):
+        if self.count == 0:
+            return [None for _ in fractions]
+        weighted = sorted(
+            (value, 1 << height)
+            for height, compactor in enumerate(self.compactors)
+            for value in compactor
+        )
+        total_weight = sum(weight for _, weight in weighted)
+        results = []
+        for fraction in fractions:
+            if fraction <= 0:
+                results.append(self.min)
+                continue
+            if fraction >= 1:
+                results.append(self.max)
+                continue
+            target = fraction * total_weight
+            cumulative = 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    results.append(value)
+                    break
+        return results
+
+    def summary(self):
+        values = self.quantiles(list(SUMMARY_QUANTILES.values()))
+        summary = {"count": self.count, "min": self.min}
+        summary.update(zip(SUMMARY_QUANTILES, values))
+        summary["max"] = self.max
+        return summary
+
+    def to_dict(self):
+        return {
+            "k": self.k,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "compactors": self.compactors,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["k"])
+        sketch.compactors = [list(compactor) for compactor in data["compactors"]]
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.size = sum(len(compactor) for compactor in sketch.compactors)
+        sketch.max_size = sum(
+            sketch._capacity(height) for height in range(len(sketch.compactors))
+        )
+        return sketch
+
+
+# --- Per-Group Statistics --- #
+
+
+def _order_measures(order):
+    # (total price, lead time in days) of one validated order
+    price = order.total_price
+    price = float(price) if price is not None else None
+    lead_time = None
+    if order.order_created_at is not None and order.departure_at is not None:
+        lead_time = (
+            order.departure_at - order.order_created_at
+        ).total_seconds() / SECONDS_PER_DAY
+    return price, lead_time
+
+
+class GroupStats:
+    def __init__(self, hll_precision=HLL_PRECISION, quantile_k=QUANTILE_K):
+        self.order_count = 0
+        self.customers = HyperLogLog(hll_precision)
+        self.total_price = QuantileSketch(quantile_k)
+        self.lead_time_days = QuantileSketch(quantile_k)
+
+    def add_order(self, price, lead_time):
+        self.order_count += 1
+        if price is not None:
+            self.total_price.add(price)
+        if lead_time is not None:
+            self.lead_time_days.add(lead_time)
+
+    def merge(self, other):
+        self.order_count += other.order_count
+        self.customers.merge(other.customers)
+        self.total_price.merge(other.total_price)
+        self.lead_time_days.merge(other.lead_time_days)
+
+    def summary(self):
+        return {
+            "orders": self.order_count,
+            "distinct_customers": self.customers.count(),
+            "total_price": self.total_price.summary(),
+            "lead_time_days": self.lead_time_days.summary(),
+        }
+
+    def to_dict(self):
+        return {
+            "orders": self.order_count,
+            "customers": self.customers.to_dict(),
+            "total_price": self.total_price.to_dict(),
+            "lead_time_days": self.lead_time_days.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        group = cls()
+        group.order_count = data["orders"]
+        group.customers = HyperLogLog.from_dict(data["customers"])
+        group.total_price = QuantileSketch.from_dict(data["total_price"])
+        group.lead_time_days = QuantileSketch.from_dict(data["lead_time_days"])
+        return group
+
+
+class ImportStats:
+    # Sketches of order prices, lead times and distinct customers per season
+    # key and per customer country, updated once per imported document from
+    # the orders that passed validation.
+    # Stats of separate runs (e.g. over split input files) merge exactly as
+    # if the inputs had been imported together.
+    def __init__(self, hll_precision=HLL_PRECISION, quantile_k=QUANTILE_K):
+        self.hll_precision = hll_precision
+        self.quantile_k = quantile_k
+        self.document_count = 0
+        self.order_count = 0
+        self.seasons = {}
+        self.countries = {}
+        # Continuation slices do not carry countryData, they directly
+        # follow their header
+        self.header = (None, None)
+
+    def _group(self, groups, key):
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = GroupStats(self.hll_precision, self.quantile_k)
+        return group
+
+    @reads(
+        "_id",
+        "countryData._id",
+        "seasons.*.{}",
+        f"{DETAIL_PATH}.orderId",
+    )
+    def add_document(self, json_document, validated_orders):
+        customer_id = json_document.get("_id")
+        if is_slice(json_document):
+            header_id, country_id = self.header
+            if header_id != customer_id:
+                country_id = None
+        else:
+            country_data = json_document.get("countryData")
+            country_id = (
+                country_data.get("_id") if isinstance(country_data, dict) else None
+            )
+            self.header = (customer_id, country_id)
+            self.document_count += 1
+
+        country_group = None
+        if country_id:
+            country_group = self._group(self.countries, country_id)
+            if customer_id:
+                country_group.customers.add(customer_id)
+
+        seasons = json_document.get("seasons")
+        if not isinstance(seasons, dict):
+            return
+        # Season key of every order the document lists
+        order_seasons = {}
+        for season_key, season_data in seasons.items():
+            season_group = self._group(self.seasons, season_key)
+            if customer_id:
+                season_group.customers.add(customer_id)
+            details = (
+                season_data.get("details") if isinstance(season_data, dict) else None
+            )
+            for detail in details or []:
+                if isinstance(detail, dict):
+                    order_seasons.setdefault(detail.get("orderId"), season_group)
+        for order in validated_orders:
+            price, lead_time = _order_measures(order)
+            self.order_count += 1
+            order_seasons[order._key].add_order(price, lead_time)
+            if country_group is not None:
+                country_group.add_order(price, lead_time)
+
+    def merge(self, other):
+        self.document_count += other.document_count
+        self.order_count += other.order_count
+        for groups, other_groups in [
+            (self.seasons, other.seasons),
+            (self.countries, other.countries),
+        ]:
+            for key, other_group in other_groups.items():
+                self._group(groups, key).merge(other_group)
+
+    def summary(self):
+        return {
+            "documents": self.document_count,
+            "orders": self.order_count,
+            "seasons": {
+                key: group.summary() for key, group in sorted(self.seasons.items())
+            },
+            "countries": {
+                key: group.summary() for key, group in sorted(self.countries.items())
+            },
+        }
+
+    def to_dict(self):
+        # Readable summaries for dashboards, sketches for later merges
+        data = {"version": STATS_VERSION, "summary": self.summary()}
+        data["sketches"] = {
+            "hll_precision": self.hll_precision,
+            "quantile_k": self.quantile_k,
+            "documents": self.document_count,
+            "orders": self.order_count,
+            "seasons": {key: group.to_dict() for key, group in self.seasons.items()},
+            "countries": {
+                key: group.to_dict() for key, group in self.countries.items()
+            },
+        }
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != STATS_VERSION:
+            raise ValueError(f"Unsupported stats version {data.get('version')}")
+        sketches = data["sketches"]
+        stats = cls(sketches["hll_precision"], sketches["quantile_k"])
+        stats.document_count = sketches["documents"]
+        stats.order_count = sketches["orders"]
+        stats.seasons = {
+            key: GroupStats.from_dict(group)
+            for key, group in sketches["seasons"].items()
+        }
+        stats.countries = {
+            key: GroupStats.from_dict(group)
+            for key, group in sketches["countries"].items()
+        }
+        return stats
+
+    def save(self, path=IMPORT_STATS):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, separators=(",", ":"))
+        logging.info(
+            f"Saved statistics of {len(self.seasons)} seasons and {len(self.countries)} countries to {path}."
+        )
+
+
+def load_stats(path=IMPORT_STATS):
+    with open(path, "r", encoding="utf-8") as file:
+        return ImportStats.from_dict(json.load(file))
+
+
+def merge_stats_files(paths, output_path=IMPORT_STATS):
+    stats = load_stats(paths[0])
+    for path in paths[1:]:
+        stats.merge(load_stats(path))
+    stats.save(output_path)
+    return stats
+
+
+# --- Execution --- #
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="Merge import statistics files and print their summary."
+    )
+    parser.add_argument("stats_files", nargs="+")
+    parser.add_argument("--output", help="Where to save the merged statistics")
+    args = parser.parse_args()
+    if args.output:
+        merged_stats = merge_stats_files(args.stats_files, args.output)
+    else:
+        merged_stats = load_stats(args.stats_files[0])
+        for stats_path in args.stats_files[1:]:
+            merged_stats.merge(load_stats(stats_path))
+    print(json.dumps(merged_stats.summary(), indent=2))
@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Connections are lazy; nothing in the tests reaches a server
+os.environ.setdefault("ARANGO_DB_HOST", "http://localhost:8529")
+os.environ.setdefault("ARANGO_DB_NAME", "test")
+# importJson opens its log files in the working directory on import
+os.chdir(tempfile.mkdtemp(prefix="daytrip-tests-"))
+
+
+class FakeCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+
+    def import_bulk(self, documents, **kwargs):
+        self.database.requests.append((self.name, len(documents)))
+        rows = self.database.rows.setdefault(self.name, {})
+        created = 0
+        details = []
+        for position, document in enumerate(documents):
+            document = json.loads(json.dumps(document, default=str))
+            key = document.get("_key") or f"auto{len(rows)}"
+            if key in rows:
+                details.append(
+                    f"at position {position}: creating document: unique constraint violated"
+                )
+                continue
+            rows[key] = document
+            created += 1
+        return {"created": created, "errors": len(details), "details": details}
+
+    def has(self, key):
+        return key in self.database.rows.get(self.name, {})
+
+
+class FakeDatabase:
+    # The slice of the python-arango API the writers use, in memory
+    def __init__(self):
+        self.rows = {}
+        self.requests = []
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def documents(self, name):
+        return list(self.rows.get(name, {}).values())
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def write_json(tmp_path):
+    def write(documents, name="input.json"):
+        path = tmp_path / name
+        path.write_text(json.dumps(documents), encoding="utf-8")
+        return str(path)
+
+    return write
+
+
+def _customer_document(customer_id, orders, country_id="CZ"):
+    return {
+        "_id": customer_id,
+        "email": f"{customer_id}@example.com",
+        "phoneNumber": "+420000",
+        "countryData": {"_id": country_id, "englishName": "Czechia"},
+        "seasons": {
+            "Season-2023": {
+                "details": [
+                    {
+                        "orderId": order_id,
+                        "totalPrice": 100,
+                        "orderCreatedAt": "2023-05-01T10:00:00.000Z",
+                        "departureAt": "2023-05-03T10:00:00.000Z",
+                        "paymentMethod": payment_method,
+                        "vehicles": [0],
+                        "originLocationData": {
+                            "_id": "L1",
+                            "name": "Prague",
+                            "countryId": "CZ",
+                        },
+                        "destinationLocationData": {
+                            "_id": "L2",
+                            "name": "Vienna",
+                            "countryId": "CZ",
+                        },
+                    }
+                    for order_id, payment_method in orders
+                ]
+            }
+        },
+    }
+
+
+@pytest.fixture
+def customer_document():
+    # Builds a customer document as the upstream export has them, with one
+    # season of (order id, payment method) orders
+    return _customer_document
@@ -0,0 +1,112 @@
+import pytest
+from requests.exceptions import ConnectionError
+from bulkWriter import BulkWriter, WriteAborted
+
+
+class RequestError(Exception):
+    # Stands in for python-arango's server errors
+    def __init__(self, http_code, message="rejected"):
+        super().__init__(message)
+        self.http_code = http_code
+
+
+class ScriptedCollection:
+    def __init__(self, database):
+        self.database = database
+
+    def import_bulk(self, documents, **kwargs):
+        self.database.requests += 1
+        return self.database.respond(documents)
+
+
+class ScriptedDatabase:
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = 0
+
+    def collection(self, name):
+        return ScriptedCollection(self)
+
+
+def writer_for(respond, **kwargs):
+    database = ScriptedDatabase(respond)
+    writer = BulkWriter(database, base_backoff=0, **kwargs)
+    return database, writer
+
+
+def add_documents(writer, count):
+    for index in range(count):
+        writer.add("order", {"_key": str(index)})
+
+
+@pytest.mark.parametrize("http_code", [401, 403, 404])
+def test_request_level_rejection_aborts_without_bisecting(http_code):
+    def respond(documents):
+        raise RequestError(http_code)
+
+    database, writer = writer_for(respond)
+    add_documents(writer, 8)
+    with pytest.raises(WriteAborted):
+        writer.flush_all()
+    assert database.requests == 1
+    assert writer.bisections == 0
+    assert writer.quarantined == {}
+
+
+def test_bad_document_is_isolated_by_bisection():
+    def respond(documents):
+        if any(document["_key"] == "5" for document in documents):
+            raise RequestError(400, "invalid document")
+        return {"created": len(documents), "errors": 0, "details": []}
+
+    database, writer = writer_for(respond)
+    add_documents(writer, 8)
+    writer.flush_all()
+    assert writer.created == {"order": 7}
+    assert writer.quarantined == {"order": 1}
+    assert writer.bisections > 0
+
+
+def test_transient_failure_is_retried():
+    calls = []
+
+    def respond(documents):
+        calls.append(len(documents))
+        if len(calls) == 1:
+            raise ConnectionError("reset")
+        return {"created": len(documents), "errors": 0, "details": []}
+
+    database, writer = writer_for(respond)
+    add_documents(writer, 4)
+    writer.flush_all()
+    assert calls == [4, 4]
+    assert writer.created == {"order": 4}
+
+
+def test_transient_failure_aborts_once_retries_are_used_up():
+    def respond(documents):
+        raise ConnectionError("down")
+
+    database, writer = writer_for(respond, max_attempts=2)
+    add_documents(writer, 4)
+    with pytest.raises(WriteAborted):
+        writer.flush_all()
+    assert database.requests == 3
+    assert writer.bisections == 0
+    assert writer.quarantined == {}
+
+
+def test_unique_violations_count_as_duplicates():
+    def respond(documents):
+        return {
+            "created": len(documents) - 1,
+            "errors": 1,
+            "details": ["at position 0: creating document: unique constraint violated"],
+        }
+
+    database, writer = writer_for(respond)
+    add_documents(writer, 3)
+    writer.flush_all()
+    assert writer.created == {"order": 2}
+    assert writer.errors == {"order": 1}
+    assert writer.quarantined == {}
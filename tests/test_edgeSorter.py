@@ -0,0 +1,77 @@
+import os
+import random
+from edgeSorter import ExternalEdgeSorter, SortingEdgeWriter, edge_sort_key
+
+
+def visited_edges():
+    return [
+        {"_from": f"order/o{order}", "_to": f"location/L{location}"}
+        for order in range(50)
+        for location in range(3)
+    ]
+
+
+def test_sorter_merges_spilled_runs_and_drops_duplicates(tmp_path):
+    random.seed(3)
+    edges = visited_edges()
+    added = edges + random.sample(edges, 40)
+    random.shuffle(added)
+    # A budget of a few edges spills a run every few additions
+    sorter = ExternalEdgeSorter(memory_budget_bytes=1000, temp_dir=str(tmp_path))
+    for edge in added:
+        sorter.add("visited", edge)
+        sorter.add("uses_vehicle", {"_from": edge["_from"], "_to": "vehicle_type/0"})
+    assert len(sorter.runs["visited"]) > 1
+
+    output = list(sorter.sorted_edges())
+    visited = [edge for name, edge in output if name == "visited"]
+    assert visited == sorted(edges, key=edge_sort_key)
+    assert [name for name, _ in output] == sorted(name for name, _ in output)
+    assert len([name for name, _ in output if name == "uses_vehicle"]) == 50
+    assert sorter.duplicates == {"uses_vehicle": len(added) - 50, "visited": 40}
+    assert os.listdir(tmp_path) == []
+
+
+def test_sorter_keeps_edges_that_differ_in_type():
+    sorter = ExternalEdgeSorter()
+    for type_ in ["destined", "originated", "destined"]:
+        sorter.add(
+            "order_from_location",
+            {"_from": "order/o1", "_to": "location/L1", "type": type_},
+        )
+    assert [edge["type"] for _, edge in sorter.sorted_edges()] == [
+        "destined",
+        "originated",
+    ]
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.added = []
+        self.closed = False
+        self.created = {}
+
+    def add(self, collection_name, document):
+        self.added.append((collection_name, document))
+
+    def flush_all(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_sorting_writer_holds_edges_until_close():
+    writer = RecordingWriter()
+    sorting_writer = SortingEdgeWriter(writer)
+    sorting_writer.add("visited", {"_from": "order/o2", "_to": "location/L1"})
+    sorting_writer.add("order", {"_key": "o1"})
+    sorting_writer.add("visited", {"_from": "order/o1", "_to": "location/L1"})
+    sorting_writer.add("visited", {"_from": "order/o2", "_to": "location/L1"})
+    assert writer.added == [("order", {"_key": "o1"})]
+    sorting_writer.close()
+    assert writer.added[1:] == [
+        ("visited", {"_from": "order/o1", "_to": "location/L1"}),
+        ("visited", {"_from": "order/o2", "_to": "location/L1"}),
+    ]
+    assert writer.closed
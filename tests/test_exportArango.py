@@ -0,0 +1,50 @@
+import os
+import pytest
+from exportArango import ParquetWriter
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_parquet_schema_is_unified_across_batches(tmp_path):
+    path = str(tmp_path / "orders.parquet")
+    writer = ParquetWriter(path)
+    writer.write_batch([{"_key": "1", "note": None, "price": {"total": 100}}])
+    writer.write_batch(
+        [
+            {
+                "_key": "2",
+                "note": "late",
+                "season": "Season-2023",
+                "price": {"total": 80, "currency": "EUR"},
+            }
+        ]
+    )
+    writer.close()
+
+    table = pq.read_table(path)
+    assert str(table.schema.field("note").type) == "string"
+    assert table.to_pylist() == [
+        {
+            "_key": "1",
+            "note": None,
+            "price": {"total": 100, "currency": None},
+            "season": None,
+        },
+        {
+            "_key": "2",
+            "note": "late",
+            "price": {"total": 80, "currency": "EUR"},
+            "season": "Season-2023",
+        },
+    ]
+    assert os.listdir(tmp_path) == ["orders.parquet"]
+
+
+def test_parquet_conflicting_types_fail(tmp_path):
+    path = str(tmp_path / "orders.parquet")
+    writer = ParquetWriter(path)
+    writer.write_batch([{"_key": "1", "price": 100}])
+    writer.write_batch([{"_key": "2", "price": "free"}])
+    with pytest.raises(ValueError, match="price"):
+        writer.close()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,25 @@
+import extractorMapping
+from bulkWriter import to_document
+from extractorMapping import (
+    compile_vertex_extractor,
+    extract_compiled_vertices,
+    VERTEX_MAPPINGS,
+)
+
+
+def dumped(results):
+    return {
+        model: ([to_document(entity) for entity in validated], errored)
+        for model, (validated, errored) in results.items()
+    }
+
+
+def test_constructor_fallback_matches_bare_entities(monkeypatch, customer_document):
+    # Other arango_orm releases build entities with the constructors
+    monkeypatch.setattr(extractorMapping, "BARE_ENTITIES", False)
+    extract_constructed = compile_vertex_extractor(VERTEX_MAPPINGS)
+    assert "set_state" not in extract_constructed.source
+    document = customer_document("c1", [("o1", 0), ("o2", None)])
+    assert dumped(extract_constructed(document)) == dumped(
+        extract_compiled_vertices(document)
+    )
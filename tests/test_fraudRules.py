@@ -0,0 +1,87 @@
+import datetime
+from fraudRules import FraudScorer, load_rules
+from models import Order
+
+START = datetime.datetime(2023, 5, 1)
+
+
+def add_orders(scorer, customer_id, orders):
+    # orders: (order_id, price, hours after START, (origin, destination))
+    details = []
+    validated = []
+    for order_id, price, hours, (origin, destination) in orders:
+        created = START + datetime.timedelta(hours=hours)
+        details.append(
+            {
+                "orderId": order_id,
+                "originLocationData": {"_id": origin},
+                "destinationLocationData": {"_id": destination},
+            }
+        )
+        validated.append(
+            Order(
+                _key=order_id,
+                total_price=price,
+                order_created_at=created,
+                departure_at=created + datetime.timedelta(days=10),
+            )
+        )
+    document = {"_id": customer_id, "seasons": {"Season-2023": {"details": details}}}
+    return scorer.add_document(document, validated)
+
+
+def flagged(orders):
+    return sorted(order._key for order in orders if order.potential_fraud)
+
+
+def test_velocity_flags_orders_beyond_the_limit_in_the_window():
+    scorer = FraudScorer()
+    add_orders(
+        scorer, "c1", [(f"o{hour}", 100, hour, ("L1", "L2")) for hour in range(6)]
+    )
+    # Another customer's orders in the same hours do not count for c1
+    add_orders(
+        scorer, "c2", [(f"p{hour}", 100, hour, ("L1", "L2")) for hour in range(3)]
+    )
+    # Six orders, but never more than five within 24 hours
+    add_orders(
+        scorer, "c3", [(f"q{day}", 100, 20 * day, ("L1", "L2")) for day in range(6)]
+    )
+    orders = scorer.finish()
+    assert flagged(orders) == ["o5"]
+    assert scorer.rule_counts["customer_velocity"] == 1
+
+
+def test_velocity_looks_back_into_the_previous_chunk():
+    scorer = FraudScorer(chunk_size=3)
+    first = add_orders(
+        scorer, "c1", [(f"o{hour}", 100, hour, ("L1", "L2")) for hour in range(3)]
+    )
+    second = add_orders(
+        scorer, "c1", [(f"o{hour}", 100, hour, ("L1", "L2")) for hour in range(3, 7)]
+    )
+    assert len(first) == 3 and flagged(first) == []
+    assert flagged(second) == ["o5", "o6"]
+
+
+def test_route_price_outlier_needs_enough_route_orders():
+    rules = load_rules()
+    scorer = FraudScorer(rules)
+    for index in range(30):
+        add_orders(
+            scorer,
+            f"c{index}",
+            [(f"o{index}", 95 + index % 10, 48 * index, ("L1", "L2"))],
+        )
+    add_orders(scorer, "x", [("outlier", 1000, 0, ("L1", "L2"))])
+    # The same price on a route with too few orders to judge
+    for index in range(5):
+        add_orders(scorer, f"d{index}", [(f"r{index}", 100, 48 * index, ("L3", "L4"))])
+    add_orders(scorer, "y", [("rare", 1000, 0, ("L3", "L4"))])
+    # Unknown routes and prices are never outliers
+    add_orders(scorer, "z", [("nowhere", 1000, 0, (None, "L2"))])
+    add_orders(scorer, "w", [("free", None, 0, ("L1", "L2"))])
+    orders = scorer.finish()
+    assert flagged(orders) == ["outlier"]
+    assert scorer.rule_counts["route_price_outlier"] == 1
+    assert rules["route_price_outlier"]["min_route_orders"] > 6
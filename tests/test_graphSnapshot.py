@@ -0,0 +1,97 @@
+import pytest
+from graphSnapshot import GraphSnapshot, build_snapshot
+
+EDGES = [
+    ("made_order", ["customer"], ["order"]),
+    ("visited", ["order"], ["location"]),
+    ("located_in", ["location"], ["country"]),
+]
+KEYS = {
+    "customer": ["c2", "c1"],
+    "order": ["o3", "o1", "o2"],
+    "location": ["L1", "L2", "L3"],
+    "country": ["CZ", "AT"],
+}
+ENDPOINTS = {
+    "made_order": [
+        ("customer/c1", "order/o1"),
+        ("customer/c1", "order/o2"),
+        ("customer/c2", "order/o3"),
+        ("customer/c2", "order/o3"),
+        ("customer/c9", "order/o1"),
+    ],
+    "visited": [
+        ("order/o1", "location/L1"),
+        ("order/o2", "location/L2"),
+        ("order/o3", "location/L2"),
+        ("order/o3", "location/L3"),
+    ],
+    "located_in": [
+        ("location/L1", "country/CZ"),
+        ("location/L2", "country/CZ"),
+        ("location/L3", "country/AT"),
+    ],
+}
+
+
+class MemorySource:
+    # Batches of two, as a source streams them
+    def _batches(self, rows):
+        for start in range(0, len(rows), 2):
+            yield rows[start : start + 2]
+
+    def keys(self, collection_name):
+        return self._batches(KEYS.get(collection_name, []))
+
+    def endpoints(self, collection_name):
+        return self._batches(
+            [list(pair) for pair in ENDPOINTS.get(collection_name, [])]
+        )
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    manifest = build_snapshot(MemorySource(), str(tmp_path), EDGES)
+    assert manifest["edges"]["made_order"]["edges"] == 3
+    assert manifest["edges"]["made_order"]["dangling"] == 1
+    return GraphSnapshot(str(tmp_path))
+
+
+def test_follow_outbound_and_inbound_paths(snapshot):
+    customers = snapshot.ids("customer", ["c1", "c2", "c9"])
+    assert customers[2] == -1
+    countries = snapshot.follow(customers[:1], ["made_order", "visited", "located_in"])
+    assert snapshot.handles(countries) == ["country/CZ"]
+    countries = snapshot.follow(customers[1:2], ["made_order", "visited", "located_in"])
+    assert sorted(snapshot.handles(countries)) == ["country/AT", "country/CZ"]
+    customers = snapshot.follow(
+        snapshot.ids("country", ["AT"]),
+        [
+            ("located_in", "inbound"),
+            ("visited", "inbound"),
+            ("made_order", "inbound"),
+        ],
+    )
+    assert snapshot.handles(customers) == ["customer/c2"]
+
+
+def test_expand_returns_vertices_first_reached_per_hop(snapshot):
+    frontiers = snapshot.expand(snapshot.ids("customer", ["c1"]), 4)
+    assert [sorted(snapshot.handles(frontier)) for frontier in frontiers] == [
+        ["customer/c1"],
+        ["order/o1", "order/o2"],
+        ["location/L1", "location/L2"],
+        ["country/CZ", "order/o3"],
+        ["customer/c2", "location/L3"],
+    ]
+    outbound = snapshot.expand(
+        snapshot.ids("customer", ["c1"]), 5, directions=["outbound"]
+    )
+    assert len(outbound) == 4
+
+
+def test_degrees_count_each_edge_once(snapshot):
+    assert list(snapshot.degrees("made_order")) == [2, 1]
+    assert list(snapshot.degrees("located_in", "inbound")) == [1, 2]
+    stats = snapshot.degree_stats("visited")
+    assert (stats["vertices"], stats["edges"], stats["max"]) == (3, 4, 2)
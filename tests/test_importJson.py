@@ -0,0 +1,112 @@
+import pytest
+import importJson
+from importJson import register_seeded_keys
+from keyRegistry import GlobalKeySets
+from jsonExtractPrep import extract_and_validate_payment_method
+from extractorMapping import extract_compiled_vertices
+from frameValidation import validate_file, frame_records
+from models import PaymentMethod
+from conftest import FakeDatabase
+
+
+def run_import(monkeypatch, fake_db, json_file_path, **kwargs):
+    monkeypatch.setattr(importJson, "daytrip", fake_db)
+    importJson.import_data_to_arango(
+        json_file_path,
+        quarantine_path=None,
+        failure_log_path=None,
+        stats_path=None,
+        address_aliases_path=None,
+        bump_cache_generations=False,
+        **kwargs,
+    )
+
+
+def test_cash_payment_method_is_a_vertex(customer_document):
+    document = customer_document("c1", [("o1", 0), ("o2", None)])
+    validated, errored = extract_and_validate_payment_method(document)
+    assert [method._key for method in validated] == ["0"]
+    assert errored == []
+    compiled = extract_compiled_vertices(document)[PaymentMethod][0]
+    assert [method._key for method in compiled] == ["0"]
+
+
+def test_frame_engine_keeps_cash_payment_method(customer_document, write_json):
+    path = write_json([customer_document("c1", [("o1", 0), ("o2", None)])])
+    tables = {}
+    for _, chunk_tables, _ in validate_file(path, 10):
+        tables.update(chunk_tables)
+    assert [row["_key"] for row in frame_records(tables[PaymentMethod])] == ["0"]
+
+
+@pytest.mark.parametrize("validation_engine", ["document", "frame", "compiled"])
+def test_two_phase_import_keeps_cash_payment_edges(
+    monkeypatch, fake_db, write_json, customer_document, validation_engine
+):
+    path = write_json(
+        [
+            customer_document("c1", [("o1", 0), ("o2", 1)]),
+            customer_document("c2", [("o3", 0)]),
+        ]
+    )
+    run_import(
+        monkeypatch,
+        fake_db,
+        path,
+        two_phase=True,
+        validation_engine=validation_engine,
+    )
+    payment_bys = sorted(
+        (edge["_from"], edge["_to"]) for edge in fake_db.documents("payment_by")
+    )
+    assert payment_bys == [
+        ("order/o1", "payment_method/0"),
+        ("order/o2", "payment_method/1"),
+        ("order/o3", "payment_method/0"),
+    ]
+
+
+def edge_pairs(database):
+    return {
+        name: sorted((document["_from"], document["_to"]) for document in documents)
+        for name, documents in (
+            (name, database.documents(name)) for name in database.rows
+        )
+        if documents and "_from" in documents[0]
+    }
+
+
+@pytest.mark.parametrize("validation_engine", ["document", "compiled"])
+def test_single_pass_writes_the_two_phase_edges(
+    monkeypatch, fake_db, write_json, customer_document, validation_engine
+):
+    path = write_json(
+        [
+            customer_document("c1", [("o1", 0), ("o2", 1)]),
+            customer_document("c2", [("o3", 0)], country_id="AT"),
+        ]
+    )
+    run_import(monkeypatch, fake_db, path, validation_engine=validation_engine)
+    two_phase_db = FakeDatabase()
+    run_import(
+        monkeypatch,
+        two_phase_db,
+        path,
+        two_phase=True,
+        validation_engine=validation_engine,
+    )
+    single_pass = edge_pairs(fake_db)
+    assert single_pass == edge_pairs(two_phase_db)
+    assert single_pass["located_in"] == [
+        ("location/L1", "country/CZ"),
+        ("location/L2", "country/CZ"),
+    ]
+    assert ("order/o3", "season/Season-2023") in single_pass["order_in_season"]
+
+
+def test_seeded_reference_keys_are_registered():
+    key_sets = GlobalKeySets()
+    register_seeded_keys(key_sets)
+    assert key_sets.contains_id("payment_method/0")
+    assert key_sets.contains_id("vehicle_type/4")
+    assert not key_sets.contains_id("payment_method/9")
@@ -0,0 +1,60 @@
+import json
+import initArango
+from seasonCalendar import load_calendar, season_calendar
+
+
+class MigratedDatabase:
+    # A database already at the current schema version
+    def __init__(self):
+        self.imports = {}
+
+    def collections(self):
+        return [
+            {
+                "name": initArango.MIGRATIONS_COLLECTION,
+                "type": "document",
+                "system": False,
+            }
+        ]
+
+    def collection(self, name):
+        return MigratedCollection(self, name)
+
+
+class MigratedCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+
+    def get(self, key):
+        return {"_key": key, "version": initArango.SCHEMA_VERSION}
+
+    def import_bulk(self, documents, **kwargs):
+        self.database.imports.setdefault(self.name, []).extend(documents)
+        return {"created": len(documents), "errors": 0}
+
+
+def test_up_to_date_migration_seeds_a_new_calendar(monkeypatch, tmp_path):
+    calendar_path = tmp_path / "calendar.json"
+    calendar_path.write_text(
+        json.dumps(
+            [
+                {"key": "summer-2024", "start": "2024-06-01", "end": "2024-08-31"},
+                {"key": "winter-2024", "start": "2024-12-01", "end": "2025-02-28"},
+            ]
+        )
+    )
+    # The calendar is shared module state: restore it after the test
+    for attribute in ("keys", "names", "starts", "ends"):
+        monkeypatch.setattr(
+            season_calendar, attribute, getattr(season_calendar, attribute)
+        )
+    database = MigratedDatabase()
+    monkeypatch.setattr(initArango, "db", database)
+    load_calendar(str(calendar_path))
+    assert initArango.migrate() is False
+    assert sorted(season["_key"] for season in database.imports["season"]) == [
+        "summer-2024",
+        "winter-2024",
+    ]
+    assert set(database.imports["payment_method"][0]) >= {"_key", "method_name"}
@@ -0,0 +1,55 @@
+import os
+from keyRegistry import GlobalKeySets, CompactKeySet
+
+
+def test_bloom_key_set_drops_repeats():
+    key_sets = GlobalKeySets(mode="bloom", expected_keys=1000)
+    assert key_sets.add("order", "o1")
+    assert key_sets.add("order", "o2")
+    assert not key_sets.add("order", "o1")
+    assert key_sets.contains("order", "o2")
+    assert key_sets.summary()["order"]["bloom_repeats"] == 1
+
+
+def test_bloom_false_positive_drops_are_rare():
+    key_sets = GlobalKeySets(
+        mode="bloom", expected_keys=10_000, false_positive_rate=0.01
+    )
+    accepted = sum(key_sets.add("order", f"o{index}") for index in range(10_000))
+    assert accepted > 9_900
+    assert key_sets.summary()["order"]["bloom_repeats"] == 10_000 - accepted
+
+
+def test_compact_key_set_finds_keys_in_spilled_runs(tmp_path):
+    key_set = CompactKeySet(pending_limit=4, memory_limit_keys=8, spill_dir=tmp_path)
+    keys = [f"order-{index}" for index in range(100)]
+    assert all(key_set.add(key) for key in keys)
+    assert len(key_set.runs) > 1
+    assert len(os.listdir(tmp_path)) == len(key_set.runs)
+    # Repeats are found whether they sit in a run, the array or pending
+    assert not any(key_set.add(key) for key in keys)
+    assert all(key in key_set for key in keys)
+    assert "order-100" not in key_set
+    assert len(key_set) == 100
+    key_set.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_compact_key_set_runs_are_sorted(tmp_path):
+    key_set = CompactKeySet(pending_limit=16, memory_limit_keys=32, spill_dir=tmp_path)
+    for index in range(200):
+        key_set.add(f"customer-{index}")
+    for run in key_set.runs + [key_set.sorted_hashes]:
+        assert (run[1:] >= run[:-1]).all()
+    key_set.close()
+
+
+def test_key_sets_spill_high_cardinality_collections_only(tmp_path):
+    key_sets = GlobalKeySets(mode="compact", spill_dir=str(tmp_path))
+    key_sets.add("order", "o1")
+    key_sets.add("country", "CZ")
+    assert key_sets.summary()["order"]["kind"] == "CompactKeySet"
+    assert key_sets.summary()["country"]["kind"] == "set"
+    assert key_sets.contains_id("order/o1")
+    assert not key_sets.contains_id("order/o2")
+    key_sets.close()
@@ -0,0 +1,67 @@
+import json
+import pytest
+import importJson
+from keyRegistry import GlobalKeySets
+from shardWriter import ShardWriter, MANIFEST_NAME
+
+
+def read_manifest(output_dir):
+    with open(output_dir / MANIFEST_NAME) as file:
+        return json.load(file)
+
+
+def test_repeated_keys_are_written_once(tmp_path):
+    writer = ShardWriter(str(tmp_path), key_sets=GlobalKeySets())
+    for _ in range(3):
+        writer.add("location", {"_key": "L1", "location_name": "Prague"})
+    writer.add("visited", {"_from": "order/o1", "_to": "location/L1"})
+    writer.add("visited", {"_from": "order/o2", "_to": "location/L1"})
+    for _ in range(2):
+        writer.add(
+            "located_in", {"_key": "k1", "_from": "location/L1", "_to": "country/CZ"}
+        )
+    writer.close()
+    collections = read_manifest(tmp_path)["collections"]
+    assert collections["location"]["rows"] == 1
+    # Edges without a key are never taken for repeats
+    assert collections["visited"]["rows"] == 2
+    assert collections["located_in"]["rows"] == 1
+    assert writer.duplicates == {"location": 2, "located_in": 1}
+
+
+def test_without_key_sets_every_row_is_written(tmp_path):
+    writer = ShardWriter(str(tmp_path))
+    for _ in range(3):
+        writer.add("location", {"_key": "L1"})
+    writer.close()
+    assert read_manifest(tmp_path)["collections"]["location"]["rows"] == 3
+
+
+@pytest.mark.parametrize("two_phase", [False, True])
+def test_offline_import_writes_reference_vertices_once(
+    tmp_path, write_json, customer_document, two_phase
+):
+    documents = [
+        customer_document(
+            f"c{index}", [(f"o{index}-{order}", order % 3) for order in range(4)]
+        )
+        for index in range(5)
+    ]
+    # A customer repeated in a later document
+    documents.append(customer_document("c0", [("o9", 1)]))
+    output_dir = tmp_path / "shards"
+    importJson.import_data_to_arango(
+        write_json(documents),
+        offline_dir=str(output_dir),
+        two_phase=two_phase,
+        quarantine_path=None,
+        failure_log_path=None,
+        stats_path=None,
+        address_aliases_path=None,
+        bump_cache_generations=False,
+    )
+    collections = read_manifest(output_dir)["collections"]
+    assert collections["location"]["rows"] == 2
+    assert collections["payment_method"]["rows"] == 3
+    assert collections["customer"]["rows"] == 5
+    assert collections["country"]["rows"] == 1
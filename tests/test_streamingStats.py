@@ -0,0 +1,69 @@
+import json
+import random
+import pytest
+from streamingStats import HyperLogLog, QuantileSketch
+
+ITEMS = 100_000
+# Three standard errors of the default sketch sizes
+HLL_TOLERANCE = 0.05
+RANK_TOLERANCE = 0.05
+
+
+def test_hll_merge_counts_the_union():
+    first = HyperLogLog()
+    second = HyperLogLog()
+    union = HyperLogLog()
+    for value in range(60_000):
+        first.add(f"customer-{value}")
+        union.add(f"customer-{value}")
+    for value in range(40_000, ITEMS):
+        second.add(f"customer-{value}")
+        union.add(f"customer-{value}")
+    first.merge(second)
+    # Register maxima do not depend on how the input was split
+    assert first.registers == union.registers
+    assert abs(first.count() - ITEMS) <= HLL_TOLERANCE * ITEMS
+
+
+def test_hll_small_counts_and_serialization():
+    sketch = HyperLogLog()
+    for value in range(100):
+        sketch.add(value)
+        sketch.add(value)
+    restored = HyperLogLog.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert abs(restored.count() - 100) <= 2
+
+
+def test_hll_merge_rejects_other_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(10))
+
+
+def test_kll_merge_keeps_rank_error_small():
+    random.seed(7)
+    values = list(range(ITEMS))
+    random.shuffle(values)
+    merged = QuantileSketch()
+    for part in range(4):
+        sketch = QuantileSketch()
+        for value in values[part::4]:
+            sketch.add(value)
+        # Merged as they would be from separate stats files
+        merged.merge(QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict()))))
+    assert merged.count == ITEMS
+    assert (merged.min, merged.max) == (0, ITEMS - 1)
+    assert merged.size < merged.max_size
+    fractions = [0.01, 0.25, 0.5, 0.75, 0.9, 0.99]
+    for fraction, value in zip(fractions, merged.quantiles(fractions)):
+        assert abs(value / ITEMS - fraction) <= RANK_TOLERANCE
+
+
+def test_kll_merge_with_empty_sketch():
+    sketch = QuantileSketch()
+    for value in [3, 1, 2]:
+        sketch.add(value)
+    sketch.merge(QuantileSketch())
+    empty = QuantileSketch()
+    empty.merge(sketch)
+    assert empty.quantiles([0, 0.5, 1]) == [1, 2, 3]
+    assert QuantileSketch().quantiles([0.5]) == [None]